@@ -0,0 +1,120 @@
+"""
+Logs estruturados e sem bloqueio
+
+- Níveis (LOG_LEVEL) e saída JSON, uma linha por evento (LOG_FORMAT)
+- A requisição só enfileira o registro (QueueHandler); a escrita no
+  stdout acontece na thread do QueueListener
+- request_id vem do header X-Request-Id (enviado pela API principal)
+  e acompanha o job até o worker do pool de inferência
+- Mensagens com argumentos (`logger.debug("... %s", x)`) só são
+  formatadas se o nível estiver habilitado
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.core.settings import settings
+
+# Id da requisição atual ("-" fora de requisições: sync, startup)
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+_MAX_REQUEST_ID_LENGTH = 128
+
+# Atributos padrão do LogRecord (o resto veio de `extra=` e vai no JSON)
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id"
+}
+
+_listener: Optional[QueueListener] = None
+_listener_pid: Optional[int] = None
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Usa o id recebido (se for razoável) ou gera um novo."""
+    if incoming and len(incoming) <= _MAX_REQUEST_ID_LENGTH and incoming.isprintable():
+        return incoming
+    return uuid.uuid4().hex
+
+
+class _RequestIdFilter(logging.Filter):
+    """Copia o request_id do contexto para o registro (na thread de origem)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging():
+    """
+    Liga o logger raiz à fila. Chamado no import do main e em cada
+    worker do pool de inferência; chamadas repetidas não fazem nada.
+    Um processo criado por fork herda o listener, mas não a thread:
+    nesse caso a fila é recriada.
+    """
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        return
+
+    if settings.LOG_FORMAT == "json":
+        formatter: logging.Formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        )
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(_RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    # Logs do uvicorn (inclusive o access log) passam pela mesma fila
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Esvazia a fila e para a thread de escrita."""
+    global _listener
+    if _listener is None or _listener_pid != os.getpid():
+        return
+    _listener.stop()
+    _listener = None
@@ -0,0 +1,208 @@
+"""
+Métricas Prometheus do serviço facial (GET /metrics)
+
+- Histograma por etapa (`facial_stage_seconds{route, stage}`):
+  read_body, parse_candidates, queue_wait, decode, detect, quality,
+  encode, gallery, decrypt, match
+- As etapas do pool de inferência são medidas dentro do worker e
+  devolvidas junto com o resultado; o processo principal registra
+- Fila de inferência, aquecimento, tamanho das galerias, decisões e caches
+  (os caches são lidos na hora da coleta, sem contadores duplicados)
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from prometheus_client import Counter, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Rota da requisição atual (definida pelo middleware HTTP)
+current_route: ContextVar[str] = ContextVar("current_route", default="background")
+
+_STAGE_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+_CANDIDATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 20000, 50000)
+
+STAGE_SECONDS = Histogram(
+    "facial_stage_seconds",
+    "Duração de cada etapa do pipeline",
+    ["route", "stage"],
+    buckets=_STAGE_BUCKETS
+)
+
+REQUEST_SECONDS = Histogram(
+    "facial_request_seconds",
+    "Duração total das requisições HTTP",
+    ["route", "method", "status"],
+    buckets=_STAGE_BUCKETS
+)
+
+CANDIDATES = Histogram(
+    "facial_candidates",
+    "Tamanho da galeria comparada por reconhecimento",
+    ["route"],
+    buckets=_CANDIDATE_BUCKETS
+)
+
+DECISIONS = Counter(
+    "facial_decisions_total",
+    "Decisões do reconhecimento",
+    ["route", "decision"]  # accepted | ambiguous | rejected | no_candidates
+)
+
+
+# ================================
+# ⏱️ ETAPAS
+# ================================
+
+# Coletor das etapas dentro de um worker do pool (None no processo principal)
+_worker_timings: Optional[List[Tuple[str, float]]] = None
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Mede uma etapa do pipeline (no worker, acumula para devolver)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if _worker_timings is not None:
+            _worker_timings.append((name, elapsed))
+        else:
+            STAGE_SECONDS.labels(current_route.get(), name).observe(elapsed)
+
+
+def run_collecting_timings(fn: Callable, args: tuple):
+    """
+    Executado no worker: roda `fn(*args)` e devolve (resultado, etapas).
+    """
+    global _worker_timings
+    _worker_timings = []
+    try:
+        result = fn(*args)
+        return result, _worker_timings
+    finally:
+        _worker_timings = None
+
+
+def observe_worker_timings(timings: List[Tuple[str, float]], wall_seconds: float):
+    """Registra as etapas do worker e o tempo de espera na fila."""
+    route = current_route.get()
+    for name, elapsed in timings:
+        STAGE_SECONDS.labels(route, name).observe(elapsed)
+
+    worker_seconds = sum(elapsed for _, elapsed in timings)
+    STAGE_SECONDS.labels(route, "queue_wait").observe(max(0.0, wall_seconds - worker_seconds))
+
+
+def observe_candidates(count: int):
+    CANDIDATES.labels(current_route.get()).observe(count)
+
+
+def count_decision(decision: str):
+    DECISIONS.labels(current_route.get(), decision).inc()
+
+
+# ================================
+# 📦 COLETOR DOS CACHES E DA FILA
+# ================================
+
+class ServiceCollector:
+    """
+    Lê o estado atual dos singletons a cada coleta (fila, galerias, caches,
+    portão de qualidade). Importações tardias evitam ciclos.
+    """
+
+    def describe(self):
+        # Sem isso o registro chamaria `collect()` já no import deste módulo
+        return []
+
+    def collect(self):
+        from app.services.gallery_service import gallery_store
+        from app.services.inference_engine import inference_engine
+        from app.services.quality_service import quality_stats
+        from app.services.recognition_service import get_cache_statistics
+        from app.services.shared_gallery import shared_gallery
+        from app.services.warmup_service import warm_up
+
+        queue = GaugeMetricFamily(
+            "facial_inference_in_flight",
+            "Jobs no pool de inferência (executando + na fila)"
+        )
+        queue.add_metric([], inference_engine.in_flight)
+        yield queue
+
+        capacity = GaugeMetricFamily(
+            "facial_inference_capacity",
+            "Jobs simultâneos aceitos antes de responder 503"
+        )
+        capacity.add_metric([], inference_engine.capacity)
+        yield capacity
+
+        ready = GaugeMetricFamily("facial_ready", "1 depois do aquecimento (GET /ready)")
+        ready.add_metric([], 1 if warm_up.ready else 0)
+        yield ready
+
+        gallery = gallery_store.get_stats()
+        for key, description in (
+            ("generation", "Geração do snapshot publicado"),
+            ("students", "Alunos sincronizados"),
+            ("rooms", "Salas com galeria"),
+            ("embeddings", "Linhas somadas das galerias das salas"),
+            ("bytes", "Bytes residentes das galerias"),
+        ):
+            metric = GaugeMetricFamily(f"facial_gallery_{key}", description)
+            metric.add_metric([], gallery[key])
+            yield metric
+
+        shared = shared_gallery.get_stats()
+        leader = GaugeMetricFamily(
+            "facial_gallery_shared_leader",
+            "1 no worker que sincroniza e grava a galeria compartilhada"
+        )
+        leader.add_metric([], 1 if shared["role"] == "leader" else 0)
+        yield leader
+
+        stats = get_cache_statistics()
+        caches = {
+            "embeddings": stats["embeddings"],
+            "candidate_galleries": stats["candidate_galleries"],
+            "results": stats["results"],
+        }
+
+        hits = CounterMetricFamily("facial_cache_hits", "Acertos por cache", labels=["cache"])
+        misses = CounterMetricFamily("facial_cache_misses", "Faltas por cache", labels=["cache"])
+        size = GaugeMetricFamily("facial_cache_entries", "Entradas por cache", labels=["cache"])
+
+        for name, info in caches.items():
+            hits.add_metric([name], info["hits"])
+            misses.add_metric([name], info["misses"])
+            size.add_metric([name], info["size"])
+
+        yield hits
+        yield misses
+        yield size
+
+        evictions = CounterMetricFamily(
+            "facial_embedding_cache_evictions",
+            "Embeddings removidos do cache por falta de espaço"
+        )
+        evictions.add_metric([], stats["embeddings"]["evictions"])
+        yield evictions
+
+        rejections = CounterMetricFamily(
+            "facial_quality_rejections",
+            "Rostos recusados pelo portão de qualidade",
+            labels=["reason"]
+        )
+        for reason, count in quality_stats.get_stats()["rejections"].items():
+            rejections.add_metric([reason], count)
+        yield rejections
+
+
+REGISTRY.register(ServiceCollector())
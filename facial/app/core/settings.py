@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 import base64
@@ -13,8 +15,98 @@ class Settings(BaseSettings):
     PRODUCTION: bool = False
     FACE_MATCH_THRESHOLD: float
     FACE_MATCH_MARGIN: float
-    AES_ENCRYPTION_KEY: str  
-    
+    AES_ENCRYPTION_KEY: str
+
+    # Motor de inferência (pool de processos)
+    INFERENCE_WORKERS: int = 0  # 0 = um worker por núcleo
+    INFERENCE_QUEUE_SIZE: int = 32
+    INFERENCE_START_METHOD: str = "spawn"
+
+    # Aquecimento na subida (/ready só responde 200 depois dele)
+    WARMUP_ENABLED: bool = True
+    WARMUP_MAX_ROUNDS: int = 5  # rodadas de inferência até a latência estabilizar
+    WARMUP_SYNC_TIMEOUT_SECONDS: int = 120  # espera da 1ª sincronização (0 = sem limite)
+
+    # Reconhecimento em lote (/recognize/batch)
+    RECOGNIZE_BATCH_MAX_IMAGES: int = 10
+
+    # Cadastro em lote (/encode/bulk)
+    BULK_ENCODE_MAX_PHOTOS: int = 2000  # fotos por chamada (todas as pessoas)
+    BULK_ENCODE_MAX_UPLOADS: int = 100  # fotos soltas em `images` (ficam em memória); acima disso, ZIP
+    BULK_ENCODE_MAX_PHOTO_BYTES: int = 10_000_000
+    BULK_ENCODE_IN_FLIGHT: int = 0  # fotos no pool ao mesmo tempo (0 = uma por worker)
+
+    # Decodificação de imagens
+    IMAGE_MAX_DIMENSION: int = 1280  # maior lado da imagem entregue ao detector
+    IMAGE_MAX_PIXELS: int = 4_000_000  # orçamento de pixels decodificados
+
+    # Detecção multi-resolução
+    DETECTION_SCALE: float = 0.5  # escala da cópia usada pelo detector (1 = original)
+    DETECTION_UPSAMPLE: int = 1
+    MIN_FACE_HEIGHT: int = 80  # em pixels da imagem original (verificação "size")
+
+    # Portão de qualidade antes do encoding
+    QUALITY_GATE_ENABLED: bool = True
+    QUALITY_CHECKS: str = "size,exposure,sharpness,pose"  # ordem de execução
+    QUALITY_MIN_SHARPNESS: float = 40.0  # variância do Laplaciano (rosto com 112 px)
+    QUALITY_MIN_BRIGHTNESS: float = 40.0  # brilho médio do rosto (0-255)
+    QUALITY_MAX_BRIGHTNESS: float = 220.0
+    QUALITY_MAX_YAW: float = 0.3  # nariz fora do meio dos olhos (× distância entre olhos)
+    QUALITY_MAX_ROLL_DEGREES: float = 25.0
+
+    # Perfis de reconhecimento (fast | balanced | enroll) por rota
+    PROFILE_ENCODE: str = "enroll"
+    PROFILE_RECOGNIZE: str = "balanced"  # /recognize, /identify, /recognize/batch
+    PROFILE_STREAM: str = "fast"
+    ENROLL_NUM_JITTERS: int = 5  # amostras por encoding no perfil enroll
+
+    # Modo grupo (vários rostos por foto, /recognize/group)
+    GROUP_IMAGE_MAX_DIMENSION: int = 2048  # rostos menores: mais resolução
+    GROUP_IMAGE_MAX_PIXELS: int = 0  # 0 = (2 × GROUP_IMAGE_MAX_DIMENSION)²
+    GROUP_DETECTION_SCALE: float = 1.0
+    GROUP_DETECTION_UPSAMPLE: int = 1
+    GROUP_MAX_FACES: int = 50
+
+    # Galeria compartilhada entre workers do uvicorn (--workers N)
+    SHARED_GALLERY_ENABLED: bool = False
+    SHARED_GALLERY_DIR: str = "/dev/shm/facial-gallery"  # tmpfs: o segmento fica em RAM
+    SHARED_GALLERY_POLL_SECONDS: float = 2.0  # intervalo em que os outros workers procuram versão nova
+
+    # Índice ANN da escola inteira (/identify)
+    ANN_NLIST: int = 0  # 0 = raiz quadrada do número de alunos
+    ANN_NPROBE: int = 8  # listas visitadas por busca
+    ANN_KMEANS_ITERATIONS: int = 10
+    ANN_TRAIN_SAMPLE: int = 50_000  # linhas usadas no treino do k-means
+    ANN_MIN_GALLERY: int = 2048  # abaixo disso, busca exata
+
+    # Reconhecimento por stream (WebSocket /recognize/stream)
+    STREAM_IMAGE_MAX_DIMENSION: int = 640  # frames do totem já são pequenos
+    STREAM_MAX_FRAME_BYTES: int = 2_000_000
+    STREAM_STABLE_FRAMES: int = 3  # frames bons e estáveis antes do encoding
+    STREAM_TRACK_IOU: float = 0.5  # IoU mínima para continuar o mesmo rosto
+    STREAM_LOST_FRAMES: int = 5  # frames sem rosto até encerrar o track
+    STREAM_MIN_SHARPNESS: float = 60.0  # variância do Laplaciano (rosto com 112 px)
+    STREAM_MAX_ATTEMPTS: int = 2  # encodings por track quando não reconhece
+
+    # Cache curto de resultados do /recognize (reenvio da mesma foto)
+    RESULT_CACHE_TTL_SECONDS: int = 30  # 0 = desligado
+    RESULT_CACHE_MAX_ENTRIES_PER_ROOM: int = 64
+
+    # Cache das galerias enviadas via `candidates` no /recognize
+    CANDIDATE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Cache de embeddings descriptografados (arena float32)
+    EMBEDDING_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # ~65k alunos
+    EMBEDDING_CACHE_TTL_SECONDS: int = 6 * 60 * 60  # 0 = sem expiração
+
+    # Logs (fila + thread própria; nada de I/O no caminho da requisição)
+    LOG_LEVEL: str = "INFO"  # DEBUG inclui distâncias, margens e tempos
+    LOG_FORMAT: Literal["json", "text"] = "json"
+
+    # Descriptografia em lote (sincronização / warm-up)
+    DECRYPT_BATCH_THREADS: int = 1
+    DECRYPT_BATCH_THREAD_MIN: int = 2048  # lotes menores não usam threads
+
     @property
     def AES_KEY_BYTES(self) -> bytes:
         return base64.b64decode(self.AES_ENCRYPTION_KEY)
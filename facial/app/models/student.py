@@ -1,11 +1,13 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import numpy as np
 
 class StudentEmbedding(BaseModel):
     id: str
-    facial: np.ndarray
+    facial: np.ndarray  # embedding descriptografado (float32, normalizado)
     rooms: List[str]
+    nonce: Optional[str] = None  # identifica a versão do embedding cifrado
+    ciphertext_digest: Optional[str] = None  # digest do ciphertext (confere o nonce)
 
     class Config:
         arbitrary_types_allowed = True
@@ -1,27 +1,61 @@
+import asyncio
 import json
+import logging
 import numpy as np
 from fastapi import (
     APIRouter,
     UploadFile,
     File,
     Form,
-    HTTPException
+    HTTPException,
+    WebSocket
 )
+from fastapi.responses import StreamingResponse
 
+from app.core.logger import new_request_id, request_id
+from app.core.metrics import stage, current_route
 from app.core.settings import settings
 
 from app.services.face_service import generate_embedding_from_images
 from app.services.face_service import generate_embedding_from_image
+from app.services.face_service import generate_embeddings_for_all_faces
 
 from app.services.encryption_service import encrypt_embedding
 
+from app.services.bulk_enroll_service import plan_from_archive
+from app.services.bulk_enroll_service import plan_from_uploads
+from app.services.bulk_enroll_service import stream_bulk_enrollment
+
+from app.services.calibration_service import DEFAULT_TARGET_FAR
+from app.services.calibration_service import calibration_report
+from app.services.calibration_service import encode_dataset
+
 from app.services.embedding_cache import embedding_cache
 
 from app.services.recognition_service import recognize_student
+from app.services.recognition_service import recognize_students_batch
+from app.services.recognition_service import fuse_burst_results
+from app.services.recognition_service import recognize_group
+from app.services.recognition_service import identify_student
 from app.services.recognition_service import validate_embedding
+from app.services.recognition_service import get_cache_statistics
+
+from app.services.stream_service import RecognitionStream
+
+from app.services.profiles import get_profile
+
+from app.services.gallery_service import gallery_store
+from app.services.result_cache import recognition_result_cache
+
+from app.services.quality_service import FaceQualityError, quality_stats
+
+from app.services.inference_engine import inference_engine
+from app.services.inference_engine import InferenceQueueFullError
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 # =========================================================
 # 🔐 GERAR EMBEDDING FACIAL (CADASTRO)
 # =========================================================
@@ -33,12 +67,15 @@ router = APIRouter()
     tags=["encoding"]
 )
 async def encode_face(
-    images: list[UploadFile] = File(..., description="1-5 fotos da mesma pessoa")
+    images: list[UploadFile] = File(..., description="1-5 fotos da mesma pessoa"),
+    profile: str | None = Form(None, description="Perfil: fast | balanced | enroll")
 ):
     try:
         # Validação
         if not images:
             raise ValueError("Envie pelo menos 1 foto")
+
+        profile = get_profile(profile, settings.PROFILE_ENCODE).name
         
         if len(images) > 5:
             raise ValueError("Máximo de 5 fotos permitidas")
@@ -47,10 +84,11 @@ async def encode_face(
         # 1️⃣ LER TODAS AS IMAGENS
         # ===========================
         file_bytes_list = []
-        for image in images:
-            file_bytes = await image.read()
-            if file_bytes:
-                file_bytes_list.append(file_bytes)
+        with stage("read_body"):
+            for image in images:
+                file_bytes = await image.read()
+                if file_bytes:
+                    file_bytes_list.append(file_bytes)
         
         if not file_bytes_list:
             raise ValueError("Todas as imagens estão vazias")
@@ -58,12 +96,17 @@ async def encode_face(
         # ===========================
         # 2️⃣ GERAR EMBEDDING (MÉDIO SE MÚLTIPLAS)
         # ===========================
-        embedding = generate_embedding_from_images(file_bytes_list)
+        embedding = await inference_engine.run(
+            generate_embedding_from_images,
+            file_bytes_list,
+            profile
+        )
 
         # ===========================
         # 3️⃣ CRIPTOGRAFAR EMBEDDING
         # ===========================
-        encrypted = encrypt_embedding(embedding.tolist())
+        with stage("encrypt"):
+            encrypted = encrypt_embedding(embedding.tolist())
 
         return {
             "embedding": encrypted["ciphertext"],
@@ -71,6 +114,76 @@ async def encode_face(
             "photos_processed": len(file_bytes_list)
         }
 
+    except InferenceQueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+
+
+# =========================================================
+# 🏫 CADASTRO EM LOTE (TURMA INTEIRA)
+# =========================================================
+# - `archive` (ZIP, uma pasta por aluno), ou
+# - `images` + `students` (JSON, um aluno por imagem)
+# - Fotos distribuídas entre os workers do pool
+# - Resposta NDJSON: uma linha por aluno assim que ele termina
+# =========================================================
+@router.post(
+    "/encode/bulk",
+    tags=["encoding"]
+)
+async def encode_bulk(
+    archive: UploadFile | None = File(None, description="ZIP com uma pasta por aluno"),
+    images: list[UploadFile] | None = File(None, description="Fotos de vários alunos"),
+    students: str | None = Form(None, description="JSON: um aluno por imagem"),
+    profile: str | None = Form(None, description="Perfil: fast | balanced | enroll")
+):
+    try:
+        profile = get_profile(profile, settings.PROFILE_ENCODE).name
+
+        if (archive is None) == (not images):
+            raise ValueError("Envie 'archive' ou 'images' (apenas um dos dois)")
+
+        # ===========================
+        # 1️⃣ PLANO (SÓ NOMES; BYTES LIDOS SOB DEMANDA)
+        # ===========================
+        bundle = None
+        if archive is not None:
+            with stage("read_body"):
+                plan, bundle = plan_from_archive(archive)
+        else:
+            if students is None:
+                raise ValueError("Com 'images', envie 'students'")
+            try:
+                student_ids = json.loads(students)
+            except json.JSONDecodeError:
+                raise ValueError("Campo 'students' não é um JSON válido")
+
+            if not isinstance(student_ids, list):
+                raise ValueError("'students' deve ser uma lista")
+
+            plan = plan_from_uploads(images, student_ids)
+
+        logger.info(
+            "🏫 Cadastro em lote | %d alunos, %d fotos",
+            len(plan),
+            sum(len(photos) for photos in plan.values())
+        )
+
+        # ===========================
+        # 2️⃣ RESULTADOS EM STREAM (NDJSON)
+        # ===========================
+        return StreamingResponse(
+            stream_bulk_enrollment(plan, profile, bundle),
+            media_type="application/x-ndjson"
+        )
+
     except ValueError as e:
         raise HTTPException(
             status_code=400,
@@ -81,8 +194,9 @@ async def encode_face(
 # =========================================================
 # 🎯 RECONHECER ALUNO PELO ROSTO (TOTEM)
 # =========================================================
-# - Recebe room + candidates + imagem
-# - Faz matching facial em memória
+# - Recebe room + imagem
+# - Faz matching contra a galeria residente da sala
+# - `candidates` (opcional) substitui a galeria da sala
 # =========================================================
 @router.post(
     "/recognize",
@@ -90,51 +204,411 @@ async def encode_face(
 )
 async def recognize_face(
     room: str = Form(...),
-    candidates: str = Form(...),  # JSON string
-    image: UploadFile = File(...)
+    image: UploadFile = File(...),
+    candidates: str | None = Form(None),  # JSON string (override opcional)
+    profile: str | None = Form(None, description="Perfil: fast | balanced | enroll")
 ):
-    print("🔵 Começando recognize_face")
+    logger.debug("🔵 Começando recognize_face | Room: %s", room)
 
     try:
+        profile = get_profile(profile, settings.PROFILE_RECOGNIZE).name
+
         # ===========================
         # 1️⃣ BYTES DA IMAGEM
         # ===========================
-        image_bytes = await image.read()
-        print(f"🖼️ Bytes da imagem: {len(image_bytes)}")
+        with stage("read_body"):
+            image_bytes = await image.read()
+        logger.debug("🖼️ Bytes da imagem: %d", len(image_bytes))
 
         if not image_bytes:
             raise ValueError("Imagem vazia")
 
         # ===========================
-        # 2️⃣ PARSE DOS CANDIDATOS
+        # 2️⃣ PARSE DOS CANDIDATOS (OVERRIDE)
         # ===========================
-        try:
-            candidates_list = json.loads(candidates)
-        except json.JSONDecodeError:
-            raise ValueError("Campo 'candidates' não é um JSON válido")
+        candidates_list = None
+        if candidates is not None:
+            with stage("parse_candidates"):
+                try:
+                    candidates_list = json.loads(candidates)
+                except json.JSONDecodeError:
+                    raise ValueError("Campo 'candidates' não é um JSON válido")
 
-        if not isinstance(candidates_list, list):
-            raise ValueError("'candidates' deve ser uma lista")
+            if not isinstance(candidates_list, list):
+                raise ValueError("'candidates' deve ser uma lista")
 
-        print(f"👥 Candidatos recebidos: {len(candidates_list)}")
+            logger.debug("👥 Candidatos recebidos: %d", len(candidates_list))
 
         # ===========================
-        # 3️⃣ RECONHECIMENTO
+        # 3️⃣ CACHE DE RESULTADOS (REENVIO DA MESMA FOTO)
+        # ===========================
+        # Só para a galeria residente: `candidates` muda o resultado
+        use_result_cache = candidates_list is None and recognition_result_cache.enabled
+        if use_result_cache:
+            with stage("result_cache"):
+                # Hash dos bytes fora do event loop (fotos de alguns MB)
+                fingerprint = await asyncio.to_thread(recognition_result_cache.fingerprint, image_bytes)
+                generation = gallery_store.snapshot.generation
+
+                cached = recognition_result_cache.get(room, profile, fingerprint, generation)
+            if cached is not None:
+                logger.info("♻️ Resultado reaproveitado (mesma imagem recente)")
+                return {**cached, "cached": True}
+
+        # ===========================
+        # 4️⃣ EMBEDDING DA QUERY (POOL DE INFERÊNCIA)
+        # ===========================
+        input_embedding = await inference_engine.run(
+            generate_embedding_from_image,
+            image_bytes,
+            profile
+        )
+
+        # ===========================
+        # 5️⃣ RECONHECIMENTO
         # ===========================
         result = recognize_student(
             room_id=room,
-            image_bytes=image_bytes,
+            input_embedding=input_embedding,
             candidates=candidates_list
         )
 
+        if use_result_cache:
+            recognition_result_cache.put(room, profile, fingerprint, generation, result)
+
         return result
 
+    except InferenceQueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+
+# =========================================================
+# 🏫 IDENTIFICAR ALUNO SEM SALA (ENTRADA DA ESCOLA)
+# =========================================================
+# - Recebe apenas a imagem
+# - Busca entre todos os alunos com o índice ANN (IVF)
+# - Mesmas regras de threshold e margem do /recognize
+# =========================================================
+@router.post(
+    "/identify",
+    tags=["recognize"]
+)
+async def identify_face(
+    image: UploadFile = File(...),
+    profile: str | None = Form(None, description="Perfil: fast | balanced | enroll")
+):
+    logger.debug("🔵 Começando identify_face")
+
+    try:
+        profile = get_profile(profile, settings.PROFILE_RECOGNIZE).name
+
+        with stage("read_body"):
+            image_bytes = await image.read()
+        if not image_bytes:
+            raise ValueError("Imagem vazia")
+
+        input_embedding = await inference_engine.run(
+            generate_embedding_from_image,
+            image_bytes,
+            profile
+        )
+
+        return identify_student(input_embedding)
+
+    except InferenceQueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e)
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=400,
             detail=str(e)
         )
 
+
+# =========================================================
+# 📦 RECONHECIMENTO EM LOTE (RAJADA / VÁRIOS TOTENS)
+# =========================================================
+# - `room` + M imagens (rajada de um totem), ou
+# - `rooms` (JSON, uma sala por imagem) + M imagens
+# - Um único cálculo de distâncias QxN por sala
+# - Resposta na mesma ordem das imagens
+# =========================================================
+@router.post(
+    "/recognize/batch",
+    tags=["recognize"]
+)
+async def recognize_batch(
+    images: list[UploadFile] = File(..., description="Imagens, cada uma com um rosto"),
+    room: str | None = Form(None, description="Sala de todas as imagens"),
+    rooms: str | None = Form(None, description="JSON: uma sala por imagem"),
+    fuse: bool = Form(False, description="Retorna decisão única da rajada (requer `room`)"),
+    profile: str | None = Form(None, description="Perfil: fast | balanced | enroll")
+):
+    logger.debug("🔵 Começando recognize_batch com %d imagens", len(images))
+
+    try:
+        # ===========================
+        # 1️⃣ VALIDAÇÃO
+        # ===========================
+        if not images:
+            raise ValueError("Envie pelo menos 1 imagem")
+
+        if len(images) > settings.RECOGNIZE_BATCH_MAX_IMAGES:
+            raise ValueError(
+                f"Máximo de {settings.RECOGNIZE_BATCH_MAX_IMAGES} imagens por lote"
+            )
+
+        profile = get_profile(profile, settings.PROFILE_RECOGNIZE).name
+
+        if (room is None) == (rooms is None):
+            raise ValueError("Envie 'room' ou 'rooms' (apenas um dos dois)")
+
+        if room is not None:
+            room_ids = [room] * len(images)
+        else:
+            try:
+                room_ids = json.loads(rooms)
+            except json.JSONDecodeError:
+                raise ValueError("Campo 'rooms' não é um JSON válido")
+
+            if not isinstance(room_ids, list) or len(room_ids) != len(images):
+                raise ValueError("'rooms' deve ser uma lista com uma sala por imagem")
+
+            if fuse:
+                raise ValueError("'fuse' só pode ser usado com 'room'")
+
+        # ===========================
+        # 2️⃣ BYTES DAS IMAGENS
+        # ===========================
+        with stage("read_body"):
+            images_bytes = [await image.read() for image in images]
+
+        # ===========================
+        # 3️⃣ EMBEDDINGS EM PARALELO (POOL DE INFERÊNCIA)
+        # ===========================
+        encoded = await asyncio.gather(
+            *(
+                inference_engine.run(generate_embedding_from_image, image_bytes, profile)
+                if image_bytes else _empty_image_error()
+                for image_bytes in images_bytes
+            ),
+            return_exceptions=True
+        )
+
+        # Só a fila cheia derruba o lote; qualquer outra falha (imagem
+        # gigante, worker do pool morto...) vira o erro daquele frame
+        for position, outcome in enumerate(encoded):
+            if isinstance(outcome, InferenceQueueFullError):
+                raise outcome
+            if isinstance(outcome, FaceQualityError):
+                quality_stats.record_rejection(outcome.reason)
+            elif isinstance(outcome, BaseException) and not isinstance(outcome, ValueError):
+                logger.error("❌ Falha inesperada no frame %d do lote", position, exc_info=outcome)
+                encoded[position] = ValueError(f"Erro ao processar a foto: {str(outcome)}")
+
+        # ===========================
+        # 4️⃣ MATCHING AGRUPADO POR SALA
+        # ===========================
+        valid_positions = [
+            position for position, outcome in enumerate(encoded)
+            if not isinstance(outcome, Exception)
+        ]
+
+        matched = recognize_students_batch(
+            [room_ids[position] for position in valid_positions],
+            [encoded[position] for position in valid_positions]
+        )
+        matched_by_position = dict(zip(valid_positions, matched))
+
+        results = []
+        for position, outcome in enumerate(encoded):
+            if isinstance(outcome, Exception):
+                result = {
+                    "studentId": None,
+                    "distance": 0.0,
+                    "recognized": False,
+                    "error": str(outcome)
+                }
+                if isinstance(outcome, FaceQualityError):
+                    result["reason"] = outcome.reason
+            else:
+                result = matched_by_position[position]
+
+            results.append({"index": position, "room": room_ids[position], **result})
+
+        response = {"results": results}
+        if fuse:
+            response["fused"] = fuse_burst_results(results)
+
+        return response
+
+    except InferenceQueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+
+
+async def _empty_image_error():
+    raise ValueError("Imagem vazia")
+
+
+async def _close_stream(websocket: WebSocket, detail: str):
+    """Avisa o totem e fecha com 1011 (erro interno); o socket pode já estar quebrado."""
+    try:
+        await websocket.send_json({"type": "error", "detail": detail})
+        await websocket.close(code=1011)
+    except Exception:
+        pass
+
+
+# =========================================================
+# 🎥 RECONHECIMENTO POR STREAM (WEBSOCKET)
+# =========================================================
+# - ws://.../recognize/stream?room=<sala>[&profile=fast]
+# - O totem envia frames JPEG (mensagens binárias)
+# - Tracking do rosto entre frames; encoding só quando estável
+# - Texto {"type": "reset"} encerra o track atual (próxima pessoa)
+# =========================================================
+@router.websocket("/recognize/stream")
+async def recognize_stream(websocket: WebSocket, room: str, profile: str | None = None):
+    await websocket.accept()
+    current_route.set("/recognize/stream")
+    request_id.set(new_request_id(websocket.headers.get("x-request-id")))
+
+    try:
+        profile = get_profile(profile, settings.PROFILE_STREAM).name
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1008)
+        return
+
+    logger.info("🎥 Stream aberto | Room: %s | Perfil: %s", room, profile)
+
+    stream = RecognitionStream(room, websocket.send_json, profile)
+    processor = asyncio.create_task(stream.run())
+
+    try:
+        # Leitor do socket; o processamento roda em paralelo em `processor`.
+        # Espera as duas coisas juntas: se o processador parar, o socket é
+        # fechado na hora (sem esperar o próximo frame do totem)
+        while True:
+            receiving = asyncio.ensure_future(websocket.receive())
+            await asyncio.wait({receiving, processor}, return_when=asyncio.FIRST_COMPLETED)
+
+            if not receiving.done():
+                receiving.cancel()
+                await asyncio.gather(receiving, return_exceptions=True)
+                error = None if processor.cancelled() else processor.exception()
+                logger.error("❌ Processamento do stream encerrado | Room: %s", room, exc_info=error)
+                await _close_stream(websocket, "Processamento do stream encerrado")
+                break
+
+            message = receiving.result()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("bytes") is not None:
+                stream.push_frame(message["bytes"])
+                continue
+
+            try:
+                command = json.loads(message.get("text") or "{}")
+            except json.JSONDecodeError:
+                command = {}
+
+            if command.get("type") == "reset":
+                stream.reset()
+            else:
+                await websocket.send_json({"type": "error", "detail": "Mensagem não suportada"})
+    finally:
+        stream.close()
+        await asyncio.gather(processor, return_exceptions=True)
+        logger.info("🎥 Stream encerrado | Room: %s | %s", room, stream.get_stats())
+
+
+# =========================================================
+# 👥 RECONHECER VÁRIOS ROSTOS (FOTO DA TURMA / FILA)
+# =========================================================
+# - Recebe room + uma imagem com vários rostos
+# - Detecta e codifica todos os rostos de uma vez
+# - Atribuição um-para-um contra a galeria da sala
+# =========================================================
+@router.post(
+    "/recognize/group",
+    tags=["recognize"]
+)
+async def recognize_group_photo(
+    room: str = Form(...),
+    image: UploadFile = File(...),
+    candidates: str | None = Form(None),  # JSON string (override opcional)
+    profile: str | None = Form(None, description="Perfil: fast | balanced | enroll")
+):
+    logger.debug("🔵 Começando recognize_group_photo | Room: %s", room)
+
+    try:
+        profile = get_profile(profile, settings.PROFILE_RECOGNIZE).name
+
+        with stage("read_body"):
+            image_bytes = await image.read()
+        if not image_bytes:
+            raise ValueError("Imagem vazia")
+
+        candidates_list = None
+        if candidates is not None:
+            with stage("parse_candidates"):
+                try:
+                    candidates_list = json.loads(candidates)
+                except json.JSONDecodeError:
+                    raise ValueError("Campo 'candidates' não é um JSON válido")
+
+            if not isinstance(candidates_list, list):
+                raise ValueError("'candidates' deve ser uma lista")
+
+        faces = await inference_engine.run(
+            generate_embeddings_for_all_faces,
+            image_bytes,
+            profile
+        )
+
+        results = recognize_group(
+            room_id=room,
+            faces=faces,
+            candidates=candidates_list
+        )
+
+        return {
+            "faces": results,
+            "faces_detected": len(results),
+            "recognized_count": sum(1 for r in results if r["recognized"])
+        }
+
+    except InferenceQueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+
+
 # =========================================================
 # 🧪 TESTAR COMPARAÇÃO DE EMBEDDINGS
 # =========================================================
@@ -155,14 +629,14 @@ async def test_embeddings_comparison(
     
     Retorna qual embedding é mais similar à foto usando distância euclidiana.
     """
-    print("🧪 Começando test_embeddings_comparison")
+    logger.debug("🧪 Começando test_embeddings_comparison")
 
     try:
         # ===========================
         # 1️⃣ BYTES DA IMAGEM
         # ===========================
         image_bytes = await image.read()
-        print(f"🖼️ Bytes da imagem: {len(image_bytes)}")
+        logger.debug("🖼️ Bytes da imagem: %d", len(image_bytes))
 
         if not image_bytes:
             raise ValueError("Imagem vazia")
@@ -186,15 +660,19 @@ async def test_embeddings_comparison(
         nome1 = emb1_data.get("nome", f"Embedding 1")
         nome2 = emb2_data.get("nome", f"Embedding 2")
 
-        print(f"📦 Embedding 1: {nome1}")
-        print(f"📦 Embedding 2: {nome2}")
+        logger.debug("📦 Embeddings: %s | %s", nome1, nome2)
 
         # ===========================
         # 3️⃣ GERAR EMBEDDING DA FOTO
         # ===========================
         try:
-            input_embedding = generate_embedding_from_image(image_bytes)
+            input_embedding = await inference_engine.run(
+                generate_embedding_from_image,
+                image_bytes
+            )
             query_vec = validate_embedding(input_embedding)
+        except InferenceQueueFullError:
+            raise
         except Exception as e:
             raise ValueError(f"Erro ao processar a foto: {str(e)}")
 
@@ -243,14 +721,10 @@ async def test_embeddings_comparison(
         emb1_passed = distance1 <= threshold
         emb2_passed = distance2 <= threshold
 
-        print("\n" + "=" * 60)
-        print("🧪 RESULTADO DO TESTE")
-        print(f"   {nome1}: {distance1:.4f} {'✅ PASSOU' if emb1_passed else '❌ FALHOU'}")
-        print(f"   {nome2}: {distance2:.4f} {'✅ PASSOU' if emb2_passed else '❌ FALHOU'}")
-        print(f"   Diferença: {difference:.4f}")
-        print(f"   Threshold: {threshold}")
-        print(f"   🏆 Vencedor: {winner}")
-        print("=" * 60 + "\n")
+        logger.debug(
+            "🧪 Teste: %s=%.4f | %s=%.4f | diferença %.4f | threshold %s | vencedor %s",
+            nome1, distance1, nome2, distance2, difference, threshold, winner
+        )
 
         return {
             "winner": winner,
@@ -272,13 +746,18 @@ async def test_embeddings_comparison(
             }
         }
 
+    except InferenceQueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e)
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=400,
             detail=str(e)
         )
     except Exception as e:
-        print(f"❌ Erro inesperado: {str(e)}")
+        logger.exception("❌ Erro inesperado")
         raise HTTPException(
             status_code=500,
             detail=f"Erro interno: {str(e)}"
@@ -306,7 +785,7 @@ async def calibrate_threshold(
     Retorna se o match seria aceito com o threshold fornecido,
     a distância euclidiana calculada, e análise de margem.
     """
-    print(f"⚙️ Começando calibrate_threshold com threshold={threshold}")
+    logger.debug("⚙️ Começando calibrate_threshold com threshold=%s", threshold)
 
     try:
         # ===========================
@@ -322,7 +801,7 @@ async def calibrate_threshold(
         # 2️⃣ BYTES DA IMAGEM
         # ===========================
         image_bytes = await image.read()
-        print(f"🖼️ Bytes da imagem: {len(image_bytes)}")
+        logger.debug("🖼️ Bytes da imagem: %d", len(image_bytes))
 
         if not image_bytes:
             raise ValueError("Imagem vazia")
@@ -342,14 +821,19 @@ async def calibrate_threshold(
             raise ValueError("Embedding deve conter 'embedding' e 'nonce'")
 
         nome = emb_data.get("nome", "Embedding Teste")
-        print(f"📦 Embedding: {nome}")
+        logger.debug("📦 Embedding: %s", nome)
 
         # ===========================
         # 4️⃣ GERAR EMBEDDING DA FOTO
         # ===========================
         try:
-            input_embedding = generate_embedding_from_image(image_bytes)
+            input_embedding = await inference_engine.run(
+                generate_embedding_from_image,
+                image_bytes
+            )
             query_vec = validate_embedding(input_embedding)
+        except InferenceQueueFullError:
+            raise
         except Exception as e:
             raise ValueError(f"Erro ao processar a foto: {str(e)}")
 
@@ -401,16 +885,10 @@ async def calibrate_threshold(
             confidence = "rejected"
             confidence_text = "Rejeitado (acima do threshold)"
 
-        print("\n" + "=" * 60)
-        print("⚙️ RESULTADO DA CALIBRAÇÃO")
-        print(f"   Nome: {nome}")
-        print(f"   Distância: {distance:.4f}")
-        print(f"   Threshold Testado: {threshold}")
-        print(f"   Threshold Padrão: {default_threshold}")
-        print(f"   Match: {'✅ SIM' if would_match else '❌ NÃO'}")
-        print(f"   Margem: {margin:+.4f} ({margin_percentage:+.1f}%)")
-        print(f"   Confiança: {confidence_text}")
-        print("=" * 60 + "\n")
+        logger.debug(
+            "⚙️ Calibração: %s | distância %.4f | threshold %s (padrão %s) | margem %+.4f | %s",
+            nome, distance, threshold, default_threshold, margin, confidence
+        )
 
         return {
             "match_result": {
@@ -435,13 +913,18 @@ async def calibrate_threshold(
             }
         }
 
+    except InferenceQueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e)
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=400,
             detail=str(e)
         )
     except Exception as e:
-        print(f"❌ Erro inesperado: {str(e)}")
+        logger.exception("❌ Erro inesperado")
         raise HTTPException(
             status_code=500,
             detail=f"Erro interno: {str(e)}"
@@ -467,4 +950,69 @@ def _get_threshold_suggestion(distance: float, threshold: float, margin: float)
         elif diff < 0.15:
             return f"Distância moderadamente acima. Faltaram {diff:.4f}. Considere se é a mesma pessoa."
         else:
-            return f"Distância muito alta ({diff:.4f} acima). Provavelmente não é a mesma pessoa."
\ No newline at end of file
+            return f"Distância muito alta ({diff:.4f} acima). Provavelmente não é a mesma pessoa."
+
+# =========================================================
+# 📐 CALIBRAR COM DATASET ROTULADO
+# =========================================================
+# - ZIP com uma pasta por aluno (mesmo formato do /encode/bulk)
+# - Cada foto é codificada uma vez; pares em blocos (histogramas)
+# - Curvas FAR/FRR + threshold e margem recomendados
+# =========================================================
+@router.post(
+    "/calibrate",
+    tags=["testing"]
+)
+async def calibrate_dataset(
+    archive: UploadFile = File(..., description="ZIP com uma pasta por aluno"),
+    target_far: float = Form(DEFAULT_TARGET_FAR, description="FAR máxima aceita (ex.: 0.001)"),
+    profile: str | None = Form(None, description="Perfil: fast | balanced | enroll")
+):
+    try:
+        if not 0 < target_far < 1:
+            raise ValueError("'target_far' deve estar entre 0 e 1")
+
+        profile = get_profile(profile, settings.PROFILE_RECOGNIZE).name
+
+        with stage("read_body"):
+            plan, bundle = plan_from_archive(archive)
+        try:
+            dataset = await encode_dataset(plan, profile)
+        finally:
+            bundle.close()
+
+        # Numpy fora do event loop (datasets grandes levam segundos)
+        report = await asyncio.to_thread(calibration_report, dataset, target_far)
+        return {"profile": profile, **report}
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+
+
+# =========================================================
+# 📊 ESTATÍSTICAS DOS CACHES E GALERIAS
+# =========================================================
+# - Cache de embeddings descriptografados (arena)
+# - Cache das galerias enviadas via `candidates`
+# - Galerias residentes (memória da matriz compartilhada pelas salas)
+# =========================================================
+@router.get(
+    "/cache/stats",
+    tags=["cache"]
+)
+def cache_stats():
+    return get_cache_statistics()
+
+
+# =========================================================
+# 🚦 ESTATÍSTICAS DO PORTÃO DE QUALIDADE
+# =========================================================
+@router.get(
+    "/quality/stats",
+    tags=["quality"]
+)
+def quality_statistics():
+    return quality_stats.get_stats()
@@ -0,0 +1,207 @@
+"""
+Índice aproximado (ANN) da escola inteira, para identificação sem sala
+
+- IVF (listas invertidas): k-means esférico agrupa os embeddings em
+  `nlist` listas; a busca visita só as `nprobe` listas mais próximas
+- Tudo em NumPy, dentro do processo (sem serviço externo)
+- Os candidatos das listas visitadas passam pelo mesmo kernel top-k
+  (re-rank com distância exata), então threshold e margem continuam
+  com o mesmo significado do reconhecimento por sala
+- Galerias pequenas não usam listas: busca exata (força bruta)
+"""
+
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.settings import settings
+from app.services.matching import top_k, TopKResult
+
+# Linhas por bloco na atribuição do k-means (limita a matriz N x nlist)
+_ASSIGN_CHUNK = 8192
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Lista (centroide mais similar) de cada linha, em blocos."""
+    labels = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), _ASSIGN_CHUNK):
+        block = matrix[start:start + _ASSIGN_CHUNK] @ centroids.T
+        labels[start:start + _ASSIGN_CHUNK] = np.argmax(block, axis=1)
+    return labels
+
+
+def train_centroids(
+    matrix: np.ndarray,
+    nlist: int,
+    iterations: int,
+    sample_size: int,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    K-means esférico (vetores normalizados, similaridade por produto interno).
+
+    Treina sobre uma amostra de até `sample_size` linhas; listas que
+    ficam vazias são re-semeadas com um ponto aleatório da amostra.
+    """
+    rng = np.random.default_rng(seed)
+
+    if len(matrix) > sample_size:
+        sample = matrix[rng.choice(len(matrix), sample_size, replace=False)]
+    else:
+        sample = matrix
+
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = _assign(sample, centroids)
+
+        # Soma por lista: ordena por rótulo e reduz cada faixa contígua
+        counts = np.bincount(labels, minlength=nlist)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        empty = counts == 0
+
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(
+            sample[np.argsort(labels, kind="stable")],
+            starts[~empty],
+            axis=0
+        )
+
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    Índice IVF sobre uma matriz NxD normalizada.
+
+    As linhas ficam reordenadas por lista em uma matriz contígua;
+    `offsets[i]:offsets[i + 1]` são as linhas da lista i e `order`
+    mapeia cada linha reordenada para o índice original.
+    """
+
+    def __init__(
+        self,
+        student_ids: List[str],
+        matrix: np.ndarray,
+        nlist: int = 0,
+        iterations: int = 10,
+        sample_size: int = 50_000,
+        min_size: int = 2048
+    ):
+        self.student_ids = list(student_ids)
+        self.centroids: Optional[np.ndarray] = None
+
+        # Galeria pequena: a força bruta já é rápida e exata
+        if len(matrix) < max(min_size, 2):
+            self.matrix = matrix
+            self.order = np.arange(len(matrix))
+            self.offsets = np.array([0, len(matrix)])
+            return
+
+        nlist = nlist or int(np.sqrt(len(matrix)))
+        nlist = max(1, min(nlist, len(matrix)))
+
+        centroids = train_centroids(matrix, nlist, iterations, sample_size)
+        labels = _assign(matrix, centroids)
+
+        # Descarta listas vazias (nunca visitadas)
+        counts = np.bincount(labels, minlength=nlist)
+        keep = np.flatnonzero(counts)
+        remap = np.full(nlist, -1, dtype=np.int32)
+        remap[keep] = np.arange(len(keep), dtype=np.int32)
+        labels = remap[labels]
+
+        self.centroids = np.ascontiguousarray(centroids[keep])
+        self.order = np.argsort(labels, kind="stable")
+        self.offsets = np.concatenate(([0], np.cumsum(counts[keep])))
+        self.matrix = np.ascontiguousarray(matrix[self.order])
+
+        self.centroids.setflags(write=False)
+        self.matrix.setflags(write=False)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        student_ids: List[str],
+        matrix: np.ndarray,
+        order: np.ndarray,
+        offsets: np.ndarray,
+        centroids: Optional[np.ndarray] = None
+    ) -> "IVFIndex":
+        """Índice já treinado (ex.: mapeado da galeria compartilhada), sem k-means."""
+        index = cls.__new__(cls)
+        index.student_ids = list(student_ids)
+        index.matrix = matrix
+        index.order = order
+        index.offsets = offsets
+        index.centroids = centroids
+        return index
+
+    def __len__(self) -> int:
+        return len(self.student_ids)
+
+    @property
+    def nlist(self) -> int:
+        return 0 if self.centroids is None else len(self.centroids)
+
+    def _probe_rows(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Linhas (na matriz reordenada) das `nprobe` listas mais próximas."""
+        scores = self.centroids @ query
+        if nprobe < len(scores):
+            lists = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        else:
+            lists = np.arange(len(scores))
+
+        return np.concatenate([
+            np.arange(self.offsets[i], self.offsets[i + 1])
+            for i in lists
+        ])
+
+    def search(self, query: np.ndarray, k: int = 2, nprobe: Optional[int] = None) -> TopKResult:
+        """
+        Top-k aproximado: candidatos das listas visitadas + re-rank exato.
+        Os índices retornados são os da matriz original (`student_ids`).
+        """
+        if len(self.matrix) == 0:
+            raise ValueError("Galeria vazia")
+
+        if self.centroids is None:
+            return top_k(self.matrix, query, k)
+
+        rows = self._probe_rows(query, nprobe or settings.ANN_NPROBE)
+        result = top_k(self.matrix[rows], query, k)
+
+        return TopKResult(
+            indices=self.order[rows[result.indices]],
+            distances=result.distances
+        )
+
+    def get_stats(self) -> dict:
+        sizes = np.diff(self.offsets)
+        return {
+            "size": len(self),
+            "nlist": self.nlist,
+            "nprobe": settings.ANN_NPROBE,
+            "mode": "ivf" if self.centroids is not None else "exact",
+            "largest_list": int(sizes.max()) if len(sizes) else 0,
+            "bytes": self.matrix.nbytes + (0 if self.centroids is None else self.centroids.nbytes),
+        }
+
+
+def build_campus_index(student_ids: List[str], matrix: np.ndarray) -> IVFIndex:
+    """Índice da escola inteira com os parâmetros das settings."""
+    return IVFIndex(
+        student_ids,
+        matrix,
+        nlist=settings.ANN_NLIST,
+        iterations=settings.ANN_KMEANS_ITERATIONS,
+        sample_size=settings.ANN_TRAIN_SAMPLE,
+        min_size=settings.ANN_MIN_GALLERY
+    )
@@ -0,0 +1,303 @@
+"""
+Cadastro em lote (turma inteira) para o /encode/bulk
+
+- Entrada: ZIP com uma pasta por aluno, ou fotos soltas + um aluno por foto
+  (a calibração também usa os planos e o encoding em janela daqui)
+- Cada foto vira um job no pool de inferência (encoding sem média);
+  a média e a criptografia por aluno ficam no processo principal
+- ZIP: janela limitada de fotos em andamento; só elas têm bytes em
+  memória, então o pico não depende do número de alunos
+- Fotos soltas (`images`): o multipart do Starlette guarda em memória
+  cada arquivo de até 1 MB durante toda a requisição, então esse modo é
+  só para lotes pequenos (BULK_ENCODE_MAX_UPLOADS)
+- Resultado em NDJSON, uma linha por aluno assim que a última foto dele termina
+"""
+
+import asyncio
+import json
+import logging
+import zipfile
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path, PurePosixPath
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import numpy as np
+from fastapi import UploadFile
+
+from app.core.metrics import stage
+from app.core.settings import settings
+from app.services.encryption_service import encrypt_embedding
+from app.services.face_service import average_embeddings, encode_enrollment_photo
+from app.services.inference_engine import inference_engine, InferenceQueueFullError
+from app.services.quality_service import FaceQualityError, quality_stats
+
+logger = logging.getLogger(__name__)
+
+MAX_PHOTOS_PER_STUDENT = 5  # mesmo limite do /encode
+
+_PHOTO_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+# Arquivos por requisição aceitos pelo parser multipart do Starlette
+_MULTIPART_MAX_FILES = 1000
+
+# Fila cheia (totens): o cadastro espera a vez em vez de falhar
+_QUEUE_FULL_RETRY_SECONDS = 0.2
+
+
+@dataclass(frozen=True)
+class BulkPhoto:
+    name: str
+    read: Callable[[], Awaitable[bytes]]
+    size: Optional[int] = None
+
+
+@dataclass
+class _StudentProgress:
+    expected: int
+    embeddings: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    quality_reasons: list = field(default_factory=list)
+    finished: int = 0
+
+
+# ================================
+# 📋 PLANO (QUAIS FOTOS DE QUEM)
+# ================================
+# Só nomes e leitores: os bytes são lidos quando a foto entra na janela
+
+def plan_from_archive(archive: UploadFile) -> tuple[dict[str, list[BulkPhoto]], zipfile.ZipFile]:
+    """
+    Lê o índice do ZIP (o upload já está em arquivo temporário).
+    O aluno é a pasta que contém a foto; fotos na raiz usam o próprio
+    nome (sem extensão). Arquivos que não são imagem são ignorados.
+    """
+    try:
+        bundle = zipfile.ZipFile(archive.file)
+    except zipfile.BadZipFile:
+        raise ValueError("'archive' não é um ZIP válido")
+
+    plan: dict[str, list[BulkPhoto]] = {}
+    for info in bundle.infolist():
+        path = PurePosixPath(info.filename)
+        if (
+            info.is_dir()
+            or path.suffix.lower() not in _PHOTO_EXTENSIONS
+            or path.name.startswith(".")
+            or "__MACOSX" in path.parts
+        ):
+            continue
+
+        student = path.parts[-2] if len(path.parts) > 1 else path.stem
+        plan.setdefault(student, []).append(BulkPhoto(
+            name=info.filename,
+            read=partial(asyncio.to_thread, bundle.read, info),
+            size=info.file_size
+        ))
+
+    try:
+        _validate_plan(plan)
+    except ValueError:
+        bundle.close()
+        raise
+    return plan, bundle
+
+
+def plan_from_uploads(images: list[UploadFile], students: list) -> dict[str, list[BulkPhoto]]:
+    """
+    Fotos enviadas no multipart; `students[i]` é o aluno da foto i.
+    Lotes pequenos apenas: as fotos já estão todas em memória (ou no
+    arquivo temporário, acima de 1 MB) quando a rota é chamada.
+    """
+    limit = min(settings.BULK_ENCODE_MAX_UPLOADS, _MULTIPART_MAX_FILES)
+    if len(images) > limit:
+        raise ValueError(
+            f"Máximo de {limit} fotos em 'images'; para turmas maiores envie um ZIP em 'archive'"
+        )
+
+    if len(students) != len(images):
+        raise ValueError("'students' deve ser uma lista com um aluno por imagem")
+
+    plan: dict[str, list[BulkPhoto]] = {}
+    for position, (image, student) in enumerate(zip(images, students)):
+        if not isinstance(student, (str, int)) or student == "":
+            raise ValueError(f"Aluno inválido na posição {position} de 'students'")
+
+        plan.setdefault(str(student), []).append(BulkPhoto(
+            name=image.filename or f"images[{position}]",
+            read=image.read,
+            size=image.size
+        ))
+
+    _validate_plan(plan)
+    return plan
+
+
+def plan_from_directory(root: Path | str) -> dict[str, list[BulkPhoto]]:
+    """Pasta local com uma subpasta por aluno (calibração pela linha de comando)."""
+    root = Path(root)
+    if not root.is_dir():
+        raise ValueError(f"Diretório não encontrado: {root}")
+
+    plan: dict[str, list[BulkPhoto]] = {}
+    for folder in sorted(path for path in root.iterdir() if path.is_dir()):
+        for photo in sorted(folder.iterdir()):
+            if photo.suffix.lower() not in _PHOTO_EXTENSIONS or photo.name.startswith("."):
+                continue
+            plan.setdefault(folder.name, []).append(BulkPhoto(
+                name=str(photo.relative_to(root)),
+                read=partial(asyncio.to_thread, photo.read_bytes),
+                size=photo.stat().st_size
+            ))
+
+    if not plan:
+        raise ValueError("Nenhuma foto encontrada")
+    return plan
+
+
+def _validate_plan(plan: dict[str, list[BulkPhoto]]):
+    total = sum(len(photos) for photos in plan.values())
+    if total == 0:
+        raise ValueError("Nenhuma foto encontrada")
+    if total > settings.BULK_ENCODE_MAX_PHOTOS:
+        raise ValueError(f"Máximo de {settings.BULK_ENCODE_MAX_PHOTOS} fotos por lote")
+
+
+# ================================
+# 🧠 PROCESSAMENTO
+# ================================
+
+def in_flight_window() -> int:
+    """Fotos no pool ao mesmo tempo (o resto da fila fica para os totens)."""
+    return max(1, settings.BULK_ENCODE_IN_FLIGHT or inference_engine.workers)
+
+
+async def encode_photo(photo: BulkPhoto, profile: str) -> np.ndarray:
+    """Lê a foto e gera o encoding (sem normalizar) em um worker do pool."""
+    max_bytes = settings.BULK_ENCODE_MAX_PHOTO_BYTES
+    if photo.size is not None and photo.size > max_bytes:
+        raise ValueError(f"Foto maior que {max_bytes} bytes")
+
+    image_bytes = await photo.read()
+    if not image_bytes:
+        raise ValueError("Imagem vazia")
+    if len(image_bytes) > max_bytes:
+        raise ValueError(f"Foto maior que {max_bytes} bytes")
+
+    while True:
+        try:
+            return await inference_engine.run(encode_enrollment_photo, image_bytes, profile)
+        except InferenceQueueFullError:
+            await asyncio.sleep(_QUEUE_FULL_RETRY_SECONDS)
+
+
+def _record_photo(progress: _StudentProgress, photo: BulkPhoto, task: asyncio.Task):
+    progress.finished += 1
+    error = task.exception()
+
+    if error is None:
+        progress.embeddings.append(task.result())
+    elif isinstance(error, FaceQualityError):
+        quality_stats.record_rejection(error.reason)
+        progress.quality_reasons.append(error.reason)
+        progress.errors.append({"photo": photo.name, "error": error.message, "reason": error.reason})
+    elif isinstance(error, ValueError):
+        progress.errors.append({"photo": photo.name, "error": str(error)})
+    else:
+        logger.error("❌ Falha inesperada no cadastro em lote | %s", photo.name, exc_info=error)
+        progress.errors.append({"photo": photo.name, "error": f"Erro ao processar - {error}"})
+
+
+def _student_result(student: str, progress: _StudentProgress) -> dict:
+    if not progress.embeddings:
+        result = {
+            "student": student,
+            "error": "Nenhuma foto válida processada",
+            "errors": progress.errors
+        }
+        if len(progress.quality_reasons) == progress.expected:
+            result["reason"] = progress.quality_reasons[0]
+        return result
+
+    with stage("encrypt"):
+        encrypted = encrypt_embedding(average_embeddings(progress.embeddings).tolist())
+
+    return {
+        "student": student,
+        "embedding": encrypted["ciphertext"],
+        "nonce": encrypted["nonce"],
+        "photos_processed": len(progress.embeddings),
+        "errors": progress.errors
+    }
+
+
+def _ndjson(entry: dict) -> bytes:
+    return (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def stream_bulk_enrollment(
+    plan: dict[str, list[BulkPhoto]],
+    profile: str,
+    bundle: Optional[zipfile.ZipFile] = None
+) -> AsyncIterator[bytes]:
+    """
+    Distribui as fotos entre os workers (no máximo BULK_ENCODE_IN_FLIGHT
+    ao mesmo tempo) e devolve uma linha por aluno, na ordem de término.
+    A última linha é o resumo: {"summary": {...}}.
+    """
+    window = in_flight_window()
+    pending: dict[asyncio.Task, tuple[str, BulkPhoto]] = {}
+    progress: dict[str, _StudentProgress] = {}
+    summary = {"students": len(plan), "enrolled": 0, "failed": 0}
+
+    def finish(result: dict) -> bytes:
+        summary["failed" if "error" in result else "enrolled"] += 1
+        return _ndjson(result)
+
+    async def wait_next() -> list[bytes]:
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        lines = []
+        for task in done:
+            student, photo = pending.pop(task)
+            state = progress[student]
+            _record_photo(state, photo, task)
+            if state.finished == state.expected:
+                del progress[student]
+                lines.append(finish(_student_result(student, state)))
+        return lines
+
+    try:
+        for student, photos in plan.items():
+            if len(photos) > MAX_PHOTOS_PER_STUDENT:
+                yield finish({
+                    "student": student,
+                    "error": f"Máximo de {MAX_PHOTOS_PER_STUDENT} fotos por aluno ({len(photos)} enviadas)",
+                    "errors": []
+                })
+                continue
+
+            progress[student] = _StudentProgress(expected=len(photos))
+            for photo in photos:
+                while len(pending) >= window:
+                    for line in await wait_next():
+                        yield line
+
+                task = asyncio.create_task(encode_photo(photo, profile))
+                pending[task] = (student, photo)
+
+        while pending:
+            for line in await wait_next():
+                yield line
+
+        logger.info(
+            "🏫 Cadastro em lote concluído: %d alunos, %d cadastrados, %d com falha",
+            summary["students"], summary["enrolled"], summary["failed"]
+        )
+        yield _ndjson({"summary": summary})
+
+    finally:
+        # Cliente desconectou: descarta o que ainda não começou
+        for task in pending:
+            task.cancel()
+        if bundle is not None:
+            bundle.close()
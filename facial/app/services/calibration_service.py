@@ -0,0 +1,363 @@
+"""
+Calibração de FACE_MATCH_THRESHOLD e FACE_MATCH_MARGIN com um dataset rotulado
+
+- Cada foto (aluno → fotos) é codificada uma única vez no pool de inferência
+- Distribuições genuíno/impostor de todos os pares, em blocos: a matriz de
+  pares nunca existe inteira; cada bloco vira contagens de um histograma
+- Curvas FAR/FRR a partir dos histogramas (verificação 1:1)
+- Simulação da regra do reconhecimento (1:N, `matching.decide`): cada foto
+  é consultada contra a galeria com um embedding médio por aluno; a galeria
+  do próprio aluno deixa a foto consultada de fora
+- Recomenda o maior threshold com FAR dentro da meta e a menor margem
+  com taxa de identificação errada dentro da mesma meta
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from app.core.settings import settings
+from app.services.bulk_enroll_service import BulkPhoto, encode_photo, in_flight_window
+from app.services.quality_service import FaceQualityError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TARGET_FAR = 0.001
+
+# Embeddings normalizados: distância euclidiana entre 0 e 2
+_MAX_DISTANCE = 2.0
+_HISTOGRAM_BINS = 400  # resolução de 0.005 nas curvas
+
+# Bloco de pares (linhas x colunas): 1024² float32 ≈ 4 MB
+_PAIR_CHUNK_ROWS = 1024
+# Elementos por bloco na consulta contra a galeria (consultas x alunos)
+_QUERY_CHUNK_ELEMENTS = 1 << 22
+
+_MARGIN_GRID = np.round(np.arange(0.0, 0.3001, 0.005), 3)
+
+
+@dataclass(frozen=True)
+class LabelledEmbeddings:
+    embeddings: np.ndarray  # NxD float32 normalizado
+    labels: np.ndarray  # N, índice do aluno em `students`
+    students: list[str]
+    errors: list[dict]  # fotos que não geraram embedding
+
+
+# ================================
+# 🧠 ENCODING DO DATASET
+# ================================
+
+async def encode_dataset(plan: dict[str, list[BulkPhoto]], profile: str) -> LabelledEmbeddings:
+    """
+    Codifica todas as fotos do plano (mesma janela do /encode/bulk).
+    Fotos recusadas (sem rosto, qualidade) ficam só em `errors`.
+    """
+    window = in_flight_window()
+    pending: dict[asyncio.Task, tuple[str, BulkPhoto]] = {}
+    vectors: list[np.ndarray] = []
+    labels: list[int] = []
+    student_index: dict[str, int] = {}
+    errors: list[dict] = []
+
+    def collect(done):
+        for task in done:
+            student, photo = pending.pop(task)
+            error = task.exception()
+            if error is None:
+                labels.append(student_index.setdefault(student, len(student_index)))
+                vectors.append(task.result())
+            elif isinstance(error, (FaceQualityError, ValueError)):
+                errors.append({"photo": photo.name, "error": str(error)})
+            else:
+                raise error
+
+    try:
+        for student, photos in plan.items():
+            for photo in photos:
+                while len(pending) >= window:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    collect(done)
+                pending[asyncio.create_task(encode_photo(photo, profile))] = (student, photo)
+
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            collect(done)
+    finally:
+        for task in pending:
+            task.cancel()
+
+    embeddings = np.asarray(vectors, dtype=np.float32).reshape(-1, 128)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    logger.info(
+        "📐 Dataset de calibração: %d fotos de %d alunos (%d recusadas)",
+        len(embeddings), len(student_index), len(errors)
+    )
+
+    return LabelledEmbeddings(
+        embeddings=embeddings,
+        labels=np.asarray(labels, dtype=np.int64),
+        students=list(student_index),
+        errors=errors
+    )
+
+
+# ================================
+# 📊 DISTRIBUIÇÕES GENUÍNO / IMPOSTOR
+# ================================
+
+def pair_histograms(
+    embeddings: np.ndarray,
+    labels: np.ndarray,
+    bins: int = _HISTOGRAM_BINS,
+    chunk_rows: int = _PAIR_CHUNK_ROWS
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Histogramas das distâncias de todos os pares (i < j): genuínos (mesmo
+    aluno) e impostores. Percorre só os blocos do triângulo superior.
+    """
+    genuine = np.zeros(bins, dtype=np.int64)
+    impostor = np.zeros(bins, dtype=np.int64)
+    scale = bins / _MAX_DISTANCE
+    total = len(embeddings)
+
+    for row_start in range(0, total, chunk_rows):
+        rows = embeddings[row_start:row_start + chunk_rows]
+        row_labels = labels[row_start:row_start + chunk_rows]
+
+        for col_start in range(row_start, total, chunk_rows):
+            cols = embeddings[col_start:col_start + chunk_rows]
+            col_labels = labels[col_start:col_start + chunk_rows]
+
+            # ||a - b||² = 2 - 2·(a·b) para vetores normalizados
+            distances = np.sqrt(np.clip(2.0 - 2.0 * (rows @ cols.T), 0.0, None))
+            buckets = np.minimum((distances * scale).astype(np.int64), bins - 1)
+
+            same = row_labels[:, None] == col_labels[None, :]
+            if col_start == row_start:
+                upper = np.triu(np.ones(same.shape, dtype=bool), k=1)
+                genuine_mask, impostor_mask = same & upper, ~same & upper
+            else:
+                genuine_mask, impostor_mask = same, ~same
+
+            genuine += np.bincount(buckets[genuine_mask], minlength=bins)
+            impostor += np.bincount(buckets[impostor_mask], minlength=bins)
+
+    return genuine, impostor
+
+
+def _histogram_summary(counts: np.ndarray) -> dict:
+    total = int(counts.sum())
+    if total == 0:
+        return {"pairs": 0}
+
+    width = _MAX_DISTANCE / len(counts)
+    centers = (np.arange(len(counts)) + 0.5) * width
+    cumulative = np.cumsum(counts) / total
+
+    def quantile(q: float) -> float:
+        return round(float((np.searchsorted(cumulative, q) + 1) * width), 4)
+
+    return {
+        "pairs": total,
+        "mean": round(float((centers * counts).sum() / total), 4),
+        "p01": quantile(0.01),
+        "p05": quantile(0.05),
+        "p50": quantile(0.50),
+        "p95": quantile(0.95),
+        "p99": quantile(0.99),
+    }
+
+
+def far_frr_curve(genuine: np.ndarray, impostor: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Thresholds nas bordas dos bins; FAR = impostores aceitos (distância
+    <= threshold), FRR = genuínos recusados (distância > threshold).
+    """
+    thresholds = np.arange(1, len(genuine) + 1) * (_MAX_DISTANCE / len(genuine))
+    far = np.cumsum(impostor) / max(int(impostor.sum()), 1)
+    frr = 1.0 - np.cumsum(genuine) / max(int(genuine.sum()), 1)
+    return thresholds, far, frr
+
+
+# ================================
+# 🎯 SIMULAÇÃO DO RECONHECIMENTO (1:N)
+# ================================
+
+def identification_distances(
+    embeddings: np.ndarray,
+    labels: np.ndarray,
+    chunk_elements: int = _QUERY_CHUNK_ELEMENTS
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Para cada foto de aluno com 2+ fotos: distância até o cadastro do
+    próprio aluno (média das outras fotos) e até os dois impostores mais
+    próximos (média de todas as fotos de cada um). Consultas em blocos.
+    """
+    student_count = int(labels.max()) + 1
+    sums = np.zeros((student_count, embeddings.shape[1]), dtype=np.float64)
+    np.add.at(sums, labels, embeddings)
+    photo_counts = np.bincount(labels, minlength=student_count)
+    gallery = (sums / np.linalg.norm(sums, axis=1, keepdims=True)).astype(np.float32)
+
+    probes = np.flatnonzero(photo_counts[labels] >= 2)
+    genuine = np.empty(len(probes), dtype=np.float32)
+    nearest = np.full(len(probes), np.inf, dtype=np.float32)
+    second = np.full(len(probes), np.inf, dtype=np.float32)
+
+    chunk = max(1, chunk_elements // student_count)
+    for start in range(0, len(probes), chunk):
+        rows = probes[start:start + chunk]
+        queries = embeddings[rows]
+        own = labels[rows]
+        block = slice(start, start + len(rows))
+
+        # Cadastro do próprio aluno sem a foto consultada
+        enrolled = sums[own] - queries
+        enrolled /= np.linalg.norm(enrolled, axis=1, keepdims=True)
+        genuine[block] = np.linalg.norm(queries - enrolled, axis=1)
+
+        if student_count < 2:
+            continue
+
+        similarities = queries @ gallery.T
+        similarities[np.arange(len(rows)), own] = -np.inf
+        distances = np.sqrt(np.clip(2.0 - 2.0 * similarities, 0.0, None))
+
+        if student_count >= 3:
+            closest = np.partition(distances, 1, axis=1)
+            nearest[block], second[block] = closest[:, 0], closest[:, 1]
+        else:
+            nearest[block] = distances.min(axis=1)
+
+    return genuine, nearest, second
+
+
+def identification_rates(
+    genuine: np.ndarray,
+    nearest: np.ndarray,
+    second: np.ndarray,
+    threshold: float,
+    margin: float
+) -> dict:
+    """Regra do `matching.decide` aplicada a cada consulta simulada."""
+    genuine_best = genuine < nearest
+    best = np.minimum(genuine, nearest)
+    runner_up = np.where(genuine_best, nearest, np.minimum(genuine, second))
+
+    within = best <= threshold
+    accepted = within & (runner_up - best >= margin)
+
+    total = max(len(genuine), 1)
+    return {
+        "correct_rate": round(float((accepted & genuine_best).sum()) / total, 4),
+        "misidentification_rate": round(float((accepted & ~genuine_best).sum()) / total, 4),
+        "ambiguous_rate": round(float((within & ~accepted).sum()) / total, 4),
+        "rejected_rate": round(float((~within).sum()) / total, 4),
+    }
+
+
+# ================================
+# 📋 RELATÓRIO
+# ================================
+
+def calibration_report(dataset: LabelledEmbeddings, target_far: float = DEFAULT_TARGET_FAR) -> dict:
+    """
+    Relatório completo: distribuições, curva FAR/FRR, EER, recomendação
+    de threshold/margem e o desempenho dos valores atuais.
+    """
+    embeddings, labels = dataset.embeddings, dataset.labels
+    photo_counts = np.bincount(labels, minlength=len(dataset.students))
+
+    if len(dataset.students) < 2 or not (photo_counts >= 2).any():
+        raise ValueError("A calibração precisa de pelo menos 2 alunos, um deles com 2+ fotos válidas")
+
+    # ===========================
+    # 1️⃣ PARES (VERIFICAÇÃO 1:1)
+    # ===========================
+    genuine_counts, impostor_counts = pair_histograms(embeddings, labels)
+    thresholds, far, frr = far_frr_curve(genuine_counts, impostor_counts)
+
+    eer_index = int(np.argmin(np.abs(far - frr)))
+
+    within_target = np.flatnonzero(far <= target_far)
+    threshold_index = int(within_target[-1]) if len(within_target) else 0
+    threshold = float(thresholds[threshold_index])
+
+    # ===========================
+    # 2️⃣ RECONHECIMENTO SIMULADO (1:N)
+    # ===========================
+    genuine, nearest, second = identification_distances(embeddings, labels)
+
+    margin_curve = []
+    recommended_margin: Optional[float] = None
+    for margin in _MARGIN_GRID:
+        rates = identification_rates(genuine, nearest, second, threshold, float(margin))
+        margin_curve.append({"margin": float(margin), **rates})
+        if recommended_margin is None and rates["misidentification_rate"] <= target_far:
+            recommended_margin = float(margin)
+
+    current_threshold = settings.FACE_MATCH_THRESHOLD
+    current_margin = settings.FACE_MATCH_MARGIN
+    current_index = int(np.clip(round(current_threshold / (_MAX_DISTANCE / len(thresholds))) - 1, 0, len(thresholds) - 1))
+
+    return {
+        "dataset": {
+            "students": len(dataset.students),
+            "photos": int(len(embeddings)),
+            "rejected_photos": len(dataset.errors),
+            "probes": int(len(genuine)),
+        },
+        "distributions": {
+            "genuine": _histogram_summary(genuine_counts),
+            "impostor": _histogram_summary(impostor_counts),
+        },
+        "curve": _curve_points(thresholds, far, frr),
+        "eer": {
+            "threshold": round(float(thresholds[eer_index]), 4),
+            "rate": round(float((far[eer_index] + frr[eer_index]) / 2), 4),
+        },
+        "recommendation": {
+            "target_far": target_far,
+            "threshold": round(threshold, 4),
+            "far": round(float(far[threshold_index]), 6),
+            "frr": round(float(frr[threshold_index]), 4),
+            # None: nenhuma margem da grade atinge a meta com esse threshold
+            "margin": recommended_margin,
+            "identification": identification_rates(
+                genuine, nearest, second, threshold,
+                float(_MARGIN_GRID[-1]) if recommended_margin is None else recommended_margin
+            ),
+        },
+        "current": {
+            "threshold": current_threshold,
+            "margin": current_margin,
+            "far": round(float(far[current_index]), 6),
+            "frr": round(float(frr[current_index]), 4),
+            "identification": identification_rates(
+                genuine, nearest, second, current_threshold, current_margin
+            ),
+        },
+        "margins": margin_curve,
+        "errors": dataset.errors,
+    }
+
+
+def _curve_points(thresholds: np.ndarray, far: np.ndarray, frr: np.ndarray, step: int = 2) -> list[dict]:
+    """Pontos a cada 0.01, sem as pontas constantes (FAR 0 / FRR 1 e FAR 1 / FRR 0)."""
+    first = max(int(np.argmax((far > 0) | (frr < 1))) - step, 0)
+    last = len(thresholds) - 1 - int(np.argmax(((far < 1) | (frr > 0))[::-1]))
+    last = min(last + step, len(thresholds) - 1)
+
+    return [
+        {
+            "threshold": round(float(thresholds[index]), 4),
+            "far": round(float(far[index]), 6),
+            "frr": round(float(frr[index]), 4),
+        }
+        for index in range(first + (step - 1 - first) % step, last + 1, step)
+    ]
@@ -1,95 +1,248 @@
 """
 Cache em memória para embeddings descriptografados
 Evita descriptografar o mesmo aluno múltiplas vezes
+
+- Chave: nonce do embedding (único por criptografia)
+- Vetores float32 guardados em uma arena contígua (uma linha por aluno)
+- Capacidade em bytes, TTL, LRU e invalidação explícita
+- Candidatos que já estão na galeria residente (mesmo nonce e mesmo
+  digest do ciphertext) são lidos de lá: nem descriptografados, nem
+  copiados para a arena
 """
 
 import base64
-from functools import lru_cache
-from typing import List, Dict, Tuple
-from app.services.encryption_service import decrypt_embedding
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.encryption_service import EMBEDDING_DIM
+from app.services.encryption_service import ciphertext_digest, decrypt_embeddings_batch
+from app.services.gallery_service import gallery_store
+from app.core.metrics import stage
 from app.core.settings import settings
 
+# Linhas alocadas na primeira inserção; a arena dobra até a capacidade
+_INITIAL_ROWS = 1024
+
 
 class EmbeddingCache:
     """
     Cache singleton para embeddings descriptografados.
-    Usa LRU cache para limitar uso de memória.
+    Limita o uso de memória pelo tamanho da arena (bytes), não por entradas.
     """
-    
+
     _instance = None
     _decryption_key = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance._initialize()
         return cls._instance
-    
+
     def _initialize(self):
-        """Inicializa a chave de descriptografia uma única vez"""
+        """Inicializa a chave de descriptografia e a arena uma única vez"""
         self._decryption_key = base64.b64decode(settings.AES_ENCRYPTION_KEY)
         if len(self._decryption_key) != 32:
             raise ValueError("AES_ENCRYPTION_KEY deve ter 32 bytes")
-    
-    @lru_cache(maxsize=1000)
-    def _decrypt_cached(self, ciphertext_b64: str, nonce_b64: str) -> Tuple[float, ...]:
+
+        self.dim = EMBEDDING_DIM
+        self.row_bytes = self.dim * np.dtype(np.float32).itemsize
+        self.capacity = max(1, settings.EMBEDDING_CACHE_MAX_BYTES // self.row_bytes)
+        self.ttl = settings.EMBEDDING_CACHE_TTL_SECONDS
+
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._arena = np.empty((0, self.dim), dtype=np.float32)
+        # nonce -> (linha da arena, hash do ciphertext, expira em); ordem = LRU
+        self._index: "OrderedDict[str, Tuple[int, int, float]]" = OrderedDict()
+        self._free: List[int] = []
+        self._hits = 0
+        self._resident_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    # ================================
+    # 🧱 ARENA
+    # ================================
+
+    def _allocate_slot(self) -> int:
+        if self._free:
+            return self._free.pop()
+
+        allocated = len(self._arena)
+        if allocated < self.capacity:
+            new_rows = min(self.capacity, max(_INITIAL_ROWS, allocated * 2))
+            arena = np.empty((new_rows, self.dim), dtype=np.float32)
+            arena[:allocated] = self._arena
+            self._arena = arena
+            self._free.extend(range(new_rows - 1, allocated, -1))
+            return allocated
+
+        # Arena cheia: remove o menos usado recentemente
+        _, (slot, _, _) = self._index.popitem(last=False)
+        self._evictions += 1
+        return slot
+
+    def _lookup(self, nonce_b64: str, ciphertext_b64: str, now: float) -> Optional[int]:
+        entry = self._index.get(nonce_b64)
+        if entry is None:
+            return None
+
+        slot, ciphertext_hash, expires_at = entry
+        if ciphertext_hash != hash(ciphertext_b64) or expires_at < now:
+            if expires_at < now:
+                self._expirations += 1
+            del self._index[nonce_b64]
+            self._free.append(slot)
+            return None
+
+        self._index.move_to_end(nonce_b64)
+        return slot
+
+    def _store(self, nonce_b64: str, ciphertext_b64: str, vector: np.ndarray, now: float):
+        entry = self._index.pop(nonce_b64, None)
+        slot = entry[0] if entry is not None else self._allocate_slot()
+        self._arena[slot] = vector
+        expires_at = now + self.ttl if self.ttl > 0 else float("inf")
+        self._index[nonce_b64] = (slot, hash(ciphertext_b64), expires_at)
+
+    # ================================
+    # 🔎 CONSULTA
+    # ================================
+
+    def get_decrypted_embeddings(self, facial_data_list: Sequence[Dict]) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Versão cached da descriptografia.
-        Retorna tupla (imutável) para ser hashable no cache.
-        
+        Obtém vários embeddings descriptografados (com cache).
+        As faltas são descriptografadas em lote.
+
         Args:
-            ciphertext_b64: Ciphertext em Base64
-            nonce_b64: Nonce em Base64
-            
+            facial_data_list: Dicts com 'embedding' e 'nonce' em Base64
+
         Returns:
-            Tupla de floats (embedding descriptografado)
+            (matriz float32 NxD, máscara booleana das linhas válidas)
         """
-        ciphertext = base64.b64decode(ciphertext_b64)
-        nonce = base64.b64decode(nonce_b64)
-        
-        embedding = decrypt_embedding(
-            ciphertext=ciphertext,
-            nonce=nonce,
-            key=self._decryption_key
-        )
-        
-        # Converte para tupla (imutável) para cache
-        return tuple(embedding)
-    
-    def get_decrypted_embedding(self, facial_data: Dict) -> List[float]:
+        out = np.zeros((len(facial_data_list), self.dim), dtype=np.float32)
+        valid = np.zeros(len(facial_data_list), dtype=bool)
+        missing: List[int] = []
+        now = time.monotonic()
+
+        # Galeria residente (compartilhada entre workers, se habilitada)
+        snapshot = gallery_store.snapshot
+        resident = 0
+
+        with self._lock:
+            for index, facial_data in enumerate(facial_data_list):
+                position = snapshot.nonce_index.get(facial_data.get('nonce', ''))
+                if (
+                    position is not None
+                    and snapshot.students[position].ciphertext_digest == ciphertext_digest(facial_data['embedding'])
+                ):
+                    out[index] = snapshot.students[position].facial
+                    valid[index] = True
+                    resident += 1
+                    continue
+
+                slot = self._lookup(facial_data.get('nonce', ''), facial_data['embedding'], now)
+                if slot is None:
+                    missing.append(index)
+                    continue
+
+                out[index] = self._arena[slot]
+                valid[index] = True
+
+            self._hits += len(facial_data_list) - len(missing)
+            self._resident_hits += resident
+            self._misses += len(missing)
+
+        if not missing:
+            return out, valid
+
+        items = []
+        for index in missing:
+            try:
+                items.append((
+                    base64.b64decode(facial_data_list[index]['embedding']),
+                    base64.b64decode(facial_data_list[index].get('nonce', ''))
+                ))
+            except Exception:
+                items.append((b"", b""))
+
+        with stage("decrypt"):
+            decrypted, decrypted_valid = decrypt_embeddings_batch(
+                items,
+                key=self._decryption_key,
+                dim=self.dim
+            )
+
+        with self._lock:
+            for row, index in enumerate(missing):
+                if not decrypted_valid[row]:
+                    continue
+
+                facial_data = facial_data_list[index]
+                self._store(facial_data.get('nonce', ''), facial_data['embedding'], decrypted[row], now)
+                out[index] = decrypted[row]
+                valid[index] = True
+
+        return out, valid
+
+    def get_decrypted_embedding(self, facial_data: Dict) -> np.ndarray:
         """
         Obtém embedding descriptografado (com cache).
-        
+
         Args:
             facial_data: Dict com 'embedding' e 'nonce' em Base64
-            
+
         Returns:
-            Lista de floats (embedding)
+            np.ndarray float32 (embedding)
         """
-        ciphertext_b64 = facial_data['embedding']
-        nonce_b64 = facial_data['nonce']
-        
-        # Busca no cache ou descriptografa
-        embedding_tuple = self._decrypt_cached(ciphertext_b64, nonce_b64)
-        
-        # Retorna como lista
-        return list(embedding_tuple)
-    
+        matrix, valid = self.get_decrypted_embeddings([facial_data])
+        if not valid[0]:
+            raise ValueError("Falha ao descriptografar embedding")
+        return matrix[0]
+
+    # ================================
+    # 🧹 MANUTENÇÃO
+    # ================================
+
+    def invalidate(self, nonce_b64: str) -> bool:
+        """Remove um embedding do cache (ex.: aluno recadastrou o rosto)"""
+        with self._lock:
+            entry = self._index.pop(nonce_b64, None)
+            if entry is None:
+                return False
+            self._free.append(entry[0])
+            return True
+
     def clear_cache(self):
         """Limpa o cache (útil para testes ou reload de dados)"""
-        self._decrypt_cached.cache_clear()
-    
+        with self._lock:
+            self._reset()
+
     def get_cache_info(self) -> Dict:
         """Retorna estatísticas do cache"""
-        info = self._decrypt_cached.cache_info()
-        return {
-            "hits": info.hits,
-            "misses": info.misses,
-            "size": info.currsize,
-            "maxsize": info.maxsize,
-            "hit_rate": f"{(info.hits / (info.hits + info.misses) * 100):.2f}%" if (info.hits + info.misses) > 0 else "0%"
-        }
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "resident_hits": self._resident_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "size": len(self._index),
+                "maxsize": self.capacity,
+                "resident_bytes": self._arena.nbytes,
+                "capacity_bytes": self.capacity * self.row_bytes,
+                "hit_rate": f"{(self._hits / total * 100):.2f}%" if total > 0 else "0%"
+            }
 
 
 # Instância global do cache
-embedding_cache = EmbeddingCache()
\ No newline at end of file
+embedding_cache = EmbeddingCache()
@@ -1,26 +1,53 @@
 import os
-import struct
 import base64
-from typing import List, Dict
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, Optional, Sequence, Tuple
+
+import numpy as np
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from app.core.settings import settings
 
-def encrypt_embedding(embedding: List[float]) -> Dict[str, str]:
-    """
-    Criptografa embedding facial usando AES-256-GCM
-    e retorna dados em Base64 (JSON-safe).
-    """
+# Embeddings são armazenados como float64 big-endian (equivalente a struct "!d")
+EMBEDDING_WIRE_DTYPE = np.dtype(">f8")
+EMBEDDING_DIM = 128
 
-    embedding_bytes = b"".join(
-        struct.pack("!d", value) for value in embedding
-    )
 
+@lru_cache(maxsize=1)
+def _default_key() -> bytes:
     key = base64.b64decode(settings.AES_ENCRYPTION_KEY)
 
     if len(key) != 32:
         raise ValueError("AES_ENCRYPTION_KEY deve ter 32 bytes (Base64 de 256 bits)")
 
-    aesgcm = AESGCM(key)
+    return key
+
+
+@lru_cache(maxsize=4)
+def _get_cipher(key: bytes) -> AESGCM:
+    """Reutiliza o objeto AESGCM (a expansão da chave é feita uma vez)."""
+    return AESGCM(key)
+
+
+def ciphertext_digest(ciphertext_b64: str) -> str:
+    """
+    Digest estável do ciphertext em Base64 (igual em todos os workers,
+    ao contrário de `hash()`): confirma que um nonce já conhecido ainda
+    corresponde ao mesmo embedding cifrado.
+    """
+    return hashlib.blake2b(ciphertext_b64.encode(), digest_size=16).hexdigest()
+
+
+def encrypt_embedding(embedding: Sequence[float]) -> Dict[str, str]:
+    """
+    Criptografa embedding facial usando AES-256-GCM
+    e retorna dados em Base64 (JSON-safe).
+    """
+
+    embedding_bytes = np.asarray(embedding, dtype=EMBEDDING_WIRE_DTYPE).tobytes()
+
+    aesgcm = _get_cipher(_default_key())
     nonce = os.urandom(12)
 
     ciphertext = aesgcm.encrypt(
@@ -46,8 +73,8 @@ def decrypt_embedding(
     e reconstrói a lista de floats.
     """
 
-    # 1️ Inicializa AES-GCM com a chave
-    aesgcm = AESGCM(key)
+    # 1️ AES-GCM com a chave (objeto reaproveitado entre chamadas)
+    aesgcm = _get_cipher(key)
 
     # 2️ Descriptografa (verifica integridade automaticamente)
     plaintext = aesgcm.decrypt(
@@ -56,10 +83,95 @@ def decrypt_embedding(
         associated_data=None
     )
 
-    # 3️ Reconstrói o embedding (8 bytes por float64)
-    embedding = [
-        struct.unpack("!d", plaintext[i:i + 8])[0]
-        for i in range(0, len(plaintext), 8)
-    ]
+    # 3️ Reconstrói o embedding (8 bytes por float64) sem unpack por elemento
+    return np.frombuffer(plaintext, dtype=EMBEDDING_WIRE_DTYPE).tolist()
+
+
+def _decrypt_into(
+    aesgcm: AESGCM,
+    items: Sequence[Tuple[bytes, bytes]],
+    out: np.ndarray,
+    valid: np.ndarray
+):
+    """Descriptografa `items` direto nas linhas de `out` (float32)."""
+    expected_size = out.shape[1] * EMBEDDING_WIRE_DTYPE.itemsize
+
+    for index, (ciphertext, nonce) in enumerate(items):
+        try:
+            plaintext = aesgcm.decrypt(nonce, ciphertext, None)
+        except Exception:
+            continue
+
+        if len(plaintext) != expected_size:
+            continue
+
+        # View sobre o buffer + conversão para float32 em C
+        out[index] = np.frombuffer(plaintext, dtype=EMBEDDING_WIRE_DTYPE)
+        valid[index] = True
+
+
+def decrypt_embeddings_batch(
+    items: Sequence[Tuple[bytes, bytes]],
+    key: Optional[bytes] = None,
+    dim: int = EMBEDDING_DIM,
+    threads: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Descriptografa vários embeddings (ciphertext, nonce) de uma vez.
+
+    Usa um único objeto AESGCM e escreve cada vetor direto em uma matriz
+    pré-alocada. Lotes grandes podem ser divididos entre threads.
+
+    Returns:
+        (matriz float32 NxD, máscara booleana das linhas válidas)
+        Linhas que falham na autenticação ou têm tamanho inesperado
+        ficam marcadas como inválidas em vez de abortar o lote.
+    """
+    aesgcm = _get_cipher(key or _default_key())
+    threads = threads or settings.DECRYPT_BATCH_THREADS
+
+    out = np.zeros((len(items), dim), dtype=np.float32)
+    valid = np.zeros(len(items), dtype=bool)
+
+    if threads <= 1 or len(items) < settings.DECRYPT_BATCH_THREAD_MIN:
+        _decrypt_into(aesgcm, items, out, valid)
+        return out, valid
+
+    chunk = -(-len(items) // threads)
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [
+            executor.submit(
+                _decrypt_into,
+                aesgcm,
+                items[start:start + chunk],
+                out[start:start + chunk],
+                valid[start:start + chunk]
+            )
+            for start in range(0, len(items), chunk)
+        ]
+        for future in futures:
+            future.result()
+
+    return out, valid
+
+
+def decrypt_facial_batch(
+    facial_data_list: Sequence[Dict],
+    key: Optional[bytes] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Igual a `decrypt_embeddings_batch`, recebendo os dicts
+    {'embedding', 'nonce'} em Base64 como vêm da API principal.
+    """
+    items = []
+    for facial_data in facial_data_list:
+        try:
+            items.append((
+                base64.b64decode(facial_data["embedding"]),
+                base64.b64decode(facial_data["nonce"])
+            ))
+        except Exception:
+            # Entrada malformada: nonce vazio garante falha na descriptografia
+            items.append((b"", b""))
 
-    return embedding
+    return decrypt_embeddings_batch(items, key=key)
@@ -1,109 +1,358 @@
+import logging
+import os
+import time
+
+import cv2
 import face_recognition
 import numpy as np
-import tempfile
-import os
 
-def generate_embedding_from_images(file_bytes_list: list[bytes]) -> np.ndarray:
+from app.core.metrics import stage
+from app.core.settings import settings
+from app.services.profiles import PROFILES, RecognitionProfile, get_profile
+from app.services.quality_service import FaceQualityError
+from app.services.quality_service import check_face_quality, measure_sharpness
+from app.utils.image_codec import decode_image, group_image_max_pixels
+
+logger = logging.getLogger(__name__)
+
+# JPEG sintético do aquecimento (gerado uma vez por worker)
+_warm_up_jpeg: bytes | None = None
+
+
+def detect_faces(
+    image: np.ndarray,
+    scale: float | None = None,
+    upsample: int | None = None
+) -> list[tuple[int, int, int, int]]:
+    """
+    Detecta rostos em uma cópia reduzida da imagem e devolve as caixas
+    na resolução original (top, right, bottom, left).
+
+    O custo do HOG cresce com o número de pixels; no totem o rosto é
+    grande e próximo, então detectar em escala reduzida não perde nada.
+    O encoding continua sendo feito sobre a imagem original.
+    """
+    scale = settings.DETECTION_SCALE if scale is None else scale
+    upsample = settings.DETECTION_UPSAMPLE if upsample is None else upsample
+
+    if scale >= 1:
+        return face_recognition.face_locations(
+            image,
+            number_of_times_to_upsample=upsample
+        )
+
+    small = cv2.resize(
+        image,
+        None,
+        fx=scale,
+        fy=scale,
+        interpolation=cv2.INTER_AREA
+    )
+    small_locations = face_recognition.face_locations(
+        small,
+        number_of_times_to_upsample=upsample
+    )
+
+    height, width = image.shape[:2]
+    return [
+        (
+            max(int(round(top / scale)), 0),
+            min(int(round(right / scale)), width),
+            min(int(round(bottom / scale)), height),
+            max(int(round(left / scale)), 0)
+        )
+        for top, right, bottom, left in small_locations
+    ]
+
+
+def _encode(
+    image: np.ndarray,
+    face_locations: list[tuple[int, int, int, int]],
+    profile: RecognitionProfile
+) -> list[np.ndarray]:
+    return face_recognition.face_encodings(
+        image,
+        face_locations,
+        num_jitters=profile.num_jitters,
+        model=profile.landmark_model
+    )
+
+
+def _encode_enrollment_photo(image_bytes: bytes, recognition_profile: RecognitionProfile) -> np.ndarray:
+    with stage("decode"):
+        image = decode_image(image_bytes, max_dimension=recognition_profile.max_dimension)
+    with stage("detect"):
+        face_locations = detect_faces(
+            image,
+            scale=recognition_profile.detection_scale,
+            upsample=recognition_profile.upsample
+        )
+
+    # Validações
+    if not face_locations:
+        raise ValueError("Nenhum rosto detectado")
+
+    if len(face_locations) > 1:
+        raise ValueError("Múltiplos rostos detectados")
+
+    # Portão de qualidade (tamanho, exposição, nitidez, pose)
+    with stage("quality"):
+        check_face_quality(image, face_locations[0])
+
+    with stage("encode"):
+        encodings = _encode(image, face_locations, recognition_profile)
+    if not encodings:
+        raise ValueError("Nenhum rosto detectado")
+
+    return encodings[0]
+
+
+def encode_enrollment_photo(file_bytes: bytes, profile: str | None = None) -> np.ndarray:
+    """
+    Encoding (sem normalizar) de uma única foto de cadastro.
+    Usado pelo /encode/bulk, que distribui as fotos entre os workers;
+    a média por aluno fica com `average_embeddings`.
+
+    Raises:
+        FaceQualityError: Se a foto for recusada pela qualidade
+        ValueError: Sem rosto, com vários rostos ou imagem inválida
+    """
+    return _encode_enrollment_photo(file_bytes, get_profile(profile, settings.PROFILE_ENCODE))
+
+
+def average_embeddings(embeddings: list[np.ndarray]) -> np.ndarray:
+    """Embedding médio normalizado das fotos de uma mesma pessoa."""
+    avg_embedding = np.mean(embeddings, axis=0)
+    return avg_embedding / np.linalg.norm(avg_embedding)
+
+
+def generate_embedding_from_images(
+    file_bytes_list: list[bytes],
+    profile: str | None = None
+) -> np.ndarray:
     """
     Gera embedding médio a partir de múltiplas fotos da mesma pessoa.
     
     Args:
         file_bytes_list: Lista de bytes de imagens
+        profile: Perfil de reconhecimento (padrão: PROFILE_ENCODE)
         
     Returns:
         np.ndarray: Embedding médio normalizado
         
     Raises:
+        FaceQualityError: Se todas as fotos forem recusadas pela qualidade
         ValueError: Se nenhuma foto válida for processada
     """
     if not file_bytes_list:
         raise ValueError("Lista de imagens vazia")
+
+    recognition_profile = get_profile(profile, settings.PROFILE_ENCODE)
     
     embeddings = []
     errors = []
+    quality_reasons = []
     
     for idx, file_bytes in enumerate(file_bytes_list):
-        tmp_path = None
         try:
-            # Criar arquivo temporário
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-                tmp.write(file_bytes)
-                tmp_path = tmp.name
-            
-            # Carregar e processar imagem
-            image = face_recognition.load_image_file(tmp_path)
-            face_locations = face_recognition.face_locations(image)
-            
-            # Validações
-            if not face_locations:
-                errors.append(f"Foto {idx + 1}: Nenhum rosto detectado")
-                continue
-            
-            if len(face_locations) > 1:
-                errors.append(f"Foto {idx + 1}: Múltiplos rostos detectados")
-                continue
-            
-            # Verificar tamanho do rosto
-            top, right, bottom, left = face_locations[0]
-            face_height = bottom - top
-            if face_height < 80:
-                errors.append(f"Foto {idx + 1}: Rosto muito pequeno ou distante")
-                continue
-            
-            # Gerar embedding
-            encodings = face_recognition.face_encodings(image, face_locations)
-            if encodings:
-                embeddings.append(encodings[0])
-            
+            embeddings.append(_encode_enrollment_photo(file_bytes, recognition_profile))
+        except FaceQualityError as e:
+            quality_reasons.append(e.reason)
+            errors.append(f"Foto {idx + 1}: {e.message}")
+        except ValueError as e:
+            errors.append(f"Foto {idx + 1}: {e}")
         except Exception as e:
             errors.append(f"Foto {idx + 1}: Erro ao processar - {str(e)}")
-        
-        finally:
-            # Limpar arquivo temporário
-            if tmp_path and os.path.exists(tmp_path):
-                os.remove(tmp_path)
     
     # Verificar se conseguimos processar pelo menos algumas fotos
     if not embeddings:
         error_msg = "Nenhuma foto válida processada.\n" + "\n".join(errors)
+        if len(quality_reasons) == len(file_bytes_list):
+            raise FaceQualityError(quality_reasons[0], error_msg)
         raise ValueError(error_msg)
     
     # Avisar se algumas fotos falharam
     if len(embeddings) < len(file_bytes_list):
-        print(
-            f"Apenas {len(embeddings)}/{len(file_bytes_list)} fotos processadas. "
-            f"Erros: {'; '.join(errors)}"
+        logger.warning(
+            "Apenas %d/%d fotos processadas. Erros: %s",
+            len(embeddings),
+            len(file_bytes_list),
+            "; ".join(errors)
         )
     
-    # Calcular embedding médio
-    avg_embedding = np.mean(embeddings, axis=0)
-    
-    # Normalizar
-    avg_embedding = avg_embedding / np.linalg.norm(avg_embedding)
-    
-    return avg_embedding
+    # Embedding médio normalizado
+    return average_embeddings(embeddings)
 
 
-def generate_embedding_from_image(file_bytes: bytes) -> np.ndarray:
-    # cria arquivo temporário
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-        tmp.write(file_bytes)
-        tmp_path = tmp.name
+def generate_embedding_from_image(file_bytes: bytes, profile: str | None = None) -> np.ndarray:
+    recognition_profile = get_profile(profile, settings.PROFILE_RECOGNIZE)
+
+    with stage("decode"):
+        image = decode_image(file_bytes, max_dimension=recognition_profile.max_dimension)
+    with stage("detect"):
+        face_locations = detect_faces(
+            image,
+            scale=recognition_profile.detection_scale,
+            upsample=recognition_profile.upsample
+        )
 
-    try:
-        image = face_recognition.load_image_file(tmp_path)
-        encodings = face_recognition.face_encodings(image)
+    if not face_locations:
+        raise ValueError("Nenhum rosto detectado na imagem")
 
-        if not encodings:
-            raise ValueError("Nenhum rosto detectado na imagem")
+    if len(face_locations) > 1:
+        raise ValueError("Mais de um rosto detectado na imagem")
 
-        if len(encodings) > 1:
-            raise ValueError("Mais de um rosto detectado na imagem")
+    # Recusa cedo (FaceQualityError) antes da etapa cara
+    with stage("quality"):
+        check_face_quality(image, face_locations[0])
 
-        embeding = encodings[0]
-        embeding = embeding / np.linalg.norm(embeding)  # Normaliza o vetor
+    with stage("encode"):
+        encodings = _encode(image, face_locations, recognition_profile)
+    if not encodings:
+        raise ValueError("Nenhum rosto detectado na imagem")
 
-        return embeding
+    embeding = encodings[0]
+    embeding = embeding / np.linalg.norm(embeding)  # Normaliza o vetor
+
+    return embeding
+
+
+def detect_frame_faces(file_bytes: bytes, profile: str | None = None) -> list[dict]:
+    """
+    Detecção barata de um frame do stream (sem encoding).
+    Usa a detecção do perfil (padrão: PROFILE_STREAM); o tamanho do
+    frame continua limitado por STREAM_IMAGE_MAX_DIMENSION.
+
+    Returns:
+        Lista de {"box": (top, right, bottom, left), "sharpness": float},
+        com a nitidez (variância do Laplaciano) medida no recorte do rosto.
+    """
+    recognition_profile = get_profile(profile, settings.PROFILE_STREAM)
+
+    with stage("decode"):
+        image = decode_image(file_bytes, max_dimension=settings.STREAM_IMAGE_MAX_DIMENSION)
+    with stage("detect"):
+        face_locations = detect_faces(
+            image,
+            scale=recognition_profile.detection_scale,
+            upsample=recognition_profile.upsample
+        )
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+    return [
+        {"box": tuple(int(v) for v in box), "sharpness": measure_sharpness(gray, box)}
+        for box in face_locations
+    ]
+
+
+def encode_frame_face(
+    file_bytes: bytes,
+    box: tuple[int, int, int, int],
+    profile: str | None = None
+) -> np.ndarray:
+    """
+    Encoding do rosto já localizado pelo tracker (pula a detecção).
+    Decodifica com os mesmos parâmetros do `detect_frame_faces`,
+    então a caixa está nas mesmas coordenadas.
+    """
+    with stage("decode"):
+        image = decode_image(file_bytes, max_dimension=settings.STREAM_IMAGE_MAX_DIMENSION)
+    with stage("quality"):
+        check_face_quality(image, box)
+
+    with stage("encode"):
+        encodings = _encode(image, [box], get_profile(profile, settings.PROFILE_STREAM))
+
+    if not encodings:
+        raise ValueError("Nenhum rosto detectado na imagem")
+
+    return encodings[0] / np.linalg.norm(encodings[0])
+
+
+def generate_embeddings_for_all_faces(file_bytes: bytes, profile: str | None = None) -> list[dict]:
+    """
+    Detecta todos os rostos da imagem (foto da turma / fila no totem)
+    e gera os embeddings em uma única chamada ao encoder.
+
+    Decodificação e detecção usam as configurações GROUP_* (rostos
+    pequenos pedem mais resolução); o encoding (jitters e landmarks) é o
+    do perfil (padrão: PROFILE_RECOGNIZE), como nos outros endpoints.
+
+    Returns:
+        Lista de {"box": (top, right, bottom, left), "embedding": np.ndarray}
+        com embeddings normalizados, do maior rosto para o menor.
+    """
+    recognition_profile = get_profile(profile, settings.PROFILE_RECOGNIZE)
+
+    with stage("decode"):
+        image = decode_image(
+            file_bytes,
+            max_dimension=settings.GROUP_IMAGE_MAX_DIMENSION,
+            max_pixels=group_image_max_pixels()
+        )
+    with stage("detect"):
+        face_locations = detect_faces(
+            image,
+            scale=settings.GROUP_DETECTION_SCALE,
+            upsample=settings.GROUP_DETECTION_UPSAMPLE
+        )
+
+    if not face_locations:
+        raise ValueError("Nenhum rosto detectado na imagem")
+
+    # Maiores rostos primeiro; limita o custo do encoding
+    face_locations = sorted(
+        face_locations,
+        key=lambda box: (box[2] - box[0]) * (box[1] - box[3]),
+        reverse=True
+    )[:settings.GROUP_MAX_FACES]
+
+    with stage("encode"):
+        encodings = _encode(image, face_locations, recognition_profile)
+
+    return [
+        {
+            "box": tuple(int(v) for v in box),
+            "embedding": encoding / np.linalg.norm(encoding)
+        }
+        for box, encoding in zip(face_locations, encodings)
+    ]
+
+
+def warm_up_inference() -> tuple[int, float]:
+    """
+    Inferência de aquecimento: uma imagem sintética passa pelo decode,
+    detecção, portão de qualidade e encoding de cada perfil (alocações
+    do dlib, caminhos do libjpeg e do OpenCV), fora do caminho do aluno.
+
+    Returns:
+        (pid do worker, segundos gastos)
+    """
+    global _warm_up_jpeg
+    start = time.perf_counter()
+
+    if _warm_up_jpeg is None:
+        rng = np.random.default_rng(0)
+        gradient = np.linspace(60, 190, 1280, dtype=np.float32)[None, :, None]
+        noise = rng.normal(0, 20, (960, 1280, 3)).astype(np.float32)
+        pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+        _warm_up_jpeg = cv2.imencode(".jpg", pixels)[1].tobytes()
+
+    for recognition_profile in PROFILES.values():
+        image = decode_image(_warm_up_jpeg, max_dimension=recognition_profile.max_dimension)
+        detect_faces(
+            image,
+            scale=recognition_profile.detection_scale,
+            upsample=recognition_profile.upsample
+        )
+
+        # Caixa fixa no centro: o encoder não depende de achar um rosto
+        height, width = image.shape[:2]
+        box = (height // 4, 3 * width // 4, 3 * height // 4, width // 4)
+        try:
+            check_face_quality(image, box)
+        except FaceQualityError:
+            pass
+        face_recognition.face_encodings(image, [box], num_jitters=1, model=recognition_profile.landmark_model)
 
-    finally:
-        os.remove(tmp_path)
+    return os.getpid(), time.perf_counter() - start
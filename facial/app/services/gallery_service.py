@@ -0,0 +1,298 @@
+"""
+Galeria residente de embeddings por sala
+- Construída a partir dos alunos sincronizados com a API principal
+- Uma única matriz float32 (já normalizada) com as linhas agrupadas por
+  sala: a galeria de cada sala é uma view contígua, sem cópia própria
+- Publicada como um snapshot imutável, trocado por uma única referência
+  (leitores nunca veem estado parcial)
+- Índice ANN da escola inteira (identificação sem sala) no mesmo snapshot
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.settings import settings
+from app.models.student import StudentEmbedding
+from app.services.ann_index import IVFIndex, build_campus_index
+
+
+@dataclass(frozen=True)
+class RoomGallery:
+    """Candidatos de uma sala: ids e matriz NxD alinhadas pelo índice."""
+    student_ids: List[str]
+    matrix: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.student_ids)
+
+
+@dataclass(frozen=True)
+class GalleryMatrix:
+    """
+    Matriz float32 única do snapshot, com as linhas agrupadas por sala:
+    a galeria de cada sala é a fatia `matrix[início:fim]` (view, sem cópia).
+
+    - `row_students[linha]`: aluno (posição em `students`) de cada linha
+    - `student_rows[aluno]`: primeira linha do aluno (a que `facial` aponta)
+    - `rooms[sala] = (início, fim)`
+
+    Aluno em várias salas tem uma linha em cada (a varredura de cada sala
+    precisa ser contígua); alunos sem sala ficam no fim.
+    """
+    matrix: np.ndarray
+    row_students: np.ndarray
+    student_rows: np.ndarray
+    rooms: Dict[str, Tuple[int, int]]
+
+
+@dataclass(frozen=True)
+class GallerySnapshot:
+    """
+    Estado completo de uma sincronização.
+    `generation` cresce a cada publicação; `etag` é o da API principal.
+    """
+    generation: int = 0
+    etag: Optional[str] = None
+    students: Tuple[StudentEmbedding, ...] = ()
+    galleries: Dict[str, RoomGallery] = field(default_factory=dict)
+    campus: Optional[IVFIndex] = None
+    built_at: float = 0.0
+    nonce_index: Dict[str, int] = field(default_factory=dict)  # nonce -> posição em `students`
+    layout: Optional[GalleryMatrix] = None
+
+
+def stack_students(
+    students: Tuple[StudentEmbedding, ...]
+) -> Tuple[GalleryMatrix, Tuple[StudentEmbedding, ...]]:
+    """
+    Monta a `GalleryMatrix` e devolve os alunos com `facial` apontando para
+    a própria linha: salas, índice da escola e o reaproveitamento da próxima
+    sincronização leem da mesma matriz (e matrizes de sincronizações
+    anteriores não ficam presas por views de alunos reaproveitados).
+    """
+    members_by_room: Dict[str, List[int]] = {}
+    roomless: List[int] = []
+    for index, student in enumerate(students):
+        if not student.rooms:
+            roomless.append(index)
+        for room_id in student.rooms:
+            members_by_room.setdefault(room_id, []).append(index)
+
+    rooms: Dict[str, Tuple[int, int]] = {}
+    order: List[int] = []
+    for room_id, members in members_by_room.items():
+        rooms[room_id] = (len(order), len(order) + len(members))
+        order.extend(members)
+    order.extend(roomless)
+
+    row_students = np.asarray(order, dtype=np.int32)
+    student_rows = np.empty(len(students), dtype=np.int32)
+    # Primeira linha de cada aluno (percorre de trás para frente: a primeira vence)
+    student_rows[row_students[::-1]] = np.arange(len(order) - 1, -1, -1, dtype=np.int32)
+
+    if students:
+        matrix = np.vstack([students[i].facial for i in order]).astype(np.float32, copy=False)
+    else:
+        matrix = np.empty((0, 0), dtype=np.float32)
+    matrix.setflags(write=False)
+
+    stacked = tuple(
+        StudentEmbedding(
+            id=s.id,
+            facial=matrix[student_rows[index]],
+            rooms=s.rooms,
+            nonce=s.nonce,
+            ciphertext_digest=s.ciphertext_digest
+        )
+        for index, s in enumerate(students)
+    )
+    return GalleryMatrix(matrix, row_students, student_rows, rooms), stacked
+
+
+def build_galleries(
+    students: Tuple[StudentEmbedding, ...],
+    layout: GalleryMatrix
+) -> Dict[str, RoomGallery]:
+    """Galeria de cada sala: view contígua sobre `layout.matrix`."""
+    return {
+        room_id: RoomGallery(
+            student_ids=[students[i].id for i in layout.row_students[start:end].tolist()],
+            matrix=layout.matrix[start:end]
+        )
+        for room_id, (start, end) in layout.rooms.items()
+    }
+
+
+def build_campus(
+    students: Tuple[StudentEmbedding, ...],
+    layout: GalleryMatrix
+) -> Optional[IVFIndex]:
+    """
+    Índice com todos os alunos (uma linha por aluno, independente das salas).
+    Sem alunos em mais de uma sala, o índice lê a própria matriz da galeria
+    (com os ids na ordem das linhas).
+    """
+    if not students:
+        return None
+
+    if len(layout.matrix) == len(students):
+        ids = [students[i].id for i in layout.row_students.tolist()]
+        return build_campus_index(ids, layout.matrix)
+
+    return build_campus_index([s.id for s in students], layout.matrix[layout.student_rows])
+
+
+def build_nonce_index(students: Tuple[StudentEmbedding, ...]) -> Dict[str, int]:
+    """
+    Localiza um embedding cifrado (pelo nonce) já descriptografado na galeria.
+    O EmbeddingCache consulta antes de descriptografar um candidato e só
+    usa a linha se o `ciphertext_digest` do aluno também bater.
+    """
+    return {s.nonce: index for index, s in enumerate(students) if s.nonce}
+
+
+class GalleryStore:
+    """
+    Mantém o snapshot publicado das galerias de todas as salas.
+    """
+
+    def __init__(self):
+        self._snapshot = GallerySnapshot()
+
+    @property
+    def snapshot(self) -> GallerySnapshot:
+        return self._snapshot
+
+    def build_snapshot(
+        self,
+        students: Tuple[StudentEmbedding, ...],
+        etag: Optional[str] = None
+    ) -> GallerySnapshot:
+        """
+        Monta o próximo snapshot (não publica). Pode rodar fora do event loop.
+        """
+        layout, students = stack_students(tuple(students))
+        return GallerySnapshot(
+            generation=self._snapshot.generation + 1,
+            etag=etag,
+            students=students,
+            galleries=build_galleries(students, layout),
+            campus=build_campus(students, layout),
+            built_at=time.time(),
+            nonce_index=build_nonce_index(students),
+            layout=layout
+        )
+
+    def publish(self, snapshot: GallerySnapshot):
+        """Troca atômica: uma única atribuição de referência."""
+        self._snapshot = snapshot
+
+    def get(self, room_id: str) -> Optional[RoomGallery]:
+        return self._snapshot.galleries.get(room_id)
+
+    @property
+    def campus(self) -> Optional[IVFIndex]:
+        return self._snapshot.campus
+
+    def get_stats(self) -> Dict:
+        snapshot = self._snapshot
+        galleries = snapshot.galleries
+
+        # As salas são views da mesma matriz: ela é a memória inteira
+        matrix = snapshot.layout.matrix if snapshot.layout is not None else None
+
+        return {
+            "generation": snapshot.generation,
+            "students": len(snapshot.students),
+            "rooms": len(galleries),
+            "embeddings": sum(len(g) for g in galleries.values()),
+            "bytes": 0 if matrix is None else matrix.nbytes,
+            "duplicate_rows": 0 if matrix is None else len(matrix) - len(snapshot.students),
+            "campus_index": snapshot.campus.get_stats() if snapshot.campus else None,
+            "built_at": snapshot.built_at,
+        }
+
+
+class CandidateGalleryCache:
+    """
+    Cache LRU das galerias montadas a partir do campo `candidates`.
+
+    A chave é um digest de (sala, ids, nonces): a mesma lista de uma sala
+    chega inalterada centenas de vezes por hora, então a descriptografia,
+    validação e `np.vstack` só acontecem na primeira vez.
+    O limite é em bytes das matrizes armazenadas.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, RoomGallery]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def make_key(room_id: str, candidates: List[Dict]) -> str:
+        digest = hashlib.blake2b(room_id.encode(), digest_size=16)
+        for candidate in candidates:
+            facial_data = candidate.get("facialEmbedding") or {}
+            digest.update(b"\0")
+            digest.update(str(candidate.get("_id", "")).encode())
+            digest.update(b"\1")
+            digest.update(str(facial_data.get("nonce", "")).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[RoomGallery]:
+        gallery = self._entries.get(key)
+        if gallery is None:
+            self._misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return gallery
+
+    def put(self, key: str, gallery: RoomGallery):
+        size = gallery.matrix.nbytes
+        if size > self.max_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.matrix.nbytes
+
+        self._entries[key] = gallery
+        self._bytes += size
+
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.matrix.nbytes
+            self._evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def get_cache_info(self) -> Dict:
+        total = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "size": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hit_rate": f"{(self._hits / total * 100):.2f}%" if total > 0 else "0%"
+        }
+
+
+# Instância global da galeria
+gallery_store = GalleryStore()
+
+# Cache das galerias enviadas via `candidates`
+candidate_gallery_cache = CandidateGalleryCache(settings.CANDIDATE_CACHE_MAX_BYTES)
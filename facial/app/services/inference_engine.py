@@ -0,0 +1,126 @@
+"""
+Motor de inferência facial em pool de processos
+- Tira a detecção/encoding do dlib de dentro do event loop
+- Um worker por núcleo, cada um com os modelos já carregados
+- Fila limitada: acima da capacidade a requisição é recusada (503)
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from app.core.logger import configure_logging, request_id
+from app.core.metrics import observe_worker_timings, run_collecting_timings
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceQueueFullError(RuntimeError):
+    """Fila de inferência cheia: o serviço está saturado."""
+
+
+def _init_worker():
+    """
+    Inicializa cada processo do pool.
+    Importar o face_service carrega os modelos do dlib uma única vez
+    por worker, fora do caminho da requisição.
+    """
+    # Ctrl+C é tratado pelo processo principal (uvicorn)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    configure_logging()
+
+    import app.services.face_service  # noqa: F401
+
+
+def _run_in_worker(fn: Callable, args: tuple, caller_request_id: str):
+    """Executado no worker: herda o request_id de quem pediu o job."""
+    request_id.set(caller_request_id)
+    return run_collecting_timings(fn, args)
+
+
+class InferenceEngine:
+    """
+    Pool de processos para as etapas pesadas (decode, detecção, encoding).
+    As rotas fazem `await inference_engine.run(fn, *args)`.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+        self.workers = settings.INFERENCE_WORKERS or os.cpu_count() or 1
+        self.queue_size = settings.INFERENCE_QUEUE_SIZE
+
+    @property
+    def capacity(self) -> int:
+        """Jobs simultâneos aceitos: um executando por worker + fila."""
+        return self.workers + self.queue_size
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def start(self):
+        if self._executor is not None:
+            return
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(settings.INFERENCE_START_METHOD),
+            initializer=_init_worker
+        )
+        logger.info("🧠 Motor de inferência iniciado com %d workers", self.workers)
+
+    def shutdown(self):
+        if self._executor is None:
+            return
+
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+        logger.info("🧠 Motor de inferência finalizado")
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """
+        Executa `fn(*args)` em um worker do pool.
+        `fn` e os argumentos precisam ser serializáveis (pickle).
+        As etapas medidas no worker vão para o /metrics.
+        """
+        if self._executor is None:
+            raise RuntimeError("Motor de inferência não iniciado")
+
+        if self._in_flight >= self.capacity:
+            raise InferenceQueueFullError(
+                "Serviço de reconhecimento sobrecarregado, tente novamente"
+            )
+
+        executor = self._executor
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            start = time.perf_counter()
+            result, timings = await loop.run_in_executor(
+                executor, _run_in_worker, fn, args, request_id.get()
+            )
+            observe_worker_timings(timings, time.perf_counter() - start)
+            return result
+        except BrokenProcessPool:
+            # Um worker morreu (ex.: OOM): recria o pool para as próximas
+            if self._executor is executor:
+                logger.warning("⚠️ Pool de inferência quebrado, reiniciando workers")
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                self.start()
+            raise
+        finally:
+            self._in_flight -= 1
+
+
+# Instância global do motor
+inference_engine = InferenceEngine()
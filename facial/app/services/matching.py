@@ -0,0 +1,139 @@
+"""
+Kernel de matching (top-k por distância euclidiana)
+
+Como os embeddings da galeria e da query são normalizados,
+||a - b||² = 2 - 2·(a·b). A busca usa então um único produto
+matriz-vetor (BLAS) + argpartition, sem a matriz temporária NxD de
+`matrix - query`. Os poucos melhores candidatos são re-ranqueados com a
+distância exata, então a decisão é a mesma da subtração completa.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+# Candidatos extras re-ranqueados com distância exata (cobre empates numéricos)
+_RERANK_EXTRA = 2
+
+
+@dataclass(frozen=True)
+class TopKResult:
+    """Melhores candidatos de uma query, ordenados pela distância."""
+    indices: np.ndarray  # índices na galeria
+    distances: np.ndarray  # distâncias euclidianas exatas
+
+    @property
+    def best_index(self) -> int:
+        return int(self.indices[0])
+
+    @property
+    def best_distance(self) -> float:
+        return float(self.distances[0])
+
+    @property
+    def second_distance(self) -> Optional[float]:
+        return float(self.distances[1]) if len(self.distances) > 1 else None
+
+    @property
+    def margins(self) -> np.ndarray:
+        """Diferença de cada candidato para o melhor."""
+        return self.distances[1:] - self.distances[0]
+
+    @property
+    def margin(self) -> Optional[float]:
+        """Margem entre o melhor e o segundo melhor (None se só há um)."""
+        second = self.second_distance
+        return None if second is None else second - self.best_distance
+
+
+def _select_candidates(similarities: np.ndarray, count: int) -> np.ndarray:
+    """Índices das `count` maiores similaridades (sem ordenar tudo)."""
+    total = similarities.shape[-1]
+    if count >= total:
+        return np.arange(total)
+
+    selected = np.argpartition(-similarities, count - 1)[:count]
+    selected.sort()  # empates resolvidos pelo menor índice, como o argmin
+    return selected
+
+
+def _rerank(
+    matrix: np.ndarray,
+    query: np.ndarray,
+    selected: np.ndarray,
+    k: int
+) -> TopKResult:
+    distances = np.linalg.norm(matrix[selected] - query, axis=1)
+    order = np.argsort(distances, kind="stable")[:k]
+    return TopKResult(indices=selected[order], distances=distances[order])
+
+
+def top_k(matrix: np.ndarray, query: np.ndarray, k: int = 2) -> TopKResult:
+    """
+    Os `k` candidatos mais próximos de `query` em `matrix` (NxD).
+    """
+    if len(matrix) == 0:
+        raise ValueError("Galeria vazia")
+
+    similarities = matrix @ query  # N
+    selected = _select_candidates(similarities, k + _RERANK_EXTRA)
+    return _rerank(matrix, query, selected, k)
+
+
+def top_k_batch(matrix: np.ndarray, queries: np.ndarray, k: int = 2) -> List[TopKResult]:
+    """
+    Top-k para várias queries (QxD) com um único produto matricial QxN.
+    """
+    if len(matrix) == 0:
+        raise ValueError("Galeria vazia")
+
+    similarities = queries @ matrix.T  # QxN
+    count = k + _RERANK_EXTRA
+
+    if count >= matrix.shape[0]:
+        candidates = np.broadcast_to(np.arange(matrix.shape[0]), similarities.shape)
+    else:
+        candidates = np.argpartition(-similarities, count - 1, axis=1)[:, :count]
+        candidates = np.sort(candidates, axis=1)
+
+    return [
+        _rerank(matrix, query, candidates[row], k)
+        for row, query in enumerate(queries)
+    ]
+
+
+def nearest_among(
+    matrix: np.ndarray,
+    query: np.ndarray,
+    similarities: np.ndarray,
+    allowed: np.ndarray
+) -> Optional[float]:
+    """
+    Distância exata do candidato mais próximo entre as linhas `allowed`
+    (máscara), a partir das similaridades já calculadas para a query.
+    Os melhores passam pelo mesmo re-rank do `top_k`.
+    """
+    rows = np.flatnonzero(allowed)
+    if not len(rows):
+        return None
+
+    selected = rows[_select_candidates(similarities[rows], 1 + _RERANK_EXTRA)]
+    return _rerank(matrix, query, selected, 1).best_distance
+
+
+def decide(result: TopKResult, threshold: float, min_margin: float) -> str:
+    """
+    Regra de decisão do reconhecimento:
+    - "rejected": melhor distância acima do threshold
+    - "ambiguous": dentro do threshold, mas o segundo está perto demais
+    - "accepted": dentro do threshold e com margem suficiente (ou candidato único)
+    """
+    if result.best_distance > threshold:
+        return "rejected"
+
+    margin = result.margin
+    if margin is not None and margin < min_margin:
+        return "ambiguous"
+
+    return "accepted"
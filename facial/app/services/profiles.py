@@ -0,0 +1,77 @@
+"""
+Perfis de reconhecimento (latência x precisão)
+
+Cada perfil agrupa os parâmetros do pipeline decode → detecção → encoding:
+- fast: totem no horário de pico (imagem menor, detecção sem upsample)
+- balanced: padrão do /recognize (DETECTION_SCALE / DETECTION_UPSAMPLE)
+- enroll: cadastro (/encode) pode gastar mais: detecção na resolução
+  original e encoding com jitters (média de várias amostras do recorte)
+
+O modelo de landmarks usado no alinhamento fica em "small" (5 pontos) nos
+três perfis: é o padrão do `face_encodings` e o usado nos embeddings já
+cadastrados. Trocar para "large" (68 pontos) muda o alinhamento e desloca
+as distâncias; compare com `python -m benchmarks.bench_profiles` antes.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from app.core.settings import settings
+
+
+@dataclass(frozen=True)
+class RecognitionProfile:
+    name: str
+    max_dimension: int  # maior lado entregue ao detector/encoder
+    detection_scale: float  # escala da cópia usada pelo HOG
+    upsample: int  # upsample do HOG
+    landmark_model: str  # "small" (5 pontos) | "large" (68 pontos)
+    num_jitters: int  # amostras por encoding
+
+
+def _builtin_profiles() -> Dict[str, RecognitionProfile]:
+    return {
+        "fast": RecognitionProfile(
+            name="fast",
+            max_dimension=min(640, settings.IMAGE_MAX_DIMENSION),
+            detection_scale=0.5,
+            upsample=0,
+            landmark_model="small",
+            num_jitters=1
+        ),
+        "balanced": RecognitionProfile(
+            name="balanced",
+            max_dimension=settings.IMAGE_MAX_DIMENSION,
+            detection_scale=settings.DETECTION_SCALE,
+            upsample=settings.DETECTION_UPSAMPLE,
+            landmark_model="small",
+            num_jitters=1
+        ),
+        "enroll": RecognitionProfile(
+            name="enroll",
+            max_dimension=settings.IMAGE_MAX_DIMENSION,
+            detection_scale=1.0,
+            upsample=1,
+            landmark_model="small",
+            num_jitters=settings.ENROLL_NUM_JITTERS
+        ),
+    }
+
+
+PROFILES: Dict[str, RecognitionProfile] = _builtin_profiles()
+
+
+def get_profile(name: Optional[str], default: str = "balanced") -> RecognitionProfile:
+    """
+    Perfil pelo nome (o da requisição ou o padrão da rota).
+
+    Raises:
+        ValueError: perfil desconhecido
+    """
+    name = name or default
+    profile = PROFILES.get(name)
+    if profile is None:
+        raise ValueError(
+            f"Perfil desconhecido: {name} (disponíveis: {', '.join(PROFILES)})"
+        )
+    return profile
@@ -0,0 +1,220 @@
+"""
+Portão de qualidade do rosto (entre a detecção e o encoding)
+
+O encoding de 128-d é a etapa mais cara; rostos borrados, escuros ou
+de perfil quase nunca passam do threshold. As verificações abaixo são
+baratas e rodam antes, recusando cedo com um motivo legível por máquina:
+
+- size: altura do rosto (MIN_FACE_HEIGHT)
+- exposure: brilho médio do rosto
+- sharpness: variância do Laplaciano no rosto redimensionado
+- pose: yaw / roll estimados pelos 5 landmarks (modelo "small")
+
+As verificações rodam na ordem configurada e param na primeira falha.
+Novas verificações podem ser registradas com `@quality_check("nome")`.
+"""
+
+import math
+import threading
+from typing import Callable, Dict, List, Tuple
+
+import cv2
+import face_recognition
+import numpy as np
+
+from app.core.settings import settings
+
+Box = Tuple[int, int, int, int]  # (top, right, bottom, left)
+
+# Altura do recorte usado na nitidez (torna a medida independente da escala)
+_SHARPNESS_HEIGHT = 112
+
+
+class FaceQualityError(Exception):
+    """
+    Rosto recusado pelo portão de qualidade (HTTP 422).
+    `reason` é o código: too_small, too_dark, too_bright, blurry, pose.
+    """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+
+    def __reduce__(self):
+        # Atravessa o pool de processos com o motivo preservado
+        return (type(self), (self.reason, self.message))
+
+    def __str__(self) -> str:
+        return self.message
+
+
+# ================================
+# 📏 MEDIDAS
+# ================================
+
+def _face_crop(gray: np.ndarray, box: Box) -> np.ndarray:
+    top, right, bottom, left = box
+    return gray[max(top, 0):max(bottom, 0), max(left, 0):max(right, 0)]
+
+
+def measure_sharpness(gray: np.ndarray, box: Box) -> float:
+    """Variância do Laplaciano no rosto, com o recorte em altura fixa."""
+    crop = _face_crop(gray, box)
+    if crop.size == 0:
+        return 0.0
+
+    scale = _SHARPNESS_HEIGHT / crop.shape[0]
+    crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(crop, cv2.CV_64F).var())
+
+
+def measure_brightness(gray: np.ndarray, box: Box) -> float:
+    crop = _face_crop(gray, box)
+    return float(crop.mean()) if crop.size else 0.0
+
+
+def measure_pose(image: np.ndarray, box: Box) -> Tuple[float, float]:
+    """
+    (yaw, roll) aproximados a partir dos 5 landmarks.
+
+    - yaw: deslocamento do nariz em relação ao meio dos olhos,
+      em unidades da distância entre os olhos (0 = frontal)
+    - roll: inclinação da linha dos olhos, em graus
+    """
+    landmarks = face_recognition.face_landmarks(image, [box], model="small")
+    if not landmarks:
+        return math.inf, math.inf
+
+    points = landmarks[0]
+    left_eye = np.mean(points["left_eye"], axis=0)
+    right_eye = np.mean(points["right_eye"], axis=0)
+    nose = np.asarray(points["nose_tip"][0], dtype=float)
+
+    eye_vector = right_eye - left_eye
+    eye_distance = float(np.linalg.norm(eye_vector))
+    if eye_distance == 0:
+        return math.inf, math.inf
+
+    eyes_center = (left_eye + right_eye) / 2
+    # Projeção do nariz na direção da linha dos olhos
+    yaw = float(np.dot(nose - eyes_center, eye_vector) / eye_distance ** 2)
+
+    roll = math.degrees(math.atan2(eye_vector[1], eye_vector[0]))
+    if roll > 90:
+        roll -= 180
+    elif roll < -90:
+        roll += 180
+
+    return abs(yaw), abs(roll)
+
+
+# ================================
+# ✅ VERIFICAÇÕES
+# ================================
+
+QualityCheck = Callable[[np.ndarray, np.ndarray, Box, Dict], None]
+_CHECKS: Dict[str, QualityCheck] = {}
+
+
+def quality_check(name: str):
+    """Registra uma verificação: fn(image, gray, box, scores) -> None ou FaceQualityError."""
+    def register(fn: QualityCheck) -> QualityCheck:
+        _CHECKS[name] = fn
+        return fn
+    return register
+
+
+@quality_check("size")
+def _check_size(image, gray, box, scores):
+    height = box[2] - box[0]
+    scores["face_height"] = height
+    if height < settings.MIN_FACE_HEIGHT:
+        raise FaceQualityError("too_small", "Rosto muito pequeno ou distante")
+
+
+@quality_check("exposure")
+def _check_exposure(image, gray, box, scores):
+    brightness = measure_brightness(gray, box)
+    scores["brightness"] = round(brightness, 1)
+    if brightness < settings.QUALITY_MIN_BRIGHTNESS:
+        raise FaceQualityError("too_dark", "Rosto muito escuro")
+    if brightness > settings.QUALITY_MAX_BRIGHTNESS:
+        raise FaceQualityError("too_bright", "Rosto com luz excessiva")
+
+
+@quality_check("sharpness")
+def _check_sharpness(image, gray, box, scores):
+    sharpness = measure_sharpness(gray, box)
+    scores["sharpness"] = round(sharpness, 1)
+    if sharpness < settings.QUALITY_MIN_SHARPNESS:
+        raise FaceQualityError("blurry", "Imagem do rosto borrada")
+
+
+@quality_check("pose")
+def _check_pose(image, gray, box, scores):
+    yaw, roll = measure_pose(image, box)
+    scores["yaw"] = round(yaw, 3)
+    scores["roll"] = round(roll, 1)
+    if yaw > settings.QUALITY_MAX_YAW or roll > settings.QUALITY_MAX_ROLL_DEGREES:
+        raise FaceQualityError("pose", "Rosto virado ou inclinado, olhe para a câmera")
+
+
+def _enabled_checks() -> List[str]:
+    return [name.strip() for name in settings.QUALITY_CHECKS.split(",") if name.strip()]
+
+
+def check_face_quality(image: np.ndarray, box: Box) -> Dict:
+    """
+    Roda as verificações habilitadas (QUALITY_CHECKS) no rosto `box`.
+
+    Returns:
+        Medidas calculadas (até a primeira falha)
+
+    Raises:
+        FaceQualityError: com o motivo da recusa
+    """
+    scores: Dict = {}
+    if not settings.QUALITY_GATE_ENABLED:
+        return scores
+
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    for name in _enabled_checks():
+        check = _CHECKS.get(name)
+        if check is None:
+            raise ValueError(f"Verificação de qualidade desconhecida: {name}")
+        check(image, gray, box, scores)
+
+    return scores
+
+
+# ================================
+# 📊 CONTADORES (processo principal)
+# ================================
+
+class QualityStats:
+    """
+    Recusas por motivo. As verificações rodam nos workers; a contagem
+    acontece no processo principal, quando o erro volta do pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rejections: Dict[str, int] = {}
+
+    def record_rejection(self, reason: str):
+        with self._lock:
+            self._rejections[reason] = self._rejections.get(reason, 0) + 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": settings.QUALITY_GATE_ENABLED,
+                "checks": _enabled_checks(),
+                "rejections": dict(self._rejections),
+                "total_rejections": sum(self._rejections.values()),
+            }
+
+
+# Instância global dos contadores
+quality_stats = QualityStats()
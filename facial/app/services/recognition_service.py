@@ -6,13 +6,26 @@ Serviço de reconhecimento facial usando DISTÂNCIA EUCLIDIANA
 - Estável e consistente com versão antiga
 """
 
-from typing import List, Dict, Optional
+import logging
+from typing import List, Dict, Optional, Tuple
 import numpy as np
 
-from app.services.face_service import generate_embedding_from_image
 from app.services.embedding_cache import embedding_cache
+from app.services.gallery_service import gallery_store
+from app.services.gallery_service import candidate_gallery_cache
+from app.services.gallery_service import RoomGallery
+from app.services.result_cache import recognition_result_cache
+from app.services.shared_gallery import shared_gallery
+from app.services.matching import top_k, top_k_batch, decide, nearest_among, TopKResult
+from app.core.metrics import stage, observe_candidates, count_decision
 from app.core.settings import settings
 
+logger = logging.getLogger(__name__)
+
+# Folga na seleção dos pares do modo grupo (a distância da similaridade
+# erra no arredondamento; quem decide é a distância exata)
+_GROUP_PAIR_SLACK = 1e-3
+
 
 # ================================
 # 🔢 VALIDAÇÃO
@@ -39,14 +52,94 @@ def validate_embedding(embedding: List[float]) -> np.ndarray:
 # 🧠 RECONHECIMENTO FACIAL
 # ================================
 
+def _not_recognized(distance: float = 0.0) -> Dict:
+    return {
+        "studentId": None,
+        "distance": distance,
+        "recognized": False
+    }
+
+
+def _build_candidates_gallery(candidates: List[Dict]) -> Tuple[List[str], Optional[np.ndarray]]:
+    """
+    Descriptografa a lista de candidatos enviada na requisição
+    e monta a matriz NxD (modo legado / override).
+    """
+    student_ids = []
+    facial_data_list = []
+    for candidate in candidates:
+        student_id = candidate.get("_id")
+        facial_data = candidate.get("facialEmbedding")
+
+        if not student_id or not facial_data or "embedding" not in facial_data:
+            continue
+
+        student_ids.append(student_id)
+        facial_data_list.append(facial_data)
+
+    if not facial_data_list:
+        return [], None
+
+    # Descriptografia em lote (só as faltas do cache)
+    embeddings, valid = embedding_cache.get_decrypted_embeddings(facial_data_list)
+
+    norms = np.linalg.norm(embeddings, axis=1)
+    valid &= norms > 0
+
+    for index in np.flatnonzero(~valid):
+        logger.warning("⚠️ Erro no embedding do aluno %s: embedding inválido", student_ids[index])
+
+    if not valid.any():
+        return [], None
+
+    embeddings = embeddings[valid] / norms[valid, None]  # NxD normalizada
+    student_ids = [sid for sid, ok in zip(student_ids, valid) if ok]
+
+    return student_ids, embeddings
+
+
+def _get_candidates_gallery(room_id: str, candidates: List[Dict]) -> Optional[RoomGallery]:
+    """
+    Galeria dos candidatos enviados, reaproveitada do cache quando
+    a mesma lista (ids + nonces) já foi vista para a sala.
+    """
+    key = candidate_gallery_cache.make_key(room_id, candidates)
+
+    gallery = candidate_gallery_cache.get(key)
+    if gallery is not None:
+        return gallery
+
+    student_ids, embeddings_matrix = _build_candidates_gallery(candidates)
+    if embeddings_matrix is None:
+        return None
+
+    embeddings_matrix.setflags(write=False)
+    gallery = RoomGallery(student_ids=student_ids, matrix=embeddings_matrix)
+    candidate_gallery_cache.put(key, gallery)
+    return gallery
+
+
+def _resolve_gallery(room_id: str, candidates: Optional[List[Dict]]) -> Optional[RoomGallery]:
+    """Galeria residente da sala, ou a enviada em `candidates` (override)."""
+    if candidates is not None:
+        return _get_candidates_gallery(room_id, candidates)
+    return gallery_store.get(room_id)
+
+
 def recognize_student(
     room_id: str,
-    image_bytes: bytes,
+    input_embedding: np.ndarray,
     candidates: Optional[List[Dict]] = None,
 ) -> Dict:
     """
     Reconhecimento facial usando distância euclidiana.
 
+    O embedding da imagem (`input_embedding`) é gerado antes, no motor
+    de inferência; aqui acontece apenas o matching em memória.
+
+    Os candidatos vêm da galeria residente da sala (sincronizada com a
+    API principal). Se `candidates` for enviado, ele substitui a galeria.
+
     Returns:
         {
             "studentId": str | None,
@@ -55,111 +148,83 @@ def recognize_student(
         }
     """
 
-    if not candidates:
-        print("⚠️ Nenhum candidato fornecido para reconhecimento")
-        return {
-            "studentId": None,
-            "distance": 0.0,
-            "recognized": False
-        }
-
-    print(f"🔍 Reconhecendo aluno | Room: {room_id}")
+    logger.debug("🔍 Reconhecendo aluno | Room: %s", room_id)
 
     # ===========================
     # 1️⃣ EMBEDDING DA QUERY
     # ===========================
     try:
-        input_embedding = generate_embedding_from_image(image_bytes)
         query_vec = validate_embedding(input_embedding)
     except Exception as e:
-        print(f"❌ Erro ao gerar embedding da imagem: {e}")
+        logger.warning("❌ Embedding da imagem inválido: %s", e)
         raise
 
     # ===========================
-    # 2️⃣ STACK DOS EMBEDDINGS
+    # 2️⃣ GALERIA DE CANDIDATOS
     # ===========================
-    embeddings = []
-    student_ids = []
-    for candidate in candidates:
-        student_id = candidate.get("_id")
-        facial_data = candidate.get("facialEmbedding")
+    with stage("gallery"):
+        gallery = _resolve_gallery(room_id, candidates)
 
-        if not student_id or not facial_data or "embedding" not in facial_data:
-            continue
+    if gallery is None or not len(gallery):
+        logger.warning("⚠️ Nenhum candidato disponível para reconhecimento | Room: %s", room_id)
+        count_decision("no_candidates")
+        return _not_recognized()
 
-        try:
-            stored_embedding = embedding_cache.get_decrypted_embedding(facial_data)
-            embeddings.append(validate_embedding(stored_embedding))
-            student_ids.append(student_id)
-        except Exception as e:
-            print(f"⚠️ Erro no embedding do aluno {student_id}: {e}")
+    observe_candidates(len(gallery))
+    return match_embedding(query_vec, gallery.student_ids, gallery.matrix)
 
-    if not embeddings:
-        return {
-            "studentId": None,
-            "distance": 0.0,
-            "recognized": False
-        }
 
-    embeddings_matrix = np.vstack(embeddings)  # NxD
+def match_embedding(
+    query_vec: np.ndarray,
+    student_ids: List[str],
+    embeddings_matrix: np.ndarray
+) -> Dict:
+    """
+    Compara o embedding da query com a matriz de candidatos e aplica
+    as regras de threshold e margem.
+    """
 
     # ===========================
-    # 3️⃣ DISTÂNCIA EUCLIDIANA VETORIZADA
+    # 3️⃣ TOP-2 (PRODUTO MATRIZ-VETOR + ARGPARTITION)
     # ===========================
-    distances = np.linalg.norm(embeddings_matrix - query_vec, axis=1)
-
-    best_index = int(np.argmin(distances))
-    best_distance = float(distances[best_index])
-    best_match_id = student_ids[best_index]
+    with stage("match"):
+        result = top_k(embeddings_matrix, query_vec, k=2)
+    return _result_from_top_k(student_ids, result)
 
-    has_seccond_best = len(distances) > 1
-
-    if has_seccond_best:
-        seccond_best_index = int(np.argsort(distances)[1])
-        seccond_best_distance = float(distances[seccond_best_index])
-        margin_between = seccond_best_distance - best_distance
-    else:
-        margin_between = None
-        seccond_best_distance = None
 
-    print("\n" + "=" * 60)
-    print("🎯 RESULTADO")
-    print(f"   Melhor ID: {best_match_id}")
-    print(f"   Distância: {best_distance:.4f}")
-    print(f"   Threshold: {settings.FACE_MATCH_THRESHOLD}")
-    print("=" * 60)
+def _result_from_top_k(student_ids: List[str], result: TopKResult) -> Dict:
+    """
+    Aplica a decisão (threshold + margem) ao top-k de uma query.
+    """
+    best_distance = result.best_distance
+    best_match_id = student_ids[result.best_index]
+    margin_between = result.margin
+
+    logger.debug(
+        "🎯 Melhor ID: %s | distância: %.4f | margem: %.4f | threshold: %s",
+        best_match_id,
+        best_distance,
+        margin_between if margin_between is not None else float("inf"),  # único candidato
+        settings.FACE_MATCH_THRESHOLD
+    )
 
     # ===========================
     # 4️⃣ DECISÃO
     # ===========================
-
-    accept_match = False
-
-    if best_distance <= settings.FACE_MATCH_THRESHOLD:
-
-        if has_seccond_best:
-            if (
-                margin_between is not None and
-                margin_between >= settings.FACE_MATCH_MARGIN
-            ):
-                print(
-                    f"✅ MATCH ACEITO: {best_match_id} "
-                    f"(margem de {margin_between:.4f})"
-                )
-                accept_match = True
-            else:
-                print(
-                    f"⚠️ MATCH AMBÍGUO REJEITADO: {best_match_id} "
-                    f"(margem {margin_between:.4f} abaixo do mínimo "
-                    f"{settings.FACE_MATCH_MARGIN})"
-                )
-
-        else:
-            print(f"✅ MATCH ACEITO (único candidato): {best_match_id}")
-            accept_match = True
-
+    decision = decide(
+        result,
+        settings.FACE_MATCH_THRESHOLD,
+        settings.FACE_MATCH_MARGIN
+    )
+    accept_match = decision == "accepted"
+    count_decision(decision)
+
+    if decision == "accepted":
+        logger.info("✅ Match aceito: %s", best_match_id)
+    elif decision == "ambiguous":
+        logger.info("⚠️ Match ambíguo rejeitado: %s", best_match_id)
     else:
-        print("❌ MATCH REJEITADO (distância acima do threshold)")
+        logger.info("❌ Match rejeitado (distância acima do threshold)")
 
     if accept_match:
         return {
@@ -168,11 +233,224 @@ def recognize_student(
             "recognized": True
         }
 
+    return _not_recognized(round(best_distance, 4))
+
+
+# ================================
+# 🏫 IDENTIFICAÇÃO SEM SALA (ESCOLA INTEIRA)
+# ================================
+
+def identify_student(input_embedding: np.ndarray) -> Dict:
+    """
+    Identifica o aluno entre todos os alunos da escola (ex.: catraca
+    da entrada), usando o índice ANN do snapshot.
+
+    As listas visitadas são re-ranqueadas com a distância exata, então
+    threshold e margem são aplicados como no `recognize_student`.
+    """
+    logger.debug("🔍 Identificando aluno | escola inteira")
+
+    query_vec = validate_embedding(input_embedding)
+
+    index = gallery_store.campus
+    if index is None or not len(index):
+        logger.warning("⚠️ Nenhum aluno sincronizado para identificação")
+        count_decision("no_candidates")
+        return _not_recognized()
+
+    observe_candidates(len(index))
+    with stage("match"):
+        result = index.search(query_vec, k=2)
+    return _result_from_top_k(index.student_ids, result)
+
+
+# ================================
+# 📦 RECONHECIMENTO EM LOTE
+# ================================
+
+def recognize_students_batch(
+    room_ids: List[str],
+    input_embeddings: List[np.ndarray]
+) -> List[Dict]:
+    """
+    Reconhece várias imagens de uma vez (rajada de um totem ou vários totens).
+
+    As queries são agrupadas por sala e cada sala faz um único produto
+    QxN contra a sua galeria. A ordem da resposta é a ordem da entrada.
+    """
+    results: List[Optional[Dict]] = [None] * len(room_ids)
+
+    positions_by_room: Dict[str, List[int]] = {}
+    for position, room_id in enumerate(room_ids):
+        positions_by_room.setdefault(room_id, []).append(position)
+
+    for room_id, positions in positions_by_room.items():
+        logger.debug("🔍 Reconhecendo %d imagens | Room: %s", len(positions), room_id)
+
+        with stage("gallery"):
+            gallery = gallery_store.get(room_id)
+        if gallery is None or not len(gallery):
+            logger.warning("⚠️ Nenhum candidato disponível para reconhecimento | Room: %s", room_id)
+            for position in positions:
+                count_decision("no_candidates")
+                results[position] = _not_recognized()
+            continue
+
+        queries = np.vstack([
+            validate_embedding(input_embeddings[position])
+            for position in positions
+        ])
+
+        with stage("match"):
+            top_results = top_k_batch(gallery.matrix, queries, k=2)
+        for position, top_result in zip(positions, top_results):
+            observe_candidates(len(gallery))
+            results[position] = _result_from_top_k(gallery.student_ids, top_result)
+
+    return results
+
+
+def fuse_burst_results(results: List[Dict]) -> Dict:
+    """
+    Decisão única para uma rajada de frames da mesma pessoa.
+
+    Aceita apenas se todos os frames reconhecidos apontam para o mesmo
+    aluno; frames sem rosto / rejeitados não contam, mas dois alunos
+    diferentes na mesma rajada tornam o resultado ambíguo (rejeitado).
+    """
+    recognized = [r for r in results if r.get("recognized")]
+    distances = [r["distance"] for r in results if r.get("distance")]
+    best_distance = min(distances) if distances else 0.0
+
+    student_ids = {r["studentId"] for r in recognized}
+    if len(student_ids) != 1:
+        return {
+            **_not_recognized(best_distance),
+            "frames": len(results),
+            "agreeing_frames": 0
+        }
+
     return {
-        "studentId": None,
-        "distance": round(best_distance, 4),
-        "recognized": False
-}
+        "studentId": student_ids.pop(),
+        "distance": min(r["distance"] for r in recognized),
+        "recognized": True,
+        "frames": len(results),
+        "agreeing_frames": len(recognized)
+    }
+
+
+# ================================
+# 👥 VÁRIOS ROSTOS (FOTO DA TURMA)
+# ================================
+
+def recognize_group(
+    room_id: str,
+    faces: List[Dict],
+    candidates: Optional[List[Dict]] = None
+) -> List[Dict]:
+    """
+    Reconhece todos os rostos de uma foto contra a galeria da sala.
+
+    - Uma única multiplicação de matrizes FxN para todos os rostos
+    - Atribuição um-para-um (gulosa, menor distância exata primeiro):
+      o mesmo aluno nunca é reconhecido em dois rostos e nenhum rosto é
+      aceito acima do threshold
+    - A margem de cada rosto é medida contra os alunos que não foram
+      atribuídos a outros rostos da foto
+
+    Args:
+        faces: [{"box": (top, right, bottom, left), "embedding": np.ndarray}]
+
+    Returns:
+        Um resultado por rosto, na ordem de `faces`
+    """
+    logger.debug("🔍 Reconhecendo %d rostos | Room: %s", len(faces), room_id)
+
+    def box_dict(box) -> Dict:
+        top, right, bottom, left = box
+        return {"top": top, "right": right, "bottom": bottom, "left": left}
+
+    with stage("gallery"):
+        gallery = _resolve_gallery(room_id, candidates)
+    if gallery is None or not len(gallery) or not faces:
+        logger.warning("⚠️ Nenhum candidato disponível para reconhecimento | Room: %s", room_id)
+        for _ in faces:
+            count_decision("no_candidates")
+        return [{"box": box_dict(face["box"]), **_not_recognized()} for face in faces]
+
+    queries = np.vstack([validate_embedding(face["embedding"]) for face in faces])
+    observe_candidates(len(gallery))
+
+    # ||a - b|| = sqrt(2 - 2·a·b) para vetores normalizados (FxN)
+    with stage("match"):
+        similarities = (gallery.matrix @ queries.T).T
+        distances = np.sqrt(np.clip(2.0 - 2.0 * similarities, 0.0, None))
+
+    threshold = settings.FACE_MATCH_THRESHOLD
+    min_margin = settings.FACE_MATCH_MARGIN
+
+    # Pares candidatos pela distância da similaridade (com folga para o
+    # arredondamento de 2 - 2·a·b); a decisão usa a distância exata
+    face_rows, student_cols = np.nonzero(distances <= threshold + _GROUP_PAIR_SLACK)
+    exact = np.linalg.norm(gallery.matrix[student_cols] - queries[face_rows], axis=1)
+    within = exact <= threshold
+    face_rows, student_cols, exact = face_rows[within], student_cols[within], exact[within]
+
+    # Atribuição um-para-um: do par mais próximo ao mais distante
+    assigned_student: Dict[int, Tuple[int, float]] = {}  # rosto -> (coluna do aluno, distância)
+    taken_students = set()
+    for pair in np.argsort(exact, kind="stable"):
+        face_row, student_col = int(face_rows[pair]), int(student_cols[pair])
+        if face_row in assigned_student or student_col in taken_students:
+            continue
+        assigned_student[face_row] = (student_col, float(exact[pair]))
+        taken_students.add(student_col)
+
+    results = []
+    for face_row, face in enumerate(faces):
+        query = queries[face_row]
+        assigned = assigned_student.get(face_row)
+
+        if assigned is None:
+            count_decision("rejected")
+            nearest = nearest_among(
+                gallery.matrix, query, similarities[face_row], np.ones(len(gallery), dtype=bool)
+            )
+            results.append({
+                "box": box_dict(face["box"]),
+                **_not_recognized(round(nearest, 4))
+            })
+            continue
+
+        student_col, best_distance = assigned
+
+        # Concorrentes: alunos não atribuídos a outros rostos, também com
+        # distância exata (re-rank), para a margem comparar a mesma métrica
+        competitors = np.ones(len(gallery), dtype=bool)
+        competitors[list(taken_students)] = False
+        nearest = nearest_among(gallery.matrix, query, similarities[face_row], competitors)
+        margin = None if nearest is None else nearest - best_distance
+
+        if margin is not None and margin < min_margin:
+            logger.debug("⚠️ Rosto %d: match ambíguo rejeitado (margem %.4f)", face_row, margin)
+            count_decision("ambiguous")
+            results.append({
+                "box": box_dict(face["box"]),
+                **_not_recognized(round(best_distance, 4))
+            })
+            continue
+
+        count_decision("accepted")
+        results.append({
+            "box": box_dict(face["box"]),
+            "studentId": gallery.student_ids[student_col],
+            "distance": round(best_distance, 4),
+            "recognized": True
+        })
+
+    recognized = sum(1 for r in results if r["recognized"])
+    logger.info("✅ %d/%d rostos reconhecidos", recognized, len(faces))
+    return results
 
 
 # ================================
@@ -181,8 +459,16 @@ def recognize_student(
 
 def clear_embedding_cache():
     embedding_cache.clear_cache()
-    print("🧹 Cache de embeddings limpo")
+    candidate_gallery_cache.clear()
+    recognition_result_cache.clear()
+    logger.info("🧹 Cache de embeddings limpo")
 
 
 def get_cache_statistics() -> Dict:
-    return embedding_cache.get_cache_info()
+    return {
+        "embeddings": embedding_cache.get_cache_info(),
+        "candidate_galleries": candidate_gallery_cache.get_cache_info(),
+        "results": recognition_result_cache.get_cache_info(),
+        "galleries": gallery_store.get_stats(),
+        "shared_gallery": shared_gallery.get_stats(),
+    }
@@ -0,0 +1,126 @@
+"""
+Cache curto de resultados de reconhecimento por sala
+
+A API principal reenvia a mesma foto em caso de timeout: cada reenvio
+pagaria detecção + encoding só para terminar em presença já marcada.
+Aqui o resultado anterior é devolvido sem recalcular quando os mesmos
+bytes chegam de novo para a mesma sala (blake2b dos bytes).
+
+- Só o hash exato: um hash perceptual do frame inteiro casa frames de
+  alunos diferentes no mesmo totem (fundo fixo, mesmo enquadramento)
+- Só resultados reconhecidos: quem foi rejeitado (ou ficou ambíguo) e
+  tenta de novo passa pelo reconhecimento outra vez
+
+Entradas expiram em RESULT_CACHE_TTL_SECONDS e valem só para a geração
+da galeria em que foram calculadas.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from app.core.settings import settings
+
+
+@dataclass(frozen=True)
+class _Entry:
+    result: Dict
+    generation: int
+    expires_at: float
+
+
+class RecognitionResultCache:
+    """
+    Resultados recentes por (sala, perfil), em ordem de inserção.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries_per_room: int):
+        self.ttl = ttl_seconds
+        self.max_entries_per_room = max_entries_per_room
+        self._rooms: Dict[Tuple[str, str], "OrderedDict[bytes, _Entry]"] = {}
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def fingerprint(file_bytes: bytes) -> bytes:
+        """blake2b dos bytes (o hashlib solta o GIL: pode rodar em thread)."""
+        return hashlib.blake2b(file_bytes, digest_size=16).digest()
+
+    def _purge(self, entries: "OrderedDict[bytes, _Entry]", now: float):
+        while entries:
+            digest, entry = next(iter(entries.items()))
+            if entry.expires_at >= now:
+                break
+            del entries[digest]
+
+    def get(
+        self,
+        room_id: str,
+        profile: str,
+        fingerprint: bytes,
+        generation: int
+    ) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+
+        entries = self._rooms.get((room_id, profile))
+        if entries is not None:
+            self._purge(entries, time.monotonic())
+
+            entry = entries.get(fingerprint)
+            if entry is not None and entry.generation == generation:
+                self._hits += 1
+                return entry.result
+
+        self._misses += 1
+        return None
+
+    def put(
+        self,
+        room_id: str,
+        profile: str,
+        fingerprint: bytes,
+        generation: int,
+        result: Dict
+    ):
+        # Rejeitado / ambíguo: a nova tentativa precisa ser avaliada de novo
+        if not self.enabled or not result.get("recognized"):
+            return
+
+        entries = self._rooms.setdefault((room_id, profile), OrderedDict())
+        entries.pop(fingerprint, None)
+        entries[fingerprint] = _Entry(
+            result=result,
+            generation=generation,
+            expires_at=time.monotonic() + self.ttl
+        )
+
+        while len(entries) > self.max_entries_per_room:
+            entries.popitem(last=False)
+
+    def clear(self):
+        self._rooms.clear()
+
+    def get_cache_info(self) -> Dict:
+        total = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "rooms": len(self._rooms),
+            "size": sum(len(entries) for entries in self._rooms.values()),
+            "ttl_seconds": self.ttl,
+            "hit_rate": f"{(self._hits / total * 100):.2f}%" if total > 0 else "0%"
+        }
+
+
+# Instância global do cache de resultados
+recognition_result_cache = RecognitionResultCache(
+    ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+    max_entries_per_room=settings.RESULT_CACHE_MAX_ENTRIES_PER_ROOM
+)
@@ -0,0 +1,336 @@
+"""
+Galeria compartilhada entre os workers do uvicorn (--workers N)
+
+- Um único worker (o líder, eleito por flock) sincroniza, descriptografa
+  e grava cada snapshot em um segmento mapeado em memória (/dev/shm)
+- Segmento versionado: gallery-<versão>.bin (matrizes) + gallery-<versão>.json
+  (índice de ids, nonces, digests dos ciphertexts, intervalo de linhas de
+  cada sala e layout das matrizes)
+- Os outros workers mapeiam o segmento só para leitura: alunos, salas e
+  índice da escola são views sobre as mesmas páginas, sem cópia por processo
+- Troca versionada: a nova versão é gravada ao lado e só então o ponteiro
+  `current` é trocado (os.replace); cada worker passa para ela na próxima
+  verificação e a versão antiga some quando o último worker a solta
+- Se o líder cair, o lock é liberado e outro worker assume a sincronização
+"""
+
+import fcntl
+import json
+import logging
+import mmap
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.core.settings import settings
+from app.models.student import StudentEmbedding
+from app.services.ann_index import IVFIndex
+from app.services.gallery_service import (
+    GalleryMatrix,
+    GallerySnapshot,
+    build_galleries,
+    build_nonce_index,
+)
+
+logger = logging.getLogger(__name__)
+
+_POINTER = "current"
+_LOCK = "leader.lock"
+_ALIGN = 64  # início de cada matriz alinhado a uma linha de cache
+
+
+def _segment_path(directory: Path, version: int, suffix: str) -> Path:
+    return directory / f"gallery-{version:012d}{suffix}"
+
+
+def _write_private(path: Path, data: bytes):
+    """Arquivo novo legível só pelo usuário do serviço (embeddings são biometria)."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+
+
+class _SegmentWriter:
+    """Grava matrizes em sequência no arquivo e anota o layout de cada uma."""
+
+    def __init__(self, f):
+        self._f = f
+        self.offset = 0
+        self.layout: Dict[str, Dict] = {}
+
+    def add(self, name: str, parts: List[np.ndarray], dtype, width: Optional[int] = None):
+        """`parts` são gravadas uma após a outra (sem concatenar em memória)."""
+        self.offset = -(-self.offset // _ALIGN) * _ALIGN
+        self._f.seek(self.offset)
+
+        rows = 0
+        for part in parts:
+            part = np.ascontiguousarray(part, dtype=dtype)
+            self._f.write(part.data)
+            rows += len(part)
+
+        shape = [rows] if width is None else [rows, width]
+        self.layout[name] = {"offset": self.offset, "dtype": np.dtype(dtype).str, "shape": shape}
+        self.offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+
+def _write_segment(path: Path, snapshot: GallerySnapshot) -> Dict:
+    """
+    Matrizes do snapshot no segmento; devolve o manifesto (índices e layout).
+
+    - `embeddings`: a matriz da galeria, linhas agrupadas por sala;
+      `rooms[sala] = [início, fim]`
+    - `row_students` / `student_rows`: aluno de cada linha e primeira
+      linha de cada aluno (índice de ids = aluno)
+    - `campus_*`: índice IVF da escola já treinado; `campus_students` é o
+      aluno de cada id do índice (sem `campus_matrix`, o índice lê direto
+      de `embeddings`)
+    """
+    students = snapshot.students
+    layout = snapshot.layout
+    dim = layout.matrix.shape[1] if students else 0
+    positions = {s.id: index for index, s in enumerate(students)}
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        writer = _SegmentWriter(f)
+        writer.add("embeddings", [layout.matrix], np.float32, dim)
+        writer.add("row_students", [layout.row_students], np.int32)
+        writer.add("student_rows", [layout.student_rows], np.int32)
+
+        campus = snapshot.campus
+        if campus is not None:
+            writer.add("campus_students", [np.asarray([positions[sid] for sid in campus.student_ids])], np.int32)
+            if campus.matrix is not layout.matrix:
+                writer.add("campus_matrix", [campus.matrix], np.float32, dim)
+            writer.add("campus_order", [campus.order], np.int64)
+            writer.add("campus_offsets", [campus.offsets], np.int64)
+            if campus.centroids is not None:
+                writer.add("campus_centroids", [campus.centroids], np.float32, dim)
+
+        # mmap não aceita arquivo vazio (escola sem alunos)
+        f.truncate(max(writer.offset, 1))
+        segment_bytes = writer.offset
+
+    return {
+        "version": snapshot.generation,
+        "etag": snapshot.etag,
+        "built_at": snapshot.built_at,
+        "dim": dim,
+        "bytes": segment_bytes,
+        "students": {
+            "ids": [s.id for s in students],
+            "nonces": [s.nonce for s in students],
+            "digests": [s.ciphertext_digest for s in students],
+            "rooms": [s.rooms for s in students],
+        },
+        "rooms": {room_id: list(bounds) for room_id, bounds in layout.rooms.items()},
+        "arrays": writer.layout,
+    }
+
+
+def _map_segment(path: Path, manifest: Dict) -> Dict[str, np.ndarray]:
+    """Views só-leitura sobre o segmento (o mmap vive enquanto alguma view existir)."""
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    arrays = {}
+    for name, spec in manifest["arrays"].items():
+        shape = tuple(spec["shape"])
+        arrays[name] = np.frombuffer(
+            buffer,
+            dtype=np.dtype(spec["dtype"]),
+            count=int(np.prod(shape)),
+            offset=spec["offset"]
+        ).reshape(shape)
+    return arrays
+
+
+def _snapshot_from_segment(manifest: Dict, arrays: Dict[str, np.ndarray]) -> GallerySnapshot:
+    """Remonta o snapshot sobre as views, sem copiar nenhuma matriz."""
+    ids = manifest["students"]["ids"]
+    nonces = manifest["students"]["nonces"]
+    digests = manifest["students"]["digests"]
+    rooms_of = manifest["students"]["rooms"]
+
+    layout = GalleryMatrix(
+        matrix=arrays["embeddings"],
+        row_students=arrays["row_students"],
+        student_rows=arrays["student_rows"],
+        rooms={room_id: (start, end) for room_id, (start, end) in manifest["rooms"].items()}
+    )
+
+    students = tuple(
+        StudentEmbedding(
+            id=student_id,
+            facial=layout.matrix[layout.student_rows[index]],
+            rooms=rooms_of[index],
+            nonce=nonces[index],
+            ciphertext_digest=digests[index]
+        )
+        for index, student_id in enumerate(ids)
+    )
+
+    campus = None
+    if "campus_order" in arrays:
+        campus = IVFIndex.from_arrays(
+            [ids[index] for index in arrays["campus_students"].tolist()],
+            arrays.get("campus_matrix", layout.matrix),
+            arrays["campus_order"],
+            arrays["campus_offsets"],
+            arrays.get("campus_centroids")
+        )
+
+    return GallerySnapshot(
+        generation=manifest["version"],
+        etag=manifest["etag"],
+        students=students,
+        galleries=build_galleries(students, layout),
+        campus=campus,
+        built_at=manifest["built_at"],
+        nonce_index=build_nonce_index(students),
+        layout=layout
+    )
+
+
+class SharedGallery:
+    """
+    Segmento da galeria no diretório compartilhado pelos workers.
+    Só o líder grava; todos (inclusive o líder) leem pelas views.
+    """
+
+    def __init__(self):
+        self.enabled = settings.SHARED_GALLERY_ENABLED
+        self.directory = Path(settings.SHARED_GALLERY_DIR)
+        self.poll_seconds = settings.SHARED_GALLERY_POLL_SECONDS
+        self._lock_file = None
+        self.version = 0
+        self.segment_bytes = 0
+        self.attached_at: Optional[float] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_file is not None
+
+    # ================================
+    # 👑 LÍDER
+    # ================================
+
+    def try_lead(self) -> bool:
+        """
+        Tenta pegar o lock de líder (sem bloquear). O lock é do processo:
+        se o líder morrer, o kernel solta e outro worker assume.
+        """
+        if self._lock_file is not None:
+            return True
+
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        lock_file = open(self.directory / _LOCK, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+
+        self._lock_file = lock_file
+        logger.info("👑 Worker %d assumiu a sincronização da galeria compartilhada", os.getpid())
+
+        # Gravações interrompidas de um líder anterior (que morreu no meio)
+        self._remove_stale_temp()
+        return True
+
+    def release(self):
+        if self._lock_file is not None:
+            self._lock_file.close()  # fechar o arquivo solta o flock
+            self._lock_file = None
+
+    def share(self, snapshot: GallerySnapshot) -> GallerySnapshot:
+        """
+        Grava o snapshot como nova versão, troca o ponteiro e devolve o
+        snapshot remontado sobre o segmento (o líder também passa a usar
+        as views; as matrizes privadas são liberadas).
+        """
+        version = snapshot.generation
+        segment = _segment_path(self.directory, version, ".bin")
+        manifest_path = _segment_path(self.directory, version, ".json")
+
+        # Arquivo novo + rename: nunca reescreve páginas que outro worker mapeia
+        manifest = _write_segment(segment.with_name(segment.name + ".tmp"), snapshot)
+        os.replace(segment.with_name(segment.name + ".tmp"), segment)
+        _write_private(manifest_path, json.dumps(manifest).encode("utf-8"))
+
+        # Troca atômica do ponteiro: quem ler depois disso já vê a nova versão
+        pointer_tmp = self.directory / f"{_POINTER}.tmp"
+        _write_private(pointer_tmp, str(version).encode())
+        os.replace(pointer_tmp, self.directory / _POINTER)
+
+        self._remove_old_versions(keep={version, self.version})
+        self._remove_stale_temp()
+        return self.attach(version)
+
+    def _remove_stale_temp(self):
+        """
+        Apaga os `*.tmp` do diretório. Só o líder grava, e só dentro do
+        `share`: fora dele, qualquer `.tmp` é de um líder que caiu no meio
+        da gravação e ficaria ocupando RAM no /dev/shm para sempre.
+        """
+        for path in self.directory.glob("*.tmp"):
+            logger.info("🧹 Removendo gravação interrompida: %s", path.name)
+            path.unlink(missing_ok=True)
+
+    def _remove_old_versions(self, keep: set):
+        """
+        Apaga versões antigas. Workers que ainda mapeiam uma delas seguem
+        lendo normalmente: o kernel só libera as páginas no último munmap.
+        A versão anterior fica para quem leu o ponteiro antes da troca.
+        """
+        for path in self.directory.glob("gallery-*"):
+            if path.suffix == ".tmp":
+                continue  # ver `_remove_stale_temp`
+            try:
+                version = int(path.stem.split("-", 1)[1])
+            except ValueError:
+                continue
+            if version not in keep:
+                path.unlink(missing_ok=True)
+
+    # ================================
+    # 📖 LEITURA (TODOS OS WORKERS)
+    # ================================
+
+    def current_version(self) -> int:
+        """Versão apontada por `current` (0 se nada foi publicado ainda)."""
+        try:
+            return int((self.directory / _POINTER).read_text())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def attach(self, version: int) -> GallerySnapshot:
+        """Mapeia uma versão só para leitura e monta o snapshot sobre ela."""
+        manifest_path = _segment_path(self.directory, version, ".json")
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        arrays = _map_segment(_segment_path(self.directory, version, ".bin"), manifest)
+        snapshot = _snapshot_from_segment(manifest, arrays)
+
+        self.version = version
+        self.segment_bytes = manifest["bytes"]
+        self.attached_at = time.time()
+        return snapshot
+
+    def get_stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "role": ("leader" if self.is_leader else "follower") if self.enabled else None,
+            "pid": os.getpid(),
+            "version": self.version,
+            "segment_bytes": self.segment_bytes,
+            "directory": str(self.directory) if self.enabled else None,
+            "attached_at": self.attached_at,
+        }
+
+
+# Instância global (uma por worker do uvicorn)
+shared_gallery = SharedGallery()
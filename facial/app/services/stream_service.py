@@ -0,0 +1,277 @@
+"""
+Reconhecimento por stream (WebSocket) com tracking do rosto
+
+- O totem envia frames (JPEG) continuamente pelo mesmo socket
+- Cada frame passa só pela detecção barata (sem encoding)
+- O rosto principal é acompanhado entre frames por IoU das caixas
+- O encoding de 128-d roda uma única vez, quando o rosto está estável
+  e bom (tamanho + nitidez + portão de qualidade); o resultado volta
+  pelo mesmo socket
+- Enquanto um frame é processado, os que chegam substituem o anterior
+  (só o mais recente é processado; os demais são descartados)
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.settings import settings
+from app.services.face_service import detect_frame_faces, encode_frame_face
+from app.services.inference_engine import inference_engine, InferenceQueueFullError
+from app.services.quality_service import FaceQualityError, quality_stats
+from app.services.recognition_service import recognize_student
+
+logger = logging.getLogger(__name__)
+
+Box = Tuple[int, int, int, int]  # (top, right, bottom, left)
+
+
+def iou(a: Box, b: Box) -> float:
+    """Intersection over Union entre duas caixas (top, right, bottom, left)."""
+    top = max(a[0], b[0])
+    right = min(a[1], b[1])
+    bottom = min(a[2], b[2])
+    left = max(a[3], b[3])
+
+    intersection = max(0, right - left) * max(0, bottom - top)
+    if intersection == 0:
+        return 0.0
+
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    return intersection / (area_a + area_b - intersection)
+
+
+@dataclass
+class TrackUpdate:
+    """Resultado do tracker para um frame."""
+    status: str  # "no_face" | "low_quality" | "tracking" | "encode" | "done"
+    track: int
+    box: Optional[Box] = None
+    stable_frames: int = 0
+
+
+class FaceTracker:
+    """
+    Acompanha o rosto principal (o maior) de um totem entre frames.
+
+    - Mesmo rosto: IoU com a caixa anterior >= `min_iou`
+    - Frame bom: altura >= `min_face_height` e nitidez >= `min_sharpness`
+    - Pede encoding após `stable_frames` frames bons seguidos
+    - Reconhecido: não pede mais encoding até o rosto sair de cena
+    - Não reconhecido: tenta de novo até `max_attempts` vezes por track
+    """
+
+    def __init__(
+        self,
+        stable_frames: int,
+        min_iou: float,
+        lost_frames: int,
+        min_sharpness: float,
+        min_face_height: int,
+        max_attempts: int
+    ):
+        self.stable_frames = stable_frames
+        self.min_iou = min_iou
+        self.lost_frames = lost_frames
+        self.min_sharpness = min_sharpness
+        self.min_face_height = min_face_height
+        self.max_attempts = max_attempts
+
+        self.track = 0
+        self.reset()
+
+    @classmethod
+    def from_settings(cls) -> "FaceTracker":
+        return cls(
+            stable_frames=settings.STREAM_STABLE_FRAMES,
+            min_iou=settings.STREAM_TRACK_IOU,
+            lost_frames=settings.STREAM_LOST_FRAMES,
+            min_sharpness=settings.STREAM_MIN_SHARPNESS,
+            min_face_height=settings.MIN_FACE_HEIGHT,
+            max_attempts=settings.STREAM_MAX_ATTEMPTS
+        )
+
+    def reset(self):
+        """Encerra o track atual (próxima pessoa)."""
+        self.box: Optional[Box] = None
+        self.stable = 0
+        self.missed = 0
+        self.attempts = 0
+        self.done = False
+
+    def update(self, faces: List[Dict]) -> TrackUpdate:
+        if not faces:
+            self.missed += 1
+            self.stable = 0
+            if self.missed >= self.lost_frames:
+                self.reset()
+            return TrackUpdate("no_face", self.track)
+
+        self.missed = 0
+        primary = max(faces, key=lambda f: (f["box"][2] - f["box"][0]) * (f["box"][1] - f["box"][3]))
+        box = tuple(primary["box"])
+
+        if self.box is None or iou(self.box, box) < self.min_iou:
+            # Rosto novo (ou salto grande): novo track
+            self.reset()
+            self.track += 1
+        self.box = box
+
+        if self.done or self.attempts >= self.max_attempts:
+            return TrackUpdate("done", self.track, box)
+
+        good = (
+            box[2] - box[0] >= self.min_face_height
+            and primary["sharpness"] >= self.min_sharpness
+        )
+        if not good:
+            self.stable = 0
+            return TrackUpdate("low_quality", self.track, box)
+
+        self.stable += 1
+        if self.stable < self.stable_frames:
+            return TrackUpdate("tracking", self.track, box, self.stable)
+
+        self.stable = 0
+        self.attempts += 1
+        return TrackUpdate("encode", self.track, box, self.stable_frames)
+
+    def mark_recognized(self):
+        self.done = True
+
+    def cancel_attempt(self):
+        """O encoding pedido não aconteceu (ex.: recusado pela qualidade)."""
+        self.attempts = max(0, self.attempts - 1)
+
+
+class RecognitionStream:
+    """
+    Sessão de um socket: recebe frames, mantém o tracker e envia eventos.
+
+    Eventos enviados (JSON):
+    - {"type": "tracking", "status", "track", "box", "stable_frames"}
+    - {"type": "result", "track", "studentId", "distance", "recognized", "stats"}
+    - {"type": "busy"} (fila de inferência cheia, frame descartado)
+    - {"type": "error", "detail"}
+    """
+
+    def __init__(
+        self,
+        room_id: str,
+        send_json: Callable[[Dict], Awaitable[None]],
+        profile: Optional[str] = None
+    ):
+        self.room_id = room_id
+        self.send_json = send_json
+        self.profile = profile
+        self.tracker = FaceTracker.from_settings()
+
+        self._latest: Optional[bytes] = None
+        self._frame_ready = asyncio.Event()
+        self._closed = False
+
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_processed = 0
+        self.encodes = 0
+
+    # ===========================
+    # 📥 ENTRADA (chamado pelo leitor do socket)
+    # ===========================
+    def push_frame(self, frame: bytes):
+        self.frames_received += 1
+        if self._latest is not None:
+            self.frames_dropped += 1
+        self._latest = frame
+        self._frame_ready.set()
+
+    def reset(self):
+        self.tracker.reset()
+
+    def close(self):
+        self._closed = True
+        self._frame_ready.set()
+
+    def get_stats(self) -> Dict:
+        return {
+            "frames_received": self.frames_received,
+            "frames_dropped": self.frames_dropped,
+            "frames_processed": self.frames_processed,
+            "encodes": self.encodes,
+        }
+
+    # ===========================
+    # ⚙️ PROCESSAMENTO
+    # ===========================
+    async def run(self):
+        """Processa sempre o frame mais recente até `close()`."""
+        while True:
+            await self._frame_ready.wait()
+            self._frame_ready.clear()
+
+            if self._closed:
+                return
+
+            frame, self._latest = self._latest, None
+            if frame is None:
+                continue
+
+            try:
+                await self._process(frame)
+            except FaceQualityError as e:
+                # Recusado antes do encoding: o track continua e tenta de novo
+                quality_stats.record_rejection(e.reason)
+                self.tracker.cancel_attempt()
+                await self.send_json({
+                    "type": "tracking",
+                    "status": "low_quality",
+                    "reason": e.reason,
+                    "track": self.tracker.track,
+                    "box": self.tracker.box,
+                    "stable_frames": 0
+                })
+            except InferenceQueueFullError:
+                await self.send_json({"type": "busy"})
+            except ValueError as e:
+                await self.send_json({"type": "error", "detail": str(e)})
+            except Exception as e:
+                # Ex.: BrokenProcessPool (worker morto por OOM; o pool é
+                # recriado). A sessão continua no próximo frame em vez de
+                # deixar o socket aberto sem ninguém processando
+                logger.error("❌ Falha inesperada no stream | Room: %s", self.room_id, exc_info=e)
+                await self.send_json({"type": "error", "detail": f"Erro ao processar o frame: {str(e)}"})
+
+    async def _process(self, frame: bytes):
+        if len(frame) > settings.STREAM_MAX_FRAME_BYTES:
+            raise ValueError("Frame maior que o permitido")
+
+        faces = await inference_engine.run(detect_frame_faces, frame, self.profile)
+        self.frames_processed += 1
+
+        update = self.tracker.update(faces)
+        if update.status != "encode":
+            await self.send_json({
+                "type": "tracking",
+                "status": update.status,
+                "track": update.track,
+                "box": update.box,
+                "stable_frames": update.stable_frames
+            })
+            return
+
+        # Rosto estável e bom: único encoding do track
+        embedding = await inference_engine.run(encode_frame_face, frame, update.box, self.profile)
+        self.encodes += 1
+
+        result = recognize_student(room_id=self.room_id, input_embedding=embedding)
+        if result["recognized"]:
+            self.tracker.mark_recognized()
+
+        await self.send_json({
+            "type": "result",
+            "track": update.track,
+            **result,
+            "stats": self.get_stats()
+        })
@@ -1,51 +1,253 @@
-import base64
-import numpy as np
+"""
+Sincronização dos alunos com a API principal
+- Roda em segundo plano a cada SYNC_INTERVAL_SECONDS (lifespan do FastAPI)
+- Cliente HTTP reutilizado entre sincronizações
+- Requisição condicional (ETag): sem mudanças, a API responde 304
+- Incremental: só descriptografa embeddings novos ou alterados
+- Snapshot montado fora do event loop e publicado com uma troca atômica
+- Com SHARED_GALLERY_ENABLED, só o worker líder sincroniza; os outros
+  adotam a versão que ele publicou no segmento compartilhado
+"""
+
+import asyncio
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
 import httpx
+import numpy as np
 
-from app.state import STUDENTS
 from app.models.student import StudentEmbedding
+from app.core.metrics import stage
 from app.core.settings import settings
+from app.services.encryption_service import ciphertext_digest, decrypt_facial_batch
+from app.services.gallery_service import gallery_store, GallerySnapshot
+from app.services.shared_gallery import shared_gallery
 
 MAIN_API_URL = settings.MAIN_API_URL
 FACIAL_API_KEY = settings.FACIAL_API_KEY
 
+logger = logging.getLogger(__name__)
 
-def base64_to_embedding(base64_str: str) -> np.ndarray:
-    buffer = base64.b64decode(base64_str)
-    return np.frombuffer(buffer, dtype=np.float32)
 
+def _parse_students(
+    content: bytes,
+    previous: GallerySnapshot
+) -> Tuple[StudentEmbedding, ...]:
+    """
+    Converte a resposta de /students/faces em StudentEmbedding.
+    Embeddings cujo nonce e ciphertext não mudaram são reaproveitados do
+    snapshot anterior.
+    """
+    payload = json.loads(content)
+    students_data = payload.get("data", [])
 
-async def sync_students():
-    print("🔄 Sincronizando estudantes com a API principal...")
-    url = f"{MAIN_API_URL}/students/faces"
-
-    async with httpx.AsyncClient(timeout=10) as client:
-        response = await client.get(
-            url,
-            headers={
-                "x-facial-api-key": FACIAL_API_KEY
-            }
-        )
-        response.raise_for_status()
+    known: Dict[Tuple[str, str], StudentEmbedding] = {
+        (s.id, s.nonce): s for s in previous.students if s.nonce
+    }
 
-        payload = response.json()
-        students_data = payload.get("data", [])
+    new_students: List[Optional[StudentEmbedding]] = []
+    pending: List[Tuple[int, Dict]] = []  # (posição, item) a descriptografar
 
-        new_students = []
-
-        for item in students_data:
-            facial = item.get("facial")
-            if not facial:
-                continue
+    for item in students_data:
+        facial_data = item.get("facialEmbedding")
+        if not facial_data or "embedding" not in facial_data:
+            continue
 
+        digest = ciphertext_digest(facial_data["embedding"])
+        cached = known.get((item["_id"], facial_data.get("nonce")))
+        if cached is not None and cached.ciphertext_digest == digest:
             new_students.append(
                 StudentEmbedding(
-                    id=item["_id"],
-                    facial=base64_to_embedding(facial),
-                    rooms=item.get("rooms", [])
+                    id=cached.id,
+                    facial=cached.facial,
+                    rooms=item.get("rooms", []),
+                    nonce=cached.nonce,
+                    ciphertext_digest=digest
                 )
             )
+        else:
+            pending.append((len(new_students), item))
+            new_students.append(None)
+
+    # Descriptografia em lote (um único AESGCM, direto em uma matriz)
+    if pending:
+        with stage("decrypt"):
+            matrix, valid = decrypt_facial_batch(
+                [item["facialEmbedding"] for _, item in pending]
+            )
+
+        norms = np.linalg.norm(matrix, axis=1)
+        valid &= norms > 0
+        matrix[valid] /= norms[valid, None]
+
+        for row, (position, item) in enumerate(pending):
+            if not valid[row]:
+                logger.warning("⚠️ Erro no embedding do aluno %s: descriptografia inválida", item["_id"])
+                continue
+
+            new_students[position] = StudentEmbedding(
+                id=item["_id"],
+                facial=matrix[row],
+                rooms=item.get("rooms", []),
+                nonce=item["facialEmbedding"].get("nonce"),
+                ciphertext_digest=ciphertext_digest(item["facialEmbedding"]["embedding"])
+            )
+
+    students = tuple(s for s in new_students if s is not None)
+
+    logger.info(
+        "🔐 %d embeddings descriptografados, %d reaproveitados",
+        len(pending),
+        len(students) - len(pending)
+    )
+    return students
+
+
+class StudentSyncer:
+    """
+    Sincronizador em segundo plano, iniciado/parado pelo lifespan.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self.interval = settings.SYNC_INTERVAL_SECONDS
+        self.last_error: Optional[str] = None  # última falha (None após um sucesso)
+
+    async def start(self):
+        self._client = httpx.AsyncClient(
+            base_url=MAIN_API_URL,
+            headers={"x-facial-api-key": FACIAL_API_KEY},
+            timeout=10
+        )
+
+        # Primeira sincronização antes de aceitar tráfego
+        try:
+            await self.refresh()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e) or type(e).__name__
+            logger.warning("⚠️ Falha na sincronização inicial de estudantes: %s", e)
+
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        shared_gallery.release()
+
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _delay(self) -> float:
+        """Líder (ou worker único) sincroniza; os outros só conferem a versão."""
+        if shared_gallery.enabled and not shared_gallery.is_leader:
+            return shared_gallery.poll_seconds
+        return self.interval
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._delay())
+            try:
+                await self.refresh()
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e) or type(e).__name__
+                logger.warning("⚠️ Falha na sincronização de estudantes: %s", e)
+
+    async def refresh(self) -> bool:
+        """
+        Uma rodada do sincronizador.
+
+        - Sem galeria compartilhada: sincroniza com a API principal
+        - Líder: adota a última versão publicada (ao assumir, outro líder
+          pode ter publicado antes) e sincroniza a partir dela
+        - Demais workers: adotam a versão nova, se houver
+
+        Returns:
+            True se um novo snapshot foi publicado neste worker.
+        """
+        if not shared_gallery.enabled:
+            return await self.sync()
+
+        if not shared_gallery.try_lead():
+            return await self.adopt()
+
+        adopted = await self.adopt()
+        return await self.sync() or adopted
+
+    async def adopt(self) -> bool:
+        """Passa a ler a versão apontada no segmento compartilhado (sem cópia)."""
+        version = shared_gallery.current_version()
+        if version == 0 or version == gallery_store.snapshot.generation:
+            return False
+
+        snapshot = await asyncio.to_thread(shared_gallery.attach, version)
+        gallery_store.publish(snapshot)
+        logger.info(
+            "🧩 Galeria compartilhada versão %d adotada (%d estudantes)",
+            snapshot.generation,
+            len(snapshot.students)
+        )
+        return True
+
+    async def sync(self) -> bool:
+        """
+        Executa uma sincronização.
+
+        Returns:
+            True se um novo snapshot foi publicado, False se nada mudou.
+        """
+        logger.debug("🔄 Sincronizando estudantes com a API principal...")
+        previous = gallery_store.snapshot
+
+        headers = {}
+        if previous.etag:
+            headers["If-None-Match"] = previous.etag
+
+        response = await self._client.get("/students/faces", headers=headers)
+
+        if response.status_code == 304:
+            logger.debug("✅ Estudantes já sincronizados (sem mudanças)")
+            return False
+
+        response.raise_for_status()
+
+        # Parse, descriptografia e montagem das galerias fora do event loop
+        def build() -> GallerySnapshot:
+            students = _parse_students(response.content, previous)
+            snapshot = gallery_store.build_snapshot(
+                students,
+                etag=response.headers.get("etag")
+            )
+
+            # Líder: grava a nova versão para todos os workers e passa a
+            # usar as views do segmento (as cópias privadas são liberadas)
+            if shared_gallery.is_leader:
+                snapshot = shared_gallery.share(snapshot)
+            return snapshot
+
+        snapshot = await asyncio.to_thread(build)
+
+        # 🔁 troca atômica do snapshot
+        gallery_store.publish(snapshot)
+        logger.info(
+            "✅ %d estudantes sincronizados (geração %d)",
+            len(snapshot.students),
+            snapshot.generation
+        )
+        return True
+
 
-        # 🔁 troca atômica do cache
-        STUDENTS.clear()
-        STUDENTS.extend(new_students)
+# Instância global do sincronizador
+student_syncer = StudentSyncer()
@@ -0,0 +1,216 @@
+"""
+Aquecimento na subida do serviço (lifespan do FastAPI)
+
+- Inferência de aquecimento em todos os workers do pool, em rodadas,
+  até cada worker ter passado por ela e a latência parar de cair
+- Espera a primeira sincronização publicar as galerias das salas (até
+  WARMUP_SYNC_TIMEOUT_SECONDS; sem a API principal, fica pronto sem
+  galerias e mostra a fase que falhou no /ready)
+- Uma busca em cada galeria (e no índice da escola) tira a primeira
+  varredura do caminho do aluno
+- /health continua sendo só "o processo está de pé"; /ready responde 503
+  até o aquecimento terminar
+"""
+
+import asyncio
+import logging
+import statistics
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.core.metrics import current_route
+from app.core.settings import settings
+from app.services.face_service import warm_up_inference
+from app.services.gallery_service import gallery_store
+from app.services.inference_engine import inference_engine
+from app.services.matching import top_k
+from app.services.sync_service import student_syncer
+
+logger = logging.getLogger(__name__)
+
+# Rodada estável: mediana até 25% acima da rodada anterior
+_STEADY_TOLERANCE = 0.25
+_SYNC_POLL_SECONDS = 1.0
+_RETRY_SECONDS = 5.0
+
+
+class WarmUp:
+    """
+    Tarefa de aquecimento, iniciada/parada pelo lifespan.
+    Fases: inference → sync → galleries → ready.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.phase = "starting"
+        self.workers_warmed = 0
+        self.round_latencies_ms: list[float] = []
+        self.rooms_warmed = 0
+        self.rooms = 0
+        self.error: Optional[str] = None
+        self.failed_phase: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.phase == "ready"
+
+    def start(self):
+        self.started_at = time.time()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        current_route.set("warmup")
+
+        if not settings.WARMUP_ENABLED:
+            self._mark_ready()
+            return
+
+        inference_warmed = False
+        while True:
+            try:
+                if not inference_warmed:
+                    await self._warm_inference()
+                    inference_warmed = True
+                synced = await self._wait_for_sync()
+                if synced:
+                    await self._warm_galleries()
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.error = str(e)
+                self.failed_phase = self.phase
+                logger.warning("⚠️ Falha no aquecimento (%s: %s), tentando de novo", self.phase, e)
+                await asyncio.sleep(_RETRY_SECONDS)
+
+        self._mark_ready(degraded=not synced)
+
+    def _mark_ready(self, degraded: bool = False):
+        """`degraded`: pronto sem galerias; `error` e `failed_phase` ficam no /ready."""
+        self.phase = "ready"
+        if not degraded:
+            self.error = None
+            self.failed_phase = None
+        self.ready_at = time.time()
+        logger.info(
+            "🔥 Serviço aquecido em %.1fs (latência por rodada, ms: %s)",
+            self.ready_at - self.started_at,
+            self.round_latencies_ms
+        )
+
+    async def _warm_inference(self):
+        """
+        Um job por worker em cada rodada. O pool cria os processos sob
+        demanda e não escolhe quem pega cada job, então as rodadas se
+        repetem até todos os pids aparecerem e a latência estabilizar.
+        """
+        self.phase = "inference"
+        workers = inference_engine.workers
+        seen = set()
+        previous: Optional[float] = None
+        self.round_latencies_ms = []
+
+        for _ in range(settings.WARMUP_MAX_ROUNDS):
+            results = await asyncio.gather(
+                *(inference_engine.run(warm_up_inference) for _ in range(workers))
+            )
+            seen.update(pid for pid, _ in results)
+            self.workers_warmed = min(len(seen), workers)
+
+            latency = statistics.median(seconds for _, seconds in results)
+            self.round_latencies_ms.append(round(latency * 1000, 1))
+
+            steady = previous is not None and latency <= previous * (1 + _STEADY_TOLERANCE)
+            if len(seen) >= workers and steady:
+                return
+            previous = latency
+
+        logger.warning(
+            "⚠️ Aquecimento parou após %d rodadas (%d/%d workers, latência ainda variando)",
+            settings.WARMUP_MAX_ROUNDS, self.workers_warmed, workers
+        )
+
+    async def _wait_for_sync(self) -> bool:
+        """
+        A primeira sincronização já monta (e descriptografa) as galerias.
+        Uma escola sem alunos também publica (geração 1, sem salas).
+
+        Returns:
+            False se ela não chegou em WARMUP_SYNC_TIMEOUT_SECONDS: o
+            serviço fica pronto sem galerias (`candidates` continua
+            funcionando) e o sincronizador segue tentando em segundo plano.
+        """
+        self.phase = "sync"
+        timeout = settings.WARMUP_SYNC_TIMEOUT_SECONDS
+        deadline = time.monotonic() + timeout
+
+        while gallery_store.snapshot.generation == 0:
+            if timeout > 0 and time.monotonic() >= deadline:
+                self.failed_phase = "sync"
+                self.error = f"Primeira sincronização não concluída em {timeout}s"
+                if student_syncer.last_error:
+                    self.error += f": {student_syncer.last_error}"
+                logger.warning("⚠️ %s; serviço pronto sem galerias", self.error)
+                return False
+            await asyncio.sleep(_SYNC_POLL_SECONDS)
+
+        return True
+
+    async def _warm_galleries(self):
+        self.phase = "galleries"
+        snapshot = gallery_store.snapshot
+        self.rooms = len(snapshot.galleries)
+        self.rooms_warmed = 0
+
+        def touch():
+            query = np.random.default_rng(0).normal(size=128).astype(np.float32)
+            query /= np.linalg.norm(query)
+
+            for gallery in snapshot.galleries.values():
+                if len(gallery):
+                    top_k(gallery.matrix, query, k=2)
+                self.rooms_warmed += 1
+
+            if snapshot.campus is not None:
+                snapshot.campus.search(query)
+
+        await asyncio.to_thread(touch)
+
+    def get_status(self) -> Dict:
+        # Subiu sem galerias e a sincronização chegou depois: não há mais falha
+        if self.ready and self.failed_phase == "sync" and gallery_store.snapshot.generation > 0:
+            self.error = None
+            self.failed_phase = None
+
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.ready_at or time.time()) - self.started_at, 1)
+
+        return {
+            "status": "ready" if self.ready else "warming_up",
+            "phase": self.phase,
+            "workers": {"warmed": self.workers_warmed, "total": inference_engine.workers},
+            "round_latencies_ms": self.round_latencies_ms,
+            "rooms": {"warmed": self.rooms_warmed, "total": self.rooms},
+            "gallery_generation": gallery_store.snapshot.generation,
+            "error": self.error,
+            "failed_phase": self.failed_phase,
+            "elapsed_seconds": elapsed,
+        }
+
+
+# Instância global do aquecimento
+warm_up = WarmUp()
@@ -1,4 +0,0 @@
-from typing import List
-from app.models.student import StudentEmbedding
-
-STUDENTS: List[StudentEmbedding] = []
@@ -0,0 +1,85 @@
+import io
+import math
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from app.core.settings import settings
+
+# Transposições equivalentes a cada valor da tag EXIF Orientation
+_EXIF_ORIENTATION = 0x0112
+_ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+def group_image_max_pixels() -> int:
+    """
+    Orçamento de pixels do modo grupo. O draft do JPEG só reduz em passos
+    de 1/2, então uma foto de celular (4032x3024) chega ao limite com até
+    2x o lado pedido; o orçamento padrão cobre esse pior caso.
+    """
+    return settings.GROUP_IMAGE_MAX_PIXELS or (2 * settings.GROUP_IMAGE_MAX_DIMENSION) ** 2
+
+
+def decode_image(
+    file_bytes: bytes,
+    max_dimension: int | None = None,
+    max_pixels: int | None = None
+) -> np.ndarray:
+    """
+    Decodifica os bytes do upload direto em memória (sem arquivo temporário).
+
+    - JPEG maior que o necessário é decodificado em escala reduzida
+      (1/2, 1/4, 1/8) pelo próprio libjpeg, sem descomprimir a imagem inteira
+    - Aplica a orientação EXIF (fotos de celular)
+    - Respeita um orçamento de pixels: imagens que não podem ser reduzidas
+      na decodificação e passam do limite são recusadas
+
+    Returns:
+        np.ndarray: imagem RGB uint8 (HxWx3), formato esperado pelo dlib
+    """
+    max_dimension = max_dimension or settings.IMAGE_MAX_DIMENSION
+    max_pixels = max_pixels or settings.IMAGE_MAX_PIXELS
+
+    try:
+        image = Image.open(io.BytesIO(file_bytes))
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        raise ValueError("Formato de imagem inválido ou não suportado")
+
+    orientation = image.getexif().get(_EXIF_ORIENTATION)
+
+    # Decodificação em escala reduzida (só tem efeito em JPEG)
+    width, height = image.size
+    scale = max_dimension / max(width, height)
+    if scale < 1:
+        image.draft(
+            "RGB",
+            (math.ceil(width * scale), math.ceil(height * scale))
+        )
+
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ValueError(
+            f"Imagem muito grande ({width}x{height}). "
+            f"Limite: {max_pixels} pixels"
+        )
+
+    try:
+        image = image.convert("RGB")
+    except OSError:
+        raise ValueError("Imagem corrompida ou incompleta")
+
+    if max(image.size) > max_dimension:
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.BILINEAR)
+
+    if orientation in _ORIENTATION_TRANSPOSE:
+        image = image.transpose(_ORIENTATION_TRANSPOSE[orientation])
+
+    return np.array(image, dtype=np.uint8)
+
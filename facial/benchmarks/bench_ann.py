@@ -0,0 +1,127 @@
+"""
+Benchmark + recall: índice ANN (IVF) x força bruta na escola inteira.
+
+Para galerias de vários tamanhos e valores de nprobe mede:
+- recall@1: a busca aproximada encontra o mesmo melhor aluno da exata
+- concordância das decisões (aceito / ambíguo / rejeitado)
+- latência mediana por busca (força bruta x IVF)
+
+Sem `--embeddings`, usa uma galeria sintética com estrutura de grupos
+(embeddings reais não são uniformes na esfera). Com `--embeddings`,
+usa uma matriz NxD salva com `np.save` (ex.: exportada do snapshot).
+
+Uso:
+    python -m benchmarks.bench_ann --sizes 5000 50000 --nprobe 4 8 16
+    python -m benchmarks.bench_ann --embeddings galeria.npy --min-recall 0.99
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from app.core.settings import settings
+from app.services.ann_index import IVFIndex
+from app.services.matching import top_k, decide
+from benchmarks.common import measure
+
+DIM = 128
+
+
+def synthetic_gallery(size: int, rng: np.random.Generator) -> np.ndarray:
+    """Galeria normalizada em grupos (turmas / perfis parecidos) + ruído individual."""
+    groups = max(1, size // 200)
+    centers = rng.standard_normal((groups, DIM)).astype(np.float32)
+    matrix = centers[rng.integers(0, groups, size)]
+    matrix = matrix + 0.8 * rng.standard_normal((size, DIM)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix
+
+
+def synthetic_queries(matrix: np.ndarray, count: int, rng: np.random.Generator) -> np.ndarray:
+    """Queries perto de alunos da galeria (novas fotos da mesma pessoa)."""
+    sources = matrix[rng.integers(0, len(matrix), count)]
+    noise = rng.uniform(0.0, 0.06, (count, 1)).astype(np.float32)
+    queries = sources + noise * rng.standard_normal((count, DIM)).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def evaluate(matrix, queries, nprobes, threshold, min_margin, repeat) -> float:
+    """Imprime uma linha por nprobe; retorna o menor recall observado."""
+    size = len(matrix)
+    ids = [str(i) for i in range(size)]
+
+    start = time.perf_counter()
+    index = IVFIndex(ids, matrix, nlist=settings.ANN_NLIST, min_size=0)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    exact = [top_k(matrix, query, k=2) for query in queries]
+    exact_decisions = [decide(r, threshold, min_margin) for r in exact]
+    exact_ms = measure(lambda: top_k(matrix, queries[0], k=2), repeat)["median_ms"]
+
+    print(f"\nN={size}  nlist={index.nlist}  build={build_ms:.0f}ms  força bruta={exact_ms:.3f}ms")
+
+    worst_recall = 1.0
+    for nprobe in nprobes:
+        approx = [index.search(query, k=2, nprobe=nprobe) for query in queries]
+
+        hits = sum(a.best_index == e.best_index for a, e in zip(approx, exact))
+        agree = sum(
+            decide(a, threshold, min_margin) == d
+            for a, d in zip(approx, exact_decisions)
+        )
+        recall = hits / len(queries)
+        worst_recall = min(worst_recall, recall)
+
+        ivf_ms = measure(lambda: index.search(queries[0], k=2, nprobe=nprobe), repeat)["median_ms"]
+
+        print(
+            f"   nprobe={nprobe:<4} recall@1={recall:.4f}  "
+            f"decisões iguais={agree / len(queries):.4f}  "
+            f"busca={ivf_ms:.3f}ms ({exact_ms / ivf_ms:.1f}x)"
+        )
+
+    return worst_recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 20000, 50000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--embeddings", help="Arquivo .npy com a galeria real (NxD)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-recall", type=float, default=0.0,
+                        help="Sai com código 1 se algum recall@1 ficar abaixo")
+    args = parser.parse_args()
+
+    threshold = settings.FACE_MATCH_THRESHOLD
+    min_margin = settings.FACE_MATCH_MARGIN
+    rng = np.random.default_rng(args.seed)
+
+    print(f"threshold={threshold} margin={min_margin}")
+
+    if args.embeddings:
+        matrix = np.load(args.embeddings).astype(np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        galleries = [matrix]
+    else:
+        galleries = [synthetic_gallery(size, rng) for size in args.sizes]
+
+    worst_recall = 1.0
+    for matrix in galleries:
+        queries = synthetic_queries(matrix, args.queries, rng)
+        recall = evaluate(matrix, queries, args.nprobe, threshold, min_margin, args.repeat)
+        worst_recall = min(worst_recall, recall)
+
+    if worst_recall < args.min_recall:
+        print(f"\n❌ recall@1 {worst_recall:.4f} abaixo do mínimo {args.min_recall}")
+        sys.exit(1)
+
+    print(f"\n✅ menor recall@1: {worst_recall:.4f}")
+
+
+if __name__ == "__main__":
+    main()
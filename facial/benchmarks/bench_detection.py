@@ -0,0 +1,91 @@
+"""
+Benchmark: detecção em resolução original x detecção multi-resolução.
+
+Para cada imagem compara:
+- latência do HOG na imagem original (comportamento antigo, upsample=1)
+- latência do HOG na cópia reduzida (DETECTION_SCALE / DETECTION_UPSAMPLE)
+- distância entre os embeddings gerados a partir das duas caixas
+  (o encoding é sempre feito na imagem original)
+
+Uso:
+    python -m benchmarks.bench_detection --images caminho/das/fotos
+"""
+
+import argparse
+
+import face_recognition
+import numpy as np
+
+from app.core.settings import settings
+from app.services.face_service import detect_faces
+from app.utils.image_codec import decode_image
+from benchmarks.common import load_image_files, measure
+
+
+def _encode(image: np.ndarray, locations) -> np.ndarray | None:
+    if len(locations) != 1:
+        return None
+    encoding = face_recognition.face_encodings(image, locations)[0]
+    return encoding / np.linalg.norm(encoding)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--images", default=None, help="Diretório com fotos de teste")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=settings.DETECTION_SCALE)
+    parser.add_argument("--upsample", type=int, default=settings.DETECTION_UPSAMPLE)
+    args = parser.parse_args()
+
+    print(
+        f"Detecção reduzida: scale={args.scale} upsample={args.upsample} "
+        f"| referência: scale=1.0 upsample=1"
+    )
+    print(f"{'imagem':<28}{'resolução':>12}{'original':>12}{'reduzida':>12}{'ganho':>8}{'Δdist':>10}")
+
+    speedups = []
+    deltas = []
+
+    for name, file_bytes in load_image_files(args.images):
+        image = decode_image(file_bytes)
+
+        full = measure(lambda: detect_faces(image, scale=1.0, upsample=1), args.repeat)
+        reduced = measure(
+            lambda: detect_faces(image, scale=args.scale, upsample=args.upsample),
+            args.repeat
+        )
+
+        full_emb = _encode(image, detect_faces(image, scale=1.0, upsample=1))
+        reduced_emb = _encode(
+            image,
+            detect_faces(image, scale=args.scale, upsample=args.upsample)
+        )
+
+        if full_emb is not None and reduced_emb is not None:
+            delta = float(np.linalg.norm(full_emb - reduced_emb))
+            deltas.append(delta)
+            delta_text = f"{delta:.4f}"
+        else:
+            delta_text = "sem rosto"
+
+        speedup = full["median_ms"] / reduced["median_ms"]
+        speedups.append(speedup)
+
+        height, width = image.shape[:2]
+        print(
+            f"{name[:27]:<28}{f'{width}x{height}':>12}"
+            f"{full['median_ms']:>10.1f}ms{reduced['median_ms']:>10.1f}ms"
+            f"{speedup:>7.1f}x{delta_text:>10}"
+        )
+
+    print()
+    print(f"Ganho mediano na detecção: {np.median(speedups):.1f}x")
+    if deltas:
+        print(
+            f"Distância entre embeddings (original x reduzida): "
+            f"média {np.mean(deltas):.4f} | máx {np.max(deltas):.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark + verificação: kernel de matching top-k x implementação antiga.
+
+Para galerias sintéticas de vários tamanhos compara:
+- a implementação antiga (norm(matrix - query) + argsort)
+- o kernel novo (matrix @ query + argpartition + re-rank exato)
+
+Garante que as decisões (aceito / ambíguo / rejeitado), o aluno escolhido
+e a distância arredondada são idênticos; sai com código 1 se não forem.
+
+Uso:
+    python -m benchmarks.bench_matching --sizes 50 500 5000 100000
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+from app.core.settings import settings
+from app.services.matching import top_k, decide
+from benchmarks.common import measure
+
+DIM = 128
+
+
+def reference_decision(matrix: np.ndarray, query: np.ndarray, threshold: float, min_margin: float):
+    """Lógica original do recognize_student (antes do kernel)."""
+    distances = np.linalg.norm(matrix - query, axis=1)
+
+    best_index = int(np.argmin(distances))
+    best_distance = float(distances[best_index])
+
+    if len(distances) > 1:
+        second_distance = float(distances[int(np.argsort(distances)[1])])
+        margin = second_distance - best_distance
+    else:
+        margin = None
+
+    if best_distance > threshold:
+        decision = "rejected"
+    elif margin is not None and margin < min_margin:
+        decision = "ambiguous"
+    else:
+        decision = "accepted"
+
+    return decision, best_index, round(best_distance, 4)
+
+
+def kernel_decision(matrix: np.ndarray, query: np.ndarray, threshold: float, min_margin: float):
+    result = top_k(matrix, query, k=2)
+    return (
+        decide(result, threshold, min_margin),
+        result.best_index,
+        round(result.best_distance, 4)
+    )
+
+
+def synthetic_gallery(size: int, rng: np.random.Generator) -> np.ndarray:
+    """Galeria normalizada com alguns 'gêmeos' (pares próximos) para gerar ambiguidade."""
+    matrix = rng.standard_normal((size, DIM)).astype(np.float32)
+    twins = max(1, size // 20)
+    sources = rng.integers(0, size, twins)
+    targets = rng.integers(0, size, twins)
+    matrix[targets] = matrix[sources] + 0.15 * rng.standard_normal((twins, DIM)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix
+
+
+def synthetic_queries(matrix: np.ndarray, count: int, rng: np.random.Generator) -> np.ndarray:
+    """Queries perto de alunos da galeria, com ruído variado (aceitas, ambíguas e rejeitadas)."""
+    sources = matrix[rng.integers(0, len(matrix), count)]
+    noise = rng.uniform(0.0, 0.09, (count, 1)).astype(np.float32)
+    queries = sources + noise * rng.standard_normal((count, DIM)).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000, 50000, 100000])
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    threshold = settings.FACE_MATCH_THRESHOLD
+    min_margin = settings.FACE_MATCH_MARGIN
+    rng = np.random.default_rng(args.seed)
+
+    print(f"threshold={threshold} margin={min_margin}")
+    print(f"{'galeria':>10}{'antigo':>12}{'kernel':>12}{'ganho':>8}   decisões (aceito/ambíguo/rejeitado)")
+
+    mismatches = 0
+
+    for size in args.sizes:
+        matrix = synthetic_gallery(size, rng)
+        queries = synthetic_queries(matrix, args.queries, rng)
+
+        counts = {"accepted": 0, "ambiguous": 0, "rejected": 0}
+        for query in queries:
+            expected = reference_decision(matrix, query, threshold, min_margin)
+            actual = kernel_decision(matrix, query, threshold, min_margin)
+            counts[expected[0]] += 1
+
+            if expected != actual:
+                mismatches += 1
+                print(f"❌ divergência (N={size}): antigo={expected} kernel={actual}")
+
+        query = queries[0]
+        old = measure(lambda: reference_decision(matrix, query, threshold, min_margin), args.repeat)
+        new = measure(lambda: kernel_decision(matrix, query, threshold, min_margin), args.repeat)
+
+        print(
+            f"{size:>10}{old['median_ms']:>10.3f}ms{new['median_ms']:>10.3f}ms"
+            f"{old['median_ms'] / new['median_ms']:>7.1f}x   "
+            f"{counts['accepted']}/{counts['ambiguous']}/{counts['rejected']}"
+        )
+
+    if mismatches:
+        print(f"\n❌ {mismatches} decisões divergentes")
+        sys.exit(1)
+
+    print("\n✅ Decisões idênticas à implementação antiga")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: perfis de reconhecimento (fast / balanced / enroll).
+
+Para cada perfil, no mesmo conjunto de imagens, mede:
+- latência mediana do pipeline completo (decode + detecção + encoding)
+- distância até o embedding do perfil de referência (enroll)
+- estabilidade: distância entre o embedding da foto e o de uma cópia
+  recomprimida (JPEG q=60, 90% do tamanho), como a variação entre
+  capturas do totem; quanto menor, mais estável
+
+`--large` inclui variantes com o modelo de 68 landmarks, para mostrar
+o deslocamento de distância em relação aos embeddings já cadastrados.
+
+Uso:
+    python -m benchmarks.bench_profiles --images caminho/das/fotos
+"""
+
+import argparse
+import io
+from dataclasses import replace
+
+import face_recognition
+import numpy as np
+from PIL import Image
+
+from app.services.face_service import detect_faces
+from app.services.profiles import PROFILES, RecognitionProfile
+from app.utils.image_codec import decode_image
+from benchmarks.common import load_image_files, measure
+
+REFERENCE = "enroll"
+
+
+def run_pipeline(file_bytes: bytes, profile: RecognitionProfile) -> np.ndarray | None:
+    """Mesmo pipeline do face_service, sem o portão de qualidade."""
+    image = decode_image(file_bytes, max_dimension=profile.max_dimension)
+    locations = detect_faces(image, scale=profile.detection_scale, upsample=profile.upsample)
+    if len(locations) != 1:
+        return None
+
+    encoding = face_recognition.face_encodings(
+        image,
+        locations,
+        num_jitters=profile.num_jitters,
+        model=profile.landmark_model
+    )[0]
+    return encoding / np.linalg.norm(encoding)
+
+
+def perturb(file_bytes: bytes) -> bytes:
+    """Recomprime (JPEG q=60) e reduz para 90%: outra 'captura' da mesma cena."""
+    image = Image.open(io.BytesIO(file_bytes)).convert("RGB")
+    image = image.resize((int(image.width * 0.9), int(image.height * 0.9)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=60)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--images", default=None, help="Diretório com fotos de teste")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--large", action="store_true", help="Inclui variantes com 68 landmarks")
+    args = parser.parse_args()
+
+    profiles = dict(PROFILES)
+    if args.large:
+        for name in ("balanced", "enroll"):
+            variant = replace(PROFILES[name], name=f"{name}+large", landmark_model="large")
+            profiles[variant.name] = variant
+
+    images = load_image_files(args.images)
+    perturbed = {name: perturb(file_bytes) for name, file_bytes in images}
+
+    references = {
+        name: run_pipeline(file_bytes, PROFILES[REFERENCE])
+        for name, file_bytes in images
+    }
+
+    print(f"{len(images)} imagens | referência: {REFERENCE}")
+    print(
+        f"{'perfil':<16}{'latência':>12}{'Δreferência':>14}{'Δmáx':>9}"
+        f"{'estabilidade':>14}{'sem rosto':>11}"
+    )
+
+    for profile in profiles.values():
+        latencies, to_reference, stability = [], [], []
+        missed = 0
+
+        for name, file_bytes in images:
+            latencies.append(
+                measure(lambda: run_pipeline(file_bytes, profile), args.repeat)["median_ms"]
+            )
+
+            embedding = run_pipeline(file_bytes, profile)
+            other = run_pipeline(perturbed[name], profile)
+            if embedding is None:
+                missed += 1
+                continue
+
+            if references[name] is not None:
+                to_reference.append(float(np.linalg.norm(embedding - references[name])))
+            if other is not None:
+                stability.append(float(np.linalg.norm(embedding - other)))
+
+        def mean(values):
+            return f"{np.mean(values):.4f}" if values else "-"
+
+        print(
+            f"{profile.name:<16}{np.median(latencies):>10.1f}ms"
+            f"{mean(to_reference):>14}"
+            f"{(f'{np.max(to_reference):.4f}' if to_reference else '-'):>9}"
+            f"{mean(stability):>14}{missed:>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
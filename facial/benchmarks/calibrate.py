@@ -0,0 +1,150 @@
+"""
+Calibração offline de FACE_MATCH_THRESHOLD e FACE_MATCH_MARGIN.
+
+O dataset é uma pasta com uma subpasta por aluno:
+
+    dataset/
+        maria/1.jpg 2.jpg 3.jpg
+        joao/1.jpg 2.jpg
+
+Cada foto é codificada uma única vez no pool de inferência (mesmo
+pipeline da API). Com --save-embeddings os embeddings ficam num .npz e
+as próximas rodadas (outra meta de FAR, por exemplo) usam --embeddings,
+sem codificar de novo.
+
+Uso:
+    python -m benchmarks.calibrate caminho/do/dataset --output calibracao.json
+    python -m benchmarks.calibrate --embeddings dataset.npz --target-far 0.0001
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+import numpy as np
+
+from app.core.settings import settings
+from app.services.bulk_enroll_service import plan_from_directory
+from app.services.calibration_service import (
+    DEFAULT_TARGET_FAR,
+    LabelledEmbeddings,
+    calibration_report,
+    encode_dataset,
+)
+from app.services.inference_engine import inference_engine
+from app.services.profiles import get_profile
+
+
+def encode_directory(directory: str, profile: str) -> LabelledEmbeddings:
+    plan = plan_from_directory(directory)
+    print(f"📂 {sum(len(photos) for photos in plan.values())} fotos de {len(plan)} alunos")
+
+    inference_engine.start()
+    try:
+        return asyncio.run(encode_dataset(plan, profile))
+    finally:
+        inference_engine.shutdown()
+
+
+def save_embeddings(path: str, dataset: LabelledEmbeddings):
+    np.savez_compressed(
+        path,
+        embeddings=dataset.embeddings,
+        labels=dataset.labels,
+        students=np.asarray(dataset.students)
+    )
+
+
+def load_embeddings(path: str) -> LabelledEmbeddings:
+    data = np.load(path)
+    return LabelledEmbeddings(
+        embeddings=data["embeddings"],
+        labels=data["labels"],
+        students=[str(student) for student in data["students"]],
+        errors=[]
+    )
+
+
+def print_report(report: dict):
+    dataset = report["dataset"]
+    print(
+        f"\n👥 {dataset['students']} alunos | {dataset['photos']} fotos "
+        f"({dataset['rejected_photos']} recusadas) | {dataset['probes']} consultas simuladas"
+    )
+
+    for kind in ("genuine", "impostor"):
+        summary = report["distributions"][kind]
+        if summary["pairs"]:
+            print(
+                f"   {kind:<9} {summary['pairs']:>12} pares | média {summary['mean']:.4f} | "
+                f"p05 {summary['p05']:.4f} | p50 {summary['p50']:.4f} | p95 {summary['p95']:.4f}"
+            )
+
+    # A curva completa (a cada 0.01) fica no --output
+    print(f"\n{'threshold':>10} {'FAR':>10} {'FRR':>8}")
+    for point in report["curve"]:
+        if round(point["threshold"] * 100) % 5:
+            continue
+        print(f"{point['threshold']:>10.2f} {point['far']:>10.6f} {point['frr']:>8.4f}")
+
+    eer = report["eer"]
+    print(f"\n⚖️  EER {eer['rate']:.4f} em {eer['threshold']:.4f}")
+
+    for title, values in (
+        (f"Recomendado (FAR <= {report['recommendation']['target_far']})", report["recommendation"]),
+        ("Atual (.env)", report["current"]),
+    ):
+        identification = values["identification"]
+        margin = "nenhuma na grade" if values["margin"] is None else f"{values['margin']:.3f}"
+        print(
+            f"\n🎯 {title}\n"
+            f"   FACE_MATCH_THRESHOLD={values['threshold']:.4f}  FACE_MATCH_MARGIN={margin}\n"
+            f"   FAR {values['far']:.6f} | FRR {values['frr']:.4f}\n"
+            f"   1:N → corretos {identification['correct_rate']:.4f} | "
+            f"errados {identification['misidentification_rate']:.4f} | "
+            f"ambíguos {identification['ambiguous_rate']:.4f} | "
+            f"recusados {identification['rejected_rate']:.4f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("dataset", nargs="?", default=None, help="Pasta com uma subpasta por aluno")
+    parser.add_argument("--embeddings", default=None, help="Usa embeddings salvos (.npz) em vez de codificar")
+    parser.add_argument("--save-embeddings", default=None, help="Grava os embeddings (.npz) para outras rodadas")
+    parser.add_argument("--target-far", type=float, default=DEFAULT_TARGET_FAR, help="FAR máxima aceita")
+    parser.add_argument("--profile", default=None, help="Perfil de reconhecimento (padrão: PROFILE_RECOGNIZE)")
+    parser.add_argument("--output", default=None, help="Grava o relatório completo em JSON")
+    args = parser.parse_args()
+
+    if (args.dataset is None) == (args.embeddings is None):
+        parser.error("informe a pasta do dataset ou --embeddings (apenas um dos dois)")
+
+    profile = get_profile(args.profile, settings.PROFILE_RECOGNIZE).name
+
+    if args.embeddings:
+        dataset = load_embeddings(args.embeddings)
+    else:
+        dataset = encode_directory(args.dataset, profile)
+        for error in dataset.errors:
+            print(f"⚠️  {error['photo']}: {error['error']}")
+
+    if args.save_embeddings:
+        save_embeddings(args.save_embeddings, dataset)
+
+    try:
+        report = calibration_report(dataset, args.target_far)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"profile": profile, **report}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Relatório salvo em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Utilitários compartilhados pelos benchmarks do serviço facial.
+
+Os benchmarks rodam a partir da pasta `facial/` (mesmo .env da API):
+
+    python -m benchmarks.bench_detection --images caminho/das/fotos
+"""
+
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+DEFAULT_IMAGES_DIR = Path(__file__).parent / "images"
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+
+def load_image_files(directory: Path | str | None = None) -> List[Tuple[str, bytes]]:
+    """
+    Lê as imagens de teste (nome, bytes) de um diretório, em ordem alfabética.
+    """
+    directory = Path(directory or DEFAULT_IMAGES_DIR)
+
+    if not directory.is_dir():
+        raise SystemExit(f"Diretório de imagens não encontrado: {directory}")
+
+    files = [
+        (path.name, path.read_bytes())
+        for path in sorted(directory.iterdir())
+        if path.suffix.lower() in IMAGE_EXTENSIONS
+    ]
+
+    if not files:
+        raise SystemExit(f"Nenhuma imagem (.jpg/.png) em {directory}")
+
+    return files
+
+
+def measure(fn: Callable, repeat: int = 5, warmup: int = 1) -> Dict[str, float]:
+    """
+    Executa `fn` várias vezes e retorna estatísticas de latência em ms.
+    """
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "mean_ms": statistics.fmean(samples),
+        "min_ms": samples[0],
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
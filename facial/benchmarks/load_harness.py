@@ -0,0 +1,431 @@
+"""
+Teste de carga: API facial real + API principal falsa + totens simulados.
+
+1. Sobe uma API principal falsa (GET /students/faces com ETag) com N
+   alunos sintéticos criptografados, distribuídos em R salas
+2. Sobe a API facial (`uvicorn main:app`) apontando para ela
+3. Cadastra as fotos de `benchmarks/images` pelo /encode e publica os
+   alunos reais em todas as salas (o /recognize passa a aceitar matches)
+4. Simula os totens: chegadas de Poisson na taxa pedida (req/s), /recognize
+   com fotos reais e uma fração de /encode
+5. Relata throughput, percentis de latência e taxas de erro por taxa
+
+Com várias taxas (--rates 2 4 8 16) o resultado mostra o ponto de
+saturação para o número de workers (--inference-workers) testado.
+
+Uso:
+    python -m benchmarks.load_harness --students 5000 --rooms 100 \\
+        --rates 2 4 8 16 --duration 30 --inference-workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from app.core.settings import settings
+from app.services.encryption_service import encrypt_embedding
+from benchmarks.common import load_image_files
+
+DIM = 128
+SEED = 1234
+FACIAL_DIR = Path(__file__).resolve().parent.parent
+
+
+# ================================
+# 1️⃣ API PRINCIPAL FALSA
+# ================================
+
+class FakeMainApi:
+    """
+    Serve /students/faces como a API Node (payload `{"data": [...]}` +
+    ETag / If-None-Match), em uma thread própria.
+    """
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.students: List[Dict] = []
+        self.version = 0
+        self.requests = 0
+        self._body = b""
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def etag(self) -> str:
+        return f'"faces-{self.version}"'
+
+    def set_students(self, students: List[Dict]):
+        with self._lock:
+            self.students = students
+            self.version += 1
+            self._body = json.dumps({"success": True, "data": students}).encode()
+
+    def start(self) -> str:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests += 1
+                if self.path.rstrip("/") != "/students/faces":
+                    self.send_error(404)
+                    return
+                if self.headers.get("x-facial-api-key") != fake.api_key:
+                    self.send_error(401)
+                    return
+
+                with fake._lock:
+                    etag, body = fake.etag, fake._body
+
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def synthetic_students(count: int, rooms: List[str], rng: np.random.Generator) -> List[Dict]:
+    """Alunos com embeddings aleatórios criptografados, um por sala (round-robin)."""
+    vectors = rng.standard_normal((count, DIM))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    students = []
+    for index, vector in enumerate(vectors):
+        encrypted = encrypt_embedding(vector.tolist())
+        students.append({
+            "_id": f"synthetic-{index:06d}",
+            "facialEmbedding": {"embedding": encrypted["ciphertext"], "nonce": encrypted["nonce"]},
+            "rooms": [rooms[index % len(rooms)]],
+        })
+    return students
+
+
+# ================================
+# 2️⃣ API FACIAL (SUBPROCESSO)
+# ================================
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_facial_api(port: int, main_api_url: str, args) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "MAIN_API_URL": main_api_url,
+        "SYNC_INTERVAL_SECONDS": "1",
+        "INFERENCE_WORKERS": str(args.inference_workers),
+        "LOG_LEVEL": args.log_level,
+    }
+    if args.shared_gallery:
+        # Diretório próprio por execução: uma galeria de outra rodada (mesmo
+        # ETag da API falsa) seria adotada pelo líder como se estivesse em dia
+        env["SHARED_GALLERY_ENABLED"] = "true"
+        env["SHARED_GALLERY_DIR"] = tempfile.mkdtemp(prefix="facial-gallery-", dir="/dev/shm")
+    if not args.result_cache:
+        # Poucas fotos repetidas virariam acertos do cache de resultados;
+        # totens reais mandam frames diferentes a cada toque
+        env["RESULT_CACHE_TTL_SECONDS"] = "0"
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1",
+        "--port", str(port),
+        "--workers", str(args.uvicorn_workers),
+        "--no-access-log",
+    ]
+    # main.py fica na pasta facial/ (pai de benchmarks/)
+    return subprocess.Popen(command, env=env, cwd=FACIAL_DIR)
+
+
+async def wait_until(condition, timeout: float, what: str):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if await condition():
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.25)
+    raise SystemExit(f"Tempo esgotado esperando {what}")
+
+
+async def enroll_photos(client: httpx.AsyncClient, photos) -> Dict[str, Dict]:
+    """Gera o embedding de cada foto pelo /encode (foto -> facialEmbedding)."""
+    enrolled = {}
+    for name, file_bytes in photos:
+        response = await client.post("/encode", files={"images": (name, file_bytes, "image/jpeg")})
+        if response.status_code != 200:
+            print(f"⚠️ {name}: /encode respondeu {response.status_code} ({response.text[:120]})")
+            continue
+        data = response.json()
+        enrolled[name] = {"embedding": data["embedding"], "nonce": data["nonce"]}
+    return enrolled
+
+
+# ================================
+# 3️⃣ TOTENS SIMULADOS
+# ================================
+
+@dataclass
+class RateResult:
+    rate: float
+    duration: float
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: {"recognize": [], "encode": []})
+    statuses: Dict[str, int] = field(default_factory=dict)
+    recognized: int = 0
+    sent: int = 0
+
+    def record(self, kind: str, status: str, latency: float):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status == "200":
+            self.latencies[kind].append(latency)
+
+    def summary(self) -> Dict:
+        ok = self.statuses.get("200", 0)
+        all_latencies = self.latencies["recognize"] + self.latencies["encode"]
+
+        def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+            if not values:
+                return {"p50_ms": None, "p90_ms": None, "p99_ms": None, "max_ms": None}
+            p50, p90, p99 = np.percentile(values, [50, 90, 99]) * 1000
+            return {
+                "p50_ms": round(float(p50), 1),
+                "p90_ms": round(float(p90), 1),
+                "p99_ms": round(float(p99), 1),
+                "max_ms": round(max(values) * 1000, 1),
+            }
+
+        return {
+            "rate": self.rate,
+            "sent": self.sent,
+            "ok": ok,
+            "throughput": round(ok / self.duration, 2),
+            "error_rate": round(1 - ok / self.sent, 4) if self.sent else 0.0,
+            "statuses": dict(sorted(self.statuses.items())),
+            "recognized_rate": round(self.recognized / len(self.latencies["recognize"]), 4)
+            if self.latencies["recognize"] else 0.0,
+            "latency": percentiles(all_latencies),
+            "recognize": percentiles(self.latencies["recognize"]),
+            "encode": percentiles(self.latencies["encode"]),
+        }
+
+
+async def run_rate(
+    client: httpx.AsyncClient,
+    rate: float,
+    duration: float,
+    rooms: List[str],
+    photos,
+    encode_ratio: float,
+    rng: random.Random
+) -> RateResult:
+    """
+    Chegadas de Poisson (carga aberta): o próximo totem dispara no
+    horário previsto mesmo que os anteriores ainda não tenham voltado.
+    """
+    result = RateResult(rate=rate, duration=duration)
+
+    async def one_request(kind: str, room: str, name: str, file_bytes: bytes):
+        start = time.perf_counter()
+        try:
+            if kind == "encode":
+                response = await client.post(
+                    "/encode", files={"images": (name, file_bytes, "image/jpeg")}
+                )
+            else:
+                response = await client.post(
+                    "/recognize",
+                    data={"room": room},
+                    files={"image": (name, file_bytes, "image/jpeg")}
+                )
+            status = str(response.status_code)
+            if kind == "recognize" and response.status_code == 200 and response.json().get("recognized"):
+                result.recognized += 1
+        except httpx.TimeoutException:
+            status = "timeout"
+        except httpx.HTTPError:
+            status = "connection_error"
+        result.record(kind, status, time.perf_counter() - start)
+
+    tasks = []
+    started = time.perf_counter()
+    next_arrival = started
+    while True:
+        next_arrival += rng.expovariate(rate)
+        if next_arrival - started >= duration:
+            break
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+
+        kind = "encode" if rng.random() < encode_ratio else "recognize"
+        name, file_bytes = rng.choice(photos)
+        tasks.append(asyncio.create_task(one_request(kind, rng.choice(rooms), name, file_bytes)))
+        result.sent += 1
+
+    await asyncio.gather(*tasks)
+    return result
+
+
+def print_summary(summaries: List[Dict]):
+    print(
+        f"\n{'taxa':>7}{'enviadas':>10}{'ok/s':>8}{'erros':>8}"
+        f"{'p50':>10}{'p90':>10}{'p99':>10}{'reconhec.':>11}  status"
+    )
+    for s in summaries:
+        latency = s["latency"]
+
+        def ms(value):
+            return f"{value:.0f}ms" if value is not None else "-"
+
+        print(
+            f"{s['rate']:>7g}{s['sent']:>10}{s['throughput']:>8.2f}{s['error_rate']:>8.1%}"
+            f"{ms(latency['p50_ms']):>10}{ms(latency['p90_ms']):>10}{ms(latency['p99_ms']):>10}"
+            f"{s['recognized_rate']:>11.1%}  {s['statuses']}"
+        )
+
+
+# ================================
+# 🚀 EXECUÇÃO
+# ================================
+
+async def run(args):
+    np_rng = np.random.default_rng(SEED)
+    rng = random.Random(SEED)
+
+    photos = load_image_files(args.images)
+    rooms = [f"room-{index:04d}" for index in range(args.rooms)]
+
+    print(f"🔐 Gerando {args.students} alunos sintéticos em {args.rooms} salas...")
+    synthetic = synthetic_students(args.students, rooms, np_rng)
+
+    fake_api = FakeMainApi(settings.FACIAL_API_KEY)
+    fake_api.set_students(synthetic)
+    main_api_url = fake_api.start()
+
+    port = free_port()
+    server = start_facial_api(port, main_api_url, args)
+    summaries = []
+
+    try:
+        limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}",
+            timeout=args.timeout,
+            limits=limits
+        ) as client:
+            async def healthy():
+                return (await client.get("/ready")).status_code == 200
+
+            await wait_until(healthy, args.startup_timeout, "a API facial subir")
+
+            # Fotos reais viram alunos de todas as salas
+            enrolled = await enroll_photos(client, photos)
+            if not enrolled:
+                raise SystemExit("Nenhuma foto pôde ser cadastrada pelo /encode")
+
+            real_students = [
+                {"_id": f"photo-{name}", "facialEmbedding": facial, "rooms": rooms}
+                for name, facial in enrolled.items()
+            ]
+            fake_api.set_students(synthetic + real_students)
+            expected = len(synthetic) + len(real_students)
+
+            async def synced():
+                stats = (await client.get("/cache/stats")).json()
+                return stats["galleries"]["students"] == expected
+
+            await wait_until(synced, args.startup_timeout, "a sincronização dos alunos")
+            print(f"✅ {expected} alunos sincronizados ({len(enrolled)} a partir das fotos)")
+
+            photos = [(name, data) for name, data in photos if name in enrolled]
+
+            for rate in args.rates:
+                print(f"🚦 {rate:g} req/s por {args.duration:g}s...")
+                result = await run_rate(
+                    client, rate, args.duration, rooms, photos, args.encode_ratio, rng
+                )
+                summaries.append(result.summary())
+                await asyncio.sleep(args.cooldown)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        fake_api.stop()
+
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--images", default=None, help="Diretório com fotos de teste")
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--rates", type=float, nargs="+", default=[2, 4, 8], help="Requisições por segundo")
+    parser.add_argument("--duration", type=float, default=30, help="Segundos por taxa")
+    parser.add_argument("--cooldown", type=float, default=3, help="Pausa entre taxas (fila esvazia)")
+    parser.add_argument("--encode-ratio", type=float, default=0.05, help="Fração de /encode")
+    parser.add_argument("--inference-workers", type=int, default=0, help="INFERENCE_WORKERS (0 = um por núcleo)")
+    parser.add_argument("--uvicorn-workers", type=int, default=1)
+    parser.add_argument("--shared-gallery", action="store_true", help="Galeria compartilhada entre os workers do uvicorn")
+    parser.add_argument("--max-connections", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=30, help="Timeout por requisição (como o da API principal)")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--log-level", default="WARNING", help="LOG_LEVEL da API facial")
+    parser.add_argument("--result-cache", action="store_true", help="Mantém o cache de resultados do /recognize")
+    parser.add_argument("--output", default=None, help="Grava o resumo em JSON")
+    args = parser.parse_args()
+
+    summaries = asyncio.run(run(args))
+    print_summary(summaries)
+
+    if args.output:
+        report = {
+            "config": {
+                key: value for key, value in vars(args).items()
+                if key not in ("output",)
+            },
+            "cpu_count": os.cpu_count(),
+            "results": summaries,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados gravados em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Suíte de micro-benchmarks dos caminhos quentes do serviço facial.
+
+Grupos (--groups):
+- validate: validate_embedding (lista JSON e ndarray)
+- matching: recognize_student contra galerias sintéticas de 50 / 500 / 5k / 50k
+- crypto: encrypt_embedding / decrypt_embedding (unitário) e lote de 1000
+- cache: EmbeddingCache, caminho de acerto e de falta (500 alunos)
+- image: decode_image e generate_embedding_from_image nas fotos de
+  `benchmarks/images` em várias resoluções (decode também em uma
+  imagem sintética, para rodar sem fotos) e o decode do modo grupo
+  em uma foto de celular de 4032x3024
+
+Saída em JSON (--output) com a mediana de cada caso. Com --baseline,
+compara com um resultado anterior e sai com código 1 se algum caso
+ficar mais lento que `baseline × (1 + tolerância)`.
+
+Uso:
+    python -m benchmarks.suite --output benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --tolerance 0.15
+
+O baseline vale para a máquina onde foi gerado: gere e compare no mesmo
+host (e com os mesmos OMP_NUM_THREADS / OPENBLAS_NUM_THREADS).
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from app.core.settings import settings
+from app.models.student import StudentEmbedding
+from benchmarks.common import DEFAULT_IMAGES_DIR, IMAGE_EXTENSIONS, measure
+
+DIM = 128
+SEED = 1234
+GALLERY_SIZES = (50, 500, 5_000, 50_000)
+RESOLUTIONS = (640, 1280, 1920)  # maior lado da imagem enviada
+GROUPS = ("validate", "matching", "crypto", "cache", "image")
+
+
+@dataclass
+class Case:
+    name: str
+    fn: Callable[[], object]
+    repeat: int = 20
+    items: int = 1  # operações por chamada (para ops/s)
+
+
+@dataclass
+class Skipped:
+    name: str
+    reason: str
+
+
+def _unit_vectors(rng: np.random.Generator, count: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+# ================================
+# 1️⃣ VALIDAÇÃO
+# ================================
+
+def validate_cases(rng: np.random.Generator) -> List[Case]:
+    from app.services.recognition_service import validate_embedding
+
+    vector = _unit_vectors(rng, 1)[0]
+    as_list = vector.tolist()
+    return [
+        Case("validate.list", lambda: validate_embedding(as_list), repeat=200),
+        Case("validate.ndarray", lambda: validate_embedding(vector), repeat=200),
+    ]
+
+
+# ================================
+# 2️⃣ MATCHING (GALERIA RESIDENTE)
+# ================================
+
+def matching_cases(rng: np.random.Generator) -> List[Case]:
+    from app.services.gallery_service import gallery_store
+    from app.services.recognition_service import recognize_student
+
+    cases = []
+    students = []
+    for size in GALLERY_SIZES:
+        embeddings = _unit_vectors(rng, size)
+        room = f"room-{size}"
+        students.extend(
+            StudentEmbedding(id=f"{room}-{i}", facial=embeddings[i], rooms=[room])
+            for i in range(size)
+        )
+
+    gallery_store.publish(gallery_store.build_snapshot(tuple(students)))
+
+    for size in GALLERY_SIZES:
+        room = f"room-{size}"
+        gallery = gallery_store.get(room)
+        # Query perto de um aluno da sala (caminho do match aceito)
+        query = gallery.matrix[size // 2] + 0.02 * _unit_vectors(rng, 1)[0]
+
+        cases.append(Case(
+            f"matching.recognize_student/{size}",
+            lambda room=room, query=query: recognize_student(room_id=room, input_embedding=query),
+            repeat=50 if size < 50_000 else 20
+        ))
+
+    return cases
+
+
+# ================================
+# 3️⃣ CRIPTOGRAFIA
+# ================================
+
+def crypto_cases(rng: np.random.Generator) -> List[Case]:
+    from app.services.encryption_service import (
+        decrypt_embedding,
+        decrypt_embeddings_batch,
+        encrypt_embedding,
+    )
+
+    key = settings.AES_KEY_BYTES
+    vectors = _unit_vectors(rng, 1000)
+    encrypted = [encrypt_embedding(vector.tolist()) for vector in vectors]
+    items = [
+        (base64.b64decode(e["ciphertext"]), base64.b64decode(e["nonce"]))
+        for e in encrypted
+    ]
+    as_list = vectors[0].tolist()
+
+    return [
+        Case("crypto.encrypt_embedding", lambda: encrypt_embedding(as_list), repeat=200),
+        Case("crypto.decrypt_embedding", lambda: decrypt_embedding(*items[0], key), repeat=200),
+        Case(
+            "crypto.decrypt_embeddings_batch/1000",
+            lambda: decrypt_embeddings_batch(items, key=key),
+            repeat=20,
+            items=len(items)
+        ),
+    ]
+
+
+# ================================
+# 4️⃣ CACHE DE EMBEDDINGS
+# ================================
+
+def cache_cases(rng: np.random.Generator) -> List[Case]:
+    from app.services.embedding_cache import embedding_cache
+    from app.services.encryption_service import encrypt_embedding
+
+    facial_data = []
+    for vector in _unit_vectors(rng, 500):
+        encrypted = encrypt_embedding(vector.tolist())
+        facial_data.append({"embedding": encrypted["ciphertext"], "nonce": encrypted["nonce"]})
+
+    def miss():
+        embedding_cache.clear_cache()
+        embedding_cache.get_decrypted_embeddings(facial_data)
+
+    def hit():
+        embedding_cache.get_decrypted_embeddings(facial_data)
+
+    return [
+        Case("cache.miss/500", miss, repeat=20, items=len(facial_data)),
+        # O warm-up de `measure` preenche o cache antes das medições
+        Case("cache.hit/500", hit, repeat=50, items=len(facial_data)),
+    ]
+
+
+# ================================
+# 5️⃣ IMAGENS (DECODE + PIPELINE COMPLETO)
+# ================================
+
+def _resized_jpeg(image: Image.Image, max_side: int) -> bytes:
+    scale = max_side / max(image.size)
+    resized = image.resize((round(image.width * scale), round(image.height * scale)))
+    buffer = io.BytesIO()
+    resized.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def _synthetic_image(rng: np.random.Generator) -> Image.Image:
+    """Gradiente + ruído 4:3 (JPEG realista para o decode, sem rosto)."""
+    height, width = 1536, 2048
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 20, (height, width, 3))
+    pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels)
+
+
+def image_cases(rng: np.random.Generator, images_dir: Optional[str]):
+    from app.utils.image_codec import decode_image, group_image_max_pixels
+
+    cases: List[Case] = []
+    skipped: List[Skipped] = []
+
+    sources = {"synthetic": _synthetic_image(rng)}
+
+    directory = Path(images_dir or DEFAULT_IMAGES_DIR)
+    photos = sorted(
+        path for path in directory.glob("*")
+        if path.suffix.lower() in IMAGE_EXTENSIONS
+    )
+    for path in photos:
+        sources[path.stem] = Image.open(path).convert("RGB")
+
+    if not photos:
+        skipped.append(Skipped("image.embedding", f"nenhuma foto em {directory}"))
+
+    try:
+        from app.services.face_service import generate_embedding_from_image
+    except ImportError as e:
+        generate_embedding_from_image = None
+        if photos:
+            skipped.append(Skipped("image.embedding", f"face_recognition indisponível ({e})"))
+
+    for name, image in sources.items():
+        for resolution in RESOLUTIONS:
+            if resolution > max(image.size):
+                continue
+
+            file_bytes = _resized_jpeg(image, resolution)
+            cases.append(Case(
+                f"image.decode[{name}@{resolution}]",
+                lambda file_bytes=file_bytes: decode_image(file_bytes),
+                repeat=20
+            ))
+
+            if name == "synthetic" or generate_embedding_from_image is None:
+                continue
+
+            cases.append(Case(
+                f"image.embedding[{name}@{resolution}]",
+                lambda file_bytes=file_bytes: generate_embedding_from_image(file_bytes),
+                repeat=5
+            ))
+
+    # Foto de celular (4032x3024) no modo grupo: precisa caber no orçamento
+    # de pixels depois do draft (uma recusa vira erro da suíte)
+    phone_bytes = _resized_jpeg(sources["synthetic"], 4032)
+    cases.append(Case(
+        "image.decode_group[synthetic@4032]",
+        lambda: decode_image(
+            phone_bytes,
+            max_dimension=settings.GROUP_IMAGE_MAX_DIMENSION,
+            max_pixels=group_image_max_pixels()
+        ),
+        repeat=5
+    ))
+
+    return cases, skipped
+
+
+# ================================
+# 📊 EXECUÇÃO E COMPARAÇÃO
+# ================================
+
+def collect_cases(groups: List[str], images_dir: Optional[str]):
+    rng = np.random.default_rng(SEED)
+    cases: List[Case] = []
+    skipped: List[Skipped] = []
+
+    builders = {
+        "validate": validate_cases,
+        "matching": matching_cases,
+        "crypto": crypto_cases,
+        "cache": cache_cases,
+    }
+    for group in groups:
+        if group == "image":
+            image_group, image_skipped = image_cases(rng, images_dir)
+            cases.extend(image_group)
+            skipped.extend(image_skipped)
+        else:
+            cases.extend(builders[group](rng))
+
+    return cases, skipped
+
+
+def run_cases(cases: List[Case], repeat_factor: float) -> Dict[str, Dict]:
+    results = {}
+    for case in cases:
+        repeat = max(3, int(case.repeat * repeat_factor))
+        stats = measure(case.fn, repeat=repeat)
+        stats["repeat"] = repeat
+        stats["ops_per_s"] = case.items / (stats["median_ms"] / 1000) if stats["median_ms"] else 0.0
+        results[case.name] = stats
+        print(
+            f"{case.name:<44}{stats['median_ms']:>11.4f}ms"
+            f"{stats['p95_ms']:>11.4f}ms{stats['ops_per_s']:>14.0f}/s"
+        )
+    return results
+
+
+def environment() -> Dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "threads": {
+            name: os.environ.get(name)
+            for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+        },
+        "seed": SEED,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Casos mais lentos que o baseline além da tolerância (pela mediana)."""
+    regressions = []
+
+    print(f"\nComparação com o baseline (tolerância {tolerance:.0%})")
+    print(f"{'caso':<44}{'baseline':>12}{'atual':>12}{'variação':>10}")
+
+    for name, stats in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"{name:<44}{'-':>12}{stats['median_ms']:>10.4f}ms{'novo':>10}")
+            continue
+
+        change = stats["median_ms"] / reference["median_ms"] - 1
+        flag = ""
+        if change > tolerance:
+            flag = "  ❌"
+            regressions.append(name)
+        print(
+            f"{name:<44}{reference['median_ms']:>10.4f}ms{stats['median_ms']:>10.4f}ms"
+            f"{change:>+10.1%}{flag}"
+        )
+
+    for name in baseline:
+        if name not in results:
+            print(f"{name:<44}{'(não executado)':>34}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--groups", nargs="+", choices=GROUPS, default=list(GROUPS))
+    parser.add_argument("--images", default=None, help="Diretório com fotos de teste")
+    parser.add_argument("--output", default=None, help="Grava os resultados em JSON")
+    parser.add_argument("--baseline", default=None, help="JSON de uma execução anterior")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Piora aceita na mediana (0.15 = 15%%)")
+    parser.add_argument("--repeat-factor", type=float, default=1.0, help="Multiplica as repetições de cada caso")
+    args = parser.parse_args()
+
+    cases, skipped = collect_cases(args.groups, args.images)
+
+    print(f"{'caso':<44}{'mediana':>13}{'p95':>13}{'throughput':>16}")
+    results = run_cases(cases, args.repeat_factor)
+
+    for skip in skipped:
+        print(f"⏭️ {skip.name}: {skip.reason}")
+
+    report = {
+        "environment": environment(),
+        "results": results,
+        "skipped": {skip.name: skip.reason for skip in skipped},
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados gravados em {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} caso(s) acima da tolerância: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✅ Nenhuma regressão acima da tolerância")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,49 @@
 import asyncio
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.routing import Match
 
+from app.core.logger import configure_logging, new_request_id, request_id
+from app.core.metrics import REQUEST_SECONDS, current_route
 from app.core.settings import settings
 from app.routes.routes import router as api_router
+from app.services.inference_engine import inference_engine
+from app.services.quality_service import FaceQualityError, quality_stats
+from app.services.sync_service import student_syncer
+from app.services.warmup_service import warm_up
+
+# Antes de qualquer log: fila + thread de escrita, JSON no stdout
+configure_logging()
+
+
+# =========================================================
+# 🔁 CICLO DE VIDA
+# =========================================================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    inference_engine.start()
+
+    # Galeria das salas (o /recognize depende dela) + sync periódico
+    await student_syncer.start()
+
+    # Aquecimento em segundo plano: /health responde já, /ready só no fim
+    warm_up.start()
+
+    try:
+        yield
+    finally:
+        await warm_up.stop()
+        await student_syncer.stop()
+        inference_engine.shutdown()
+
 
 app = FastAPI(
-    title="Presença Facial SENAI - Facial API"
+    title="Presença Facial SENAI - Facial API",
+    lifespan=lifespan
 )
 
 # =========================================================
@@ -42,12 +79,67 @@ app.add_middleware(
         "x-facial-api-key",
         "Accept",
         "Origin",
-        "User-Agent"
+        "User-Agent",
+        "X-Request-Id"
     ],
     expose_headers=["*"],
     max_age=3600  # Cache preflight por 1 hora
 )
 
+# =========================================================
+# 🚫 ROSTO RECUSADO PELO PORTÃO DE QUALIDADE
+# =========================================================
+@app.exception_handler(FaceQualityError)
+async def face_quality_error_handler(request: Request, exc: FaceQualityError):
+    quality_stats.record_rejection(exc.reason)
+    return JSONResponse(
+        status_code=422,
+        content={"detail": exc.message, "reason": exc.reason}
+    )
+
+# =========================================================
+# ⏱️ MÉTRICAS POR ROTA
+# =========================================================
+# O label é o template da rota (não o path cru), para não
+# criar uma série por URL desconhecida
+def _route_template(request: Request) -> str:
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    route = _route_template(request)
+    current_route.set(route)
+
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUEST_SECONDS.labels(route, request.method, str(status)).observe(
+            time.perf_counter() - start
+        )
+
+# =========================================================
+# 🔖 REQUEST ID (X-Request-Id)
+# =========================================================
+# Vem da API principal (markByFace) ou é gerado aqui; aparece em
+# todos os logs da requisição e volta no header da resposta
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    current_id = new_request_id(request.headers.get("x-request-id"))
+    request_id.set(current_id)
+
+    response = await call_next(request)
+    response.headers["X-Request-Id"] = current_id
+    return response
+
 # =========================================================
 # 📌 ROTAS
 # =========================================================
@@ -59,3 +151,23 @@ app.include_router(api_router)
 @app.get("/health", tags=["health"])
 def health():
     return {"status": "ok"}
+
+
+# =========================================================
+# 🔥 READINESS (MODELOS E GALERIAS AQUECIDOS)
+# =========================================================
+# 503 enquanto o aquecimento roda; o healthcheck do compose usa esta rota
+@app.get("/ready", tags=["health"])
+def ready():
+    return JSONResponse(
+        status_code=200 if warm_up.ready else 503,
+        content=warm_up.get_status()
+    )
+
+
+# =========================================================
+# 📈 MÉTRICAS (PROMETHEUS)
+# =========================================================
+@app.get("/metrics", tags=["health"])
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
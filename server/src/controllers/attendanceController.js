@@ -7,6 +7,7 @@ import PreAttendanceService from "../services/PreAttendanceService.js";
 
 import FormData from "form-data";
 import axios from "axios";
+import crypto from "crypto";
 import fs from "fs";
 import path from "path";
 import upload from "../middlewares/multerStorage.js";
@@ -27,6 +28,8 @@ const attendanceController = {
         controllerWrapper(async (req, res) => {
             const facialApiUrl = process.env.FACIAL_API_URL || "http://localhost:8000";
             const facialApiKey = process.env.FACIAL_API_KEY || "";
+            // Mesmo id nos logs das duas APIs
+            const requestId = req.get('x-request-id') || crypto.randomUUID();
             
             const room  = req.totem.room.toString();
             if (!req.file) {
@@ -48,8 +51,7 @@ const attendanceController = {
                     contentType: req.file.mimetype
                 });
 
-                const candidates = await StudentService.loadStudentsFromRoom(room);
-                formData.append('candidates', JSON.stringify(candidates));
+                // Os candidatos da sala já estão na galeria residente da API facial
                 
                 // Chamar API facial
                 const response = await axios.post(
@@ -58,7 +60,8 @@ const attendanceController = {
                     {
                         headers: {
                             ...formData.getHeaders(),
-                            'x-facial-api-key': facialApiKey
+                            'x-facial-api-key': facialApiKey,
+                            'x-request-id': requestId
                         },
                         timeout: 30000
                     }
@@ -111,7 +114,7 @@ const attendanceController = {
                     return ApiResponse.CONFLICT(res, error.message)
                 }
 
-                console.error('❌ Erro ao chamar API facial:', error.message);
+                console.error(`❌ Erro ao chamar API facial [${requestId}]:`, error.message);
 
                 if (error.response) {
                     // Erro da API facial
@@ -96,6 +96,14 @@ class StudentController {
     });
 
     loadAllForFacialAPI = controllerWrapper(async (req, res) => {
+        // Requisição condicional: a API facial envia o último ETag recebido
+        const etag = `"faces-${await StudentService.getFacesVersion()}"`;
+        res.set("ETag", etag);
+
+        if (req.headers["if-none-match"] === etag) {
+            return res.status(304).end();
+        }
+
         const students = await StudentService.loadAllFacesData();
         return ApiResponse.OK(res, "", students);
     });
@@ -154,78 +154,96 @@ class StudentService extends BaseService {
         return students;
     }
 
-    
+    /**
+     * Versão dos dados faciais, usada como ETag de GET /students/faces.
+     * Muda sempre que um aluno ou turma é criado, alterado ou removido,
+     * permitindo que a API facial pule sincronizações sem mudanças.
+     */
+    async getFacesVersion() {
+        const summarize = [
+            {
+                $group: {
+                    _id: null,
+                    count: { $sum: 1 },
+                    lastUpdate: { $max: "$updatedAt" }
+                }
+            }
+        ];
+
+        const [[students], [classes]] = await Promise.all([
+            this.model.aggregate(summarize),
+            Class.aggregate(summarize)
+        ]);
+
+        return [
+            students?.count || 0,
+            students?.lastUpdate?.getTime() || 0,
+            classes?.count || 0,
+            classes?.lastUpdate?.getTime() || 0
+        ].join("-");
+    }
+
     /**
      * Retorna os dados de todos os alunos para uso na API de reconhecimento facial
      * Estrutura:
      * [
      *   {
      *     _id: "<id do aluno>",
-     *     facial: "<facialId>",
-     *     salas: ["<classId1>", "<classId2>", ...]
+     *     facialEmbedding: { embedding: "<base64>", nonce: "<base64>" },
+     *     rooms: ["<roomId1>", "<roomId2>", ...]
      *   }
      * ]
      */
     async loadAllFacesData() {
-        // Busca apenas alunos ativos com facialId
+        // Busca apenas alunos ativos com rosto cadastrado
         const students = await this.model.find(
-            { isActive: true, facialId: { $exists: true, $ne: null } },
-            "_id facialId classes"
-        ).lean();
+            { isActive: true, facialEmbedding: { $exists: true } }
+        )
+            .select([
+                "_id",
+                "classes",
+                "+facialEmbedding.embedding",
+                "+facialEmbedding.nonce"
+            ])
+            .lean();
 
         /**
-         * Cache em memória:
+         * Salas físicas de cada turma, carregadas em uma única consulta:
          * {
-         *   "I2C": "654fa1b2c3...",
-         *   "I3A": "654fa1b2d4..."
+         *   "I2C": ["654fa1b2c3...", "654fa1b2c4..."],
+         *   "I3A": ["654fa1b2d4..."]
          * }
          */
-        const knownClassesByCode = {};
+        const classes = await Class.find({}, "code rooms").lean();
+        const roomsByClassCode = {};
+        for (const classData of classes) {
+            roomsByClassCode[classData.code.toUpperCase()] =
+                (classData.rooms || []).map(roomId => roomId.toString());
+        }
 
         const result = [];
 
         for (const student of students) {
-            const classIds = [];
+            const roomsSet = new Set();
+            let hasValidClass = false;
 
             for (const classCode of student.classes) {
-                const normalizedCode = classCode.toUpperCase();
-
-                // Se já está no cache, reutiliza
-                if (knownClassesByCode[normalizedCode]) {
-                    classIds.push(knownClassesByCode[normalizedCode]);
-                    continue;
-                }
+                const classRooms = roomsByClassCode[classCode.toUpperCase()];
+                if (!classRooms) continue;
 
-                // Busca no banco apenas se não estiver em memória
-                const foundClass = await Class.findOne(
-                    { code: normalizedCode },
-                    "_id"
-                ).lean();
-
-                // Se a turma existir, cacheia
-                if (foundClass) {
-                    const classId = foundClass._id.toString();
-                    knownClassesByCode[normalizedCode] = classId;
-                    classIds.push(classId);
-                }
-            }
-
-            // Carregando as salas físicas (rooms) associadas às turmas do aluno
-            const roomsSet = new Set();
-            for (const classId of classIds) {
-                const classData = await Class.findById(classId, "rooms").lean();
-                if (classData && classData.rooms) {
-                    classData.rooms.forEach(roomId => roomsSet.add(roomId.toString()));
-                }
+                hasValidClass = true;
+                classRooms.forEach(roomId => roomsSet.add(roomId));
             }
-            const rooms = Array.from(roomsSet);
 
             // Só adiciona se o aluno tiver ao menos uma turma válida
-            if (classIds.length > 0) {
+            if (hasValidClass) {
                 result.push({
                     _id: student._id.toString(),
-                    facial: student.facialId,
-                    rooms
+                    facialEmbedding: {
+                        embedding: student.facialEmbedding.embedding,
+                        nonce: student.facialEmbedding.nonce
+                    },
+                    rooms: Array.from(roomsSet)
                 });
             }
         }